@@ -0,0 +1,139 @@
+'''Deterministic synthetic corpus generator for benchmarking pycloc'''
+import argparse
+import json
+import os
+import random
+import shutil
+
+# Profiles of the corpus, scaled by the `scale` argument of `generateCorpus`
+PROFILES: dict[str, dict[str, int]] = {
+    "small_files" : {"files" : 4000, "lines" : 40, "width" : 60},
+    "huge_files" : {"files" : 3, "lines" : 400_000, "width" : 70},
+    "deep_tree" : {"files" : 600, "lines" : 30, "width" : 50, "depth" : 64},
+    "long_lines" : {"files" : 40, "lines" : 400, "width" : 8000},
+    "block_comments" : {"files" : 300, "lines" : 600, "width" : 60},
+}
+
+# Written at the root of the corpus, records how it was generated
+MANIFEST: str = "manifest.json"
+
+# Bumped whenever the files generated for a given (scale, seed) change, so that results from different corpora are not compared
+CORPUS_VERSION: int = 1
+
+# Languages files are generated in, as extension -> (line comment, block comment start, block comment end).
+# Fixed here rather than read from languages.json, so that changes to the language table do not change the corpus
+LANGUAGES: dict[str, tuple[str | None, str | None, str | None]] = {
+    "py" : ("#", None, None), "sh" : ("#", None, None), "rb" : ("#", None, None), "pl" : ("#", None, None), "r" : ("#", None, None), "tcl" : ("#", None, None),
+    "c" : ("//", "/*", "*/"), "cpp" : ("//", "/*", "*/"), "cs" : ("//", "/*", "*/"), "java" : ("//", "/*", "*/"), "js" : ("//", "/*", "*/"), "ts" : ("//", "/*", "*/"),
+    "rs" : ("//", "/*", "*/"), "go" : ("//", "/*", "*/"), "kt" : ("//", "/*", "*/"), "scala" : ("//", "/*", "*/"), "dart" : ("//", "/*", "*/"), "php" : ("//", "/*", "*/"),
+    "sql" : ("--", "/*", "*/"), "lua" : ("--", "--[[", "]]"), "hs" : ("--", "{-", "-}"), "elm" : ("--", None, None), "adb" : ("--", None, None),
+    "lisp" : (";", None, None), "clj" : (";", None, None), "asm" : (";", None, None), "tex" : ("%", None, None), "matlab" : ("%", None, None), "f90" : ("!", None, None),
+    "bat" : ("::", None, None), "html" : (None, "<!--", "-->"), "xml" : (None, "<!--", "-->"), "css" : (None, "/*", "*/"), "less" : (None, "/*", "*/"),
+}
+
+WORDS: tuple[str, ...] = ("value", "index", "buffer", "result", "count", "node", "total", "=", "+", "(", ")", "{", "}", ";", ",", "return", "if", "else", "for", "while")
+
+def renderLine(rng: random.Random, width: int) -> str:
+    words: list[str] = []
+    length: int = 0
+    while length < width:
+        word: str = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+def renderFile(rng: random.Random, extension: str, lines: int, width: int, blockRatio: float = 0.05) -> str:
+    '''Render source text mixing code, blank lines, single-line comments and block comments of one of the `LANGUAGES`'''
+    singleLine, blockStart, blockEnd = LANGUAGES[extension]
+
+    output: list[str] = []
+    lineNumber: int = 0
+    while lineNumber < lines:
+        roll: float = rng.random()
+        indent: str = " " * (4 * rng.randrange(4))
+        if blockStart and roll < blockRatio:
+            blockLength: int = rng.randrange(1, 12)
+            output.append(f"{indent}{blockStart} {renderLine(rng, width // 2)}")
+            output.extend(f"{indent} {renderLine(rng, width // 2)}" for _ in range(blockLength))
+            output.append(f"{indent}{blockEnd}")
+            lineNumber += blockLength + 2
+        elif singleLine and roll < 0.2:
+            output.append(f"{indent}{singleLine} {renderLine(rng, width // 2)}")
+            lineNumber += 1
+        elif roll < 0.3:
+            output.append("")
+            lineNumber += 1
+        else:
+            output.append(indent + renderLine(rng, width))
+            lineNumber += 1
+    return "\n".join(output) + "\n"
+
+def isCorpus(path: os.PathLike) -> bool:
+    '''Whether path holds a corpus generated by `generateCorpus`, judged by its manifest'''
+    try:
+        with open(os.path.join(path, MANIFEST)) as manifestFile:
+            manifest: dict = json.load(manifestFile)
+    except (OSError, ValueError):
+        return False
+    return isinstance(manifest, dict) and "profiles" in manifest
+
+def generateCorpus(path: os.PathLike, scale: float = 1.0, seed: int = 0) -> dict:
+    '''#### Generate the benchmark corpus under path, replacing a corpus already there\n
+    The same (scale, seed) pair always produces byte-identical files for a given `CORPUS_VERSION`, so results can be compared between commits.
+    Raises ValueError rather than deleting anything if path is a non-empty directory without a corpus manifest
+    #### returns:
+    Manifest of the corpus: version, scale, seed, and the number of files and bytes generated per profile
+    '''
+    if os.path.isdir(path) and os.listdir(path) and not isCorpus(path):
+        raise ValueError(f"{path} is not empty and has no {MANIFEST}, refusing to replace it with a benchmark corpus")
+    rng: random.Random = random.Random(seed)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+    extensions: list[str] = list(LANGUAGES)
+    blockExtensions: list[str] = [extension for extension in extensions if LANGUAGES[extension][1]]
+    manifest: dict = {}
+    for profile, parameters in PROFILES.items():
+        profileRoot: str = os.path.join(path, profile)
+        files: int = max(1, int(parameters["files"] * scale)) if profile != "huge_files" else parameters["files"]
+        lines: int = max(1, int(parameters["lines"] * scale)) if profile == "huge_files" else parameters["lines"]
+        depth: int = parameters.get("depth", 3)
+        totalBytes: int = 0
+
+        for fileNumber in range(files):
+            if profile == "huge_files":
+                extension = ("c", "sql", "js")[fileNumber % 3]
+            elif profile == "block_comments":
+                extension = rng.choice(blockExtensions)
+            else:
+                extension = rng.choice(extensions)
+
+            # Spread files over a tree, deep_tree places every file at a random depth of a single long chain
+            if profile == "deep_tree":
+                directory: str = os.path.join(profileRoot, *(f"d{level}" for level in range(rng.randrange(depth))))
+            else:
+                directory: str = os.path.join(profileRoot, *(f"d{rng.randrange(8)}" for _ in range(rng.randrange(depth))))
+            os.makedirs(directory, exist_ok=True)
+
+            contents: bytes = renderFile(rng, extension, lines, parameters["width"], 0.3 if profile == "block_comments" else 0.05).encode()
+            with open(os.path.join(directory, f"f{fileNumber}.{extension}"), "wb") as file:
+                file.write(contents)
+            totalBytes += len(contents)
+
+        manifest[profile] = {"files" : files, "bytes" : totalBytes}
+
+    manifest = {"version" : CORPUS_VERSION, "scale" : scale, "seed" : seed, "profiles" : manifest}
+    with open(os.path.join(path, MANIFEST), "w") as manifestFile:
+        json.dump(manifest, manifestFile, indent=2)
+    return manifest
+
+if __name__ == "__main__":
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Generate the pycloc benchmark corpus")
+    parser.add_argument("path", help="Directory to generate the corpus in, replaced if it holds a corpus already. Other non-empty directories are refused")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the number of files (and lines of huge files)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    try:
+        print(generateCorpus(args.path, args.scale, args.seed))
+    except ValueError as e:
+        parser.error(str(e))
@@ -0,0 +1,77 @@
+'''#### Parity check between the native and pure-Python scan engines\n
+Scans random buffers built from the symbols of every language (and optionally every file of a corpus) with both engines, from every entry state and with several
+minimum character counts, and reports any buffer where the resulting state or counts differ. tests/test_engine_parity.py runs a small seeded sample of the same check,
+this script is meant for longer fuzzing runs. Exits with 1 if any buffer differs:
+
+    python -m benchmarks.parity --buffers 2000
+    python -m benchmarks.parity --corpus /tmp/pycloc-corpus
+'''
+import argparse
+import os
+import random
+import sys
+
+from cloc.ctypes_interfacing import NativeEngine
+from cloc.fallback_parsing import PythonEngine
+from cloc.symbols import SYMBOL_TABLE, LanguageSymbols
+
+MIN_CHARS: tuple[int, ...] = (0, 1, 3, -1)
+
+# Filler mixed in with the symbols of a language, chosen to hit whitespace, escapes and line endings often
+FILLER: tuple[bytes, ...] = (b" ", b"\t", b"\r", b"\n", b"\n", b"\\", b"x", b"yz", b"\r\n", b"  ")
+
+def randomBuffer(rng: random.Random, symbols: LanguageSymbols, pieces: int) -> bytes:
+    '''Random bytes made of symbols of a language (whole, and cut short), their first bytes and filler'''
+    parts: list[bytes] = [symbol for symbol, close, _, _ in symbols.tokens for symbol in (symbol, close) if symbol]
+    parts.extend(part[:-1] for part in list(parts) if len(part) > 1)
+    parts.extend(FILLER)
+    return b"".join(rng.choice(parts) for _ in range(rng.randrange(pieces)))
+
+def compare(native: NativeEngine, python: PythonEngine, symbols: LanguageSymbols, buffer: bytes) -> list[str]:
+    '''Scan a buffer with both engines from every entry state and minimum character count, returning a description of every mismatch'''
+    nativeTable = native.compileTable(symbols.tokens)
+    pythonTable = python.compileTable(symbols.tokens)
+    mismatches: list[str] = []
+    for state in range(len(symbols.tokens) + 1):
+        for minChars in MIN_CHARS:
+            expected = native.scanBufferTable(buffer, len(buffer), state, minChars, nativeTable)
+            actual = python.scanBufferTable(buffer, len(buffer), state, minChars, pythonTable)
+            if (expected.state, expected.validLines, expected.totalLines) != (actual.state, actual.validLines, actual.totalLines):
+                mismatches.append(f"{symbols!r} state={state} minChars={minChars} buffer={buffer!r}: native {(expected.state, expected.validLines, expected.totalLines)}, python {(actual.state, actual.validLines, actual.totalLines)}")
+    return mismatches
+
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Check that the native and pure-Python scan engines agree")
+    parser.add_argument("--buffers", type=int, default=500, help="Random buffers per distinct set of language symbols")
+    parser.add_argument("--pieces", type=int, default=40, help="Maximum number of symbols and filler pieces per random buffer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--corpus", help="Also compare every file with known symbols under this directory")
+    args = parser.parse_args()
+
+    native: NativeEngine = NativeEngine()
+    python: PythonEngine = PythonEngine()
+    rng: random.Random = random.Random(args.seed)
+    languages: dict[bytes, LanguageSymbols] = {symbols.key : symbols for symbols in SYMBOL_TABLE.values()}
+    mismatches: list[str] = []
+    checked: int = 0
+    for symbols in languages.values():
+        for _ in range(args.buffers):
+            mismatches.extend(compare(native, python, symbols, randomBuffer(rng, symbols, args.pieces)))
+            checked += 1
+
+    if args.corpus:
+        for directory, _, files in os.walk(args.corpus):
+            for file in files:
+                symbols: LanguageSymbols | None = SYMBOL_TABLE.get(file.rpartition(".")[2].lower())
+                if symbols:
+                    with open(os.path.join(directory, file), "rb") as contents:
+                        mismatches.extend(compare(native, python, symbols, contents.read()))
+                    checked += 1
+
+    for mismatch in mismatches[:20]:
+        print(mismatch, file=sys.stderr)
+    print(f"{checked} buffers across {len(languages)} symbol sets, {len(mismatches)} mismatches", file=sys.stderr)
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == "__main__":
+    main()
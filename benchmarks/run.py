@@ -0,0 +1,236 @@
+'''#### Benchmark harness for pycloc\n
+Every case runs in a fresh interpreter so that peak RSS is measured per case. Results are written as JSON and can be compared between commits:
+
+    python -m benchmarks.run --corpus /tmp/pycloc-corpus --output before.json
+    python -m benchmarks.run --corpus /tmp/pycloc-corpus --output after.json --compare before.json
+'''
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+from statistics import median
+from time import perf_counter
+from typing import Callable
+
+# Case setups, each returning a callable that runs the measured work once and returns the number of files it processed
+CASES: dict[str, Callable[[str], Callable[[], int]]] = {}
+
+def case(name: str) -> Callable:
+    def register(function: Callable[[str], Callable[[], int]]) -> Callable[[str], Callable[[], int]]:
+        CASES[name] = function
+        return function
+    return register
+
+def corpusFiles(corpus: str) -> list[os.DirEntry]:
+    '''Every scannable file of the corpus, the manifest is excluded'''
+    from cloc.parsing import resolveSymbols, walkDirectory
+    return [entry for _, entry in walkDirectory(corpus, recurse=True, directoryFilterFunction=lambda _: True) if resolveSymbols(entry.name)]
+
+@case("parseFile")
+def benchParseFile(corpus: str) -> Callable[[], int]:
+    from cloc.parsing import parseFileSymbols, resolveSymbols
+    entries: list[os.DirEntry] = corpusFiles(corpus)
+    def run() -> int:
+        for entry in entries:
+            parseFileSymbols(entry.path, resolveSymbols(entry.name))
+        return len(entries)
+    return run
+
+@case("parseDirectory")
+def benchParseDirectory(corpus: str) -> Callable[[], int]:
+    from cloc.parsing import parseDirectory
+    return lambda: sum(len(files) for directory, files in parseDirectory(corpus, recurse=True, directoryFilterFunction=lambda _: True).items() if directory != "general")
+
+@case("parseDirectoryNoVerbose")
+def benchParseDirectoryNoVerbose(corpus: str) -> Callable[[], int]:
+    from cloc.parsing import parseDirectoryNoVerbose
+    fileCount: int = len(corpusFiles(corpus))
+    def run() -> int:
+        parseDirectoryNoVerbose(corpus, recurse=True, directoryFilterFunction=lambda _: True)
+        return fileCount
+    return run
+
+@case("parseDirectoryParallel")
+def benchParseDirectoryParallel(corpus: str) -> Callable[[], int]:
+    from cloc.parsing import parseDirectoryParallel
+    fileCount: int = len(corpusFiles(corpus))
+    def run() -> int:
+        parseDirectoryParallel(corpus, jobs=os.cpu_count() or 1, recurse=True, directoryFilterFunction=lambda _: True)
+        return fileCount
+    return run
+
+@case("parseDirectoryPipelined")
+def benchParseDirectoryPipelined(corpus: str) -> Callable[[], int]:
+    from cloc.parsing import parseDirectoryPipelined
+    fileCount: int = len(corpusFiles(corpus))
+    def run() -> int:
+        parseDirectoryPipelined(corpus, readers=4, recurse=True, directoryFilterFunction=lambda _: True)
+        return fileCount
+    return run
+
+@case("Scanner")
+def benchScanner(corpus: str) -> Callable[[], int]:
+    from cloc.scanner import Scanner
+    scanner: Scanner = Scanner()
+    return lambda: len(scanner.scan(corpus))
+
+@case("streamDirectory")
+def benchStreamDirectory(corpus: str) -> Callable[[], int]:
+    from cloc.parsing import streamDirectory
+    return lambda: sum(1 for _ in streamDirectory(corpus, {}, recurse=True, directoryFilterFunction=lambda _: True))
+
+def writerCase(extension: str) -> Callable[[str], Callable[[], int]]:
+    '''Time an `OUTPUT_MAPPING` writer on the result of a verbose scan, the scan itself is not timed'''
+    def setup(corpus: str) -> Callable[[], int]:
+        from cloc.parsing import parseDirectory
+        from cloc.utils import OUTPUT_MAPPING
+        outputMapping: dict = parseDirectory(corpus, recurse=True, directoryFilterFunction=lambda _: True)
+        outputMapping["general"].update({"time" : "0.000s", "scanned at" : "", "platform" : platform.system()})
+        fileCount: int = sum(len(files) for directory, files in outputMapping.items() if directory != "general")
+        outputDirectory: str = tempfile.mkdtemp(prefix="pycloc-bench-")
+        def run() -> int:
+            # Writers only pop "general" off the top level, so a shallow copy (one entry per directory) keeps the mapping intact without timing a deep copy
+            OUTPUT_MAPPING[extension](outputMapping=dict(outputMapping), fpath=os.path.join(outputDirectory, f"output.{extension}"))
+            return fileCount
+        return run
+    return setup
+
+def streamWriterCase(extension: str) -> Callable[[str], Callable[[], int]]:
+    '''Time a full streamed scan into a `STREAM_OUTPUT_MAPPING` writer'''
+    def setup(corpus: str) -> Callable[[], int]:
+        from cloc.parsing import streamDirectory
+        from cloc.utils import STREAM_OUTPUT_MAPPING
+        outputDirectory: str = tempfile.mkdtemp(prefix="pycloc-bench-")
+        def run() -> int:
+            summary: dict = {}
+            count: int = 0
+            with STREAM_OUTPUT_MAPPING[extension](os.path.join(outputDirectory, f"output.{extension}")) as writer:
+                for record in streamDirectory(corpus, summary, recurse=True, directoryFilterFunction=lambda _: True):
+                    writer.write(*record)
+                    count += 1
+                summary.update({"time" : "0.000s", "scanned at" : "", "platform" : platform.system()})
+                writer.close(summary)
+            return count
+        return run
+    return setup
+
+for outputExtension in ("json", "ndjson", "db", "csv", "txt"):
+    case(f"write:{outputExtension}")(writerCase(outputExtension))
+for outputExtension in ("ndjson", "db", "csv", "txt"):
+    case(f"stream:{outputExtension}")(streamWriterCase(outputExtension))
+
+def evictCorpus(corpus: str) -> None:
+    '''Drop the corpus from the page cache without root, to measure cold reads. A no-op where posix_fadvise is unavailable'''
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for entry in corpusFiles(corpus):
+        fd: int = os.open(entry.path, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+def runCase(name: str, corpus: str, repeat: int, cold: bool = False) -> dict:
+    '''Run a case in this process, returning timings and peak RSS'''
+    run: Callable[[], int] = CASES[name](corpus)
+    timings: list[float] = []
+    files: int = 0
+    for _ in range(repeat):
+        if cold:
+            evictCorpus(corpus)
+        epoch: float = perf_counter()
+        files = run()
+        timings.append(perf_counter() - epoch)
+    return {"files" : files, "seconds" : min(timings), "median_seconds" : median(timings), "peak_rss_kb" : resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+def corpusBytes(corpus: str) -> int:
+    return sum(entry.stat().st_size for entry in corpusFiles(corpus))
+
+def gitRevision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, check=True, text=True, cwd=os.path.dirname(__file__)).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: dict, baseline: dict) -> None:
+    '''Print the change in throughput of every case relative to a baseline report'''
+    baselineCases: dict = {result["case"] : result for result in baseline["results"]}
+    for result in results["results"]:
+        previous: dict | None = baselineCases.get(result["case"])
+        if not previous:
+            continue
+        speedup: float = previous["seconds"] / result["seconds"] if result["seconds"] else float("inf")
+        print(f"{result['case']:<28} {previous['seconds']:>9.4f}s -> {result['seconds']:>9.4f}s  x{speedup:.2f}  rss {previous['peak_rss_kb']} -> {result['peak_rss_kb']} KB", file=sys.stderr)
+
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Benchmark pycloc against a deterministic synthetic corpus")
+    parser.add_argument("--corpus", default=os.path.join(tempfile.gettempdir(), "pycloc-corpus"), help="Corpus directory, generated if missing or empty")
+    parser.add_argument("--scale", type=float, default=1.0, help="Corpus scale when generating it, see benchmarks.corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--regenerate", action="store_true", help="Regenerate the corpus even if it exists, only directories holding a corpus manifest are replaced")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case, the fastest is reported")
+    parser.add_argument("--cold", action="store_true", help="Evict the corpus from the page cache before every run")
+    parser.add_argument("--cases", nargs="+", default=None, help=f"Subset of cases to run, out of: {', '.join(CASES)}")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--case", help=argparse.SUPPRESS)    # Internal, run a single case in this process
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(runCase(args.case, args.corpus, args.repeat, args.cold)))
+        return
+
+    from benchmarks.corpus import CORPUS_VERSION, MANIFEST, generateCorpus, isCorpus
+    if args.regenerate or not isCorpus(args.corpus):
+        try:
+            generateCorpus(args.corpus, args.scale, args.seed)
+        except ValueError as e:
+            parser.error(f"{e}. --corpus must be a missing or empty directory, or a corpus directory, which --regenerate rebuilds")
+    with open(os.path.join(args.corpus, MANIFEST)) as manifestFile:
+        manifest: dict = json.load(manifestFile)
+    if manifest.get("version") != CORPUS_VERSION:
+        parser.error(f"{args.corpus} was generated by another version of benchmarks.corpus, its results are not comparable. Rebuild it with --regenerate")
+
+    totalBytes: int = corpusBytes(args.corpus)
+    report: dict = {"revision" : gitRevision(),
+                    "python" : platform.python_version(),
+                    "platform" : platform.platform(),
+                    "cpus" : os.cpu_count(),
+                    "cold" : args.cold,
+                    "corpus" : {"path" : args.corpus, "bytes" : totalBytes, **manifest},
+                    "results" : []}
+
+    for name in args.cases or CASES:
+        if name not in CASES:
+            parser.error(f"Unknown case {name}")
+        child: subprocess.CompletedProcess = subprocess.run([sys.executable, "-m", "benchmarks.run", "--case", name, "--corpus", args.corpus, "--repeat", str(args.repeat)] + (["--cold"] if args.cold else []),
+                                                            capture_output=True, text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        if child.returncode:
+            print(f"{name} failed:\n{child.stderr}", file=sys.stderr)
+            continue
+        result: dict = json.loads(child.stdout)
+        result["case"] = name
+        result["files_per_second"] = result["files"] / result["seconds"] if result["seconds"] else None
+        # Writer cases do not read the corpus, so MB/s only applies to cases that scan it
+        if not name.startswith("write:"):
+            result["mb_per_second"] = totalBytes / (1024 * 1024) / result["seconds"] if result["seconds"] else None
+        report["results"].append(result)
+        print(f"{name:<28} {result['seconds']:.4f}s", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as baselineFile:
+            compare(report, json.load(baselineFile))
+
+    serialisedReport: str = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as outputFile:
+            outputFile.write(serialisedReport)
+    else:
+        print(serialisedReport)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+'''#### Startup latency benchmark for the pycloc CLI\n
+Every run starts a fresh interpreter, as a pre-commit hook would, and the time until it exits is measured. A bare interpreter is measured too,
+so that pycloc's own overhead can be told apart from Python's. Results are written as JSON and can be compared between commits:
+
+    python -m benchmarks.startup --output before.json
+    python -m benchmarks.startup --output after.json --compare before.json --budget 40
+'''
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from statistics import median
+from time import perf_counter
+
+def startupCases(sampleFile: str) -> dict[str, list[str]]:
+    '''Command line arguments of every case, run with the current interpreter'''
+    return {"interpreter" : ["-c", "pass"],
+            "import" : ["-c", "import cloc"],
+            "version" : ["-m", "cloc", "-v"],
+            "file" : ["-m", "cloc", "-f", sampleFile],
+            "file:cold-table" : ["-m", "cloc", "-f", sampleFile]}
+
+def runCase(name: str, arguments: list[str], repeat: int, cacheHome: str) -> dict:
+    '''Run a case `repeat` times in fresh interpreters, returning the fastest and median wall time in milliseconds'''
+    repository: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings: list[float] = []
+    for run in range(repeat):
+        # Cold-table runs get an empty cache directory, so that the compiled language table has to be rebuilt from languages.json
+        environment: dict[str, str] = {**os.environ, "XDG_CACHE_HOME" : tempfile.mkdtemp(prefix="pycloc-startup-") if name.endswith(":cold-table") else cacheHome}
+        epoch: float = perf_counter()
+        child: subprocess.CompletedProcess = subprocess.run([sys.executable, *arguments], capture_output=True, cwd=repository, env=environment)
+        timings.append(perf_counter() - epoch)
+        if child.returncode not in (0, 200):
+            raise RuntimeError(f"{name} exited with {child.returncode}:\n{child.stderr.decode(errors='replace')}")
+    return {"case" : name, "ms" : min(timings) * 1000, "median_ms" : median(timings) * 1000}
+
+def compare(results: dict, baseline: dict) -> None:
+    '''Print the change in latency of every case relative to a baseline report'''
+    baselineCases: dict = {result["case"] : result for result in baseline["results"]}
+    for result in results["results"]:
+        previous: dict | None = baselineCases.get(result["case"])
+        if previous:
+            print(f"{result['case']:<18} {previous['median_ms']:>8.1f}ms -> {result['median_ms']:>8.1f}ms", file=sys.stderr)
+
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Measure the startup latency of the pycloc CLI in fresh interpreters")
+    parser.add_argument("--repeat", type=int, default=20, help="Runs per case, the fastest and median are reported")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--budget", type=float, help="Fail (exit 1) if the median of 'file' exceeds that of a bare interpreter by more than this many milliseconds")
+    args = parser.parse_args()
+
+    workDirectory: str = tempfile.mkdtemp(prefix="pycloc-startup-")
+    sampleFile: str = os.path.join(workDirectory, "small.py")
+    with open(sampleFile, "w") as sample:
+        sample.write("# A tiny file, as seen by a pre-commit hook\nimport os\n\ndef main():\n    '''Docstring'''\n    return os.getcwd()\n")
+    cacheHome: str = os.path.join(workDirectory, "cache")
+
+    report: dict = {"python" : platform.python_version(), "platform" : platform.platform(), "results" : []}
+    cases: dict[str, list[str]] = startupCases(sampleFile)
+    runCase("file", cases["file"], 1, cacheHome)     # Warm-up, builds the compiled language table in cacheHome
+    for name, arguments in cases.items():
+        result: dict = runCase(name, arguments, args.repeat, cacheHome)
+        report["results"].append(result)
+        print(f"{name:<18} {result['ms']:.1f}ms (median {result['median_ms']:.1f}ms)", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as baselineFile:
+            compare(report, json.load(baselineFile))
+
+    serialisedReport: str = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as outputFile:
+            outputFile.write(serialisedReport)
+    else:
+        print(serialisedReport)
+
+    if args.budget is not None:
+        medians: dict[str, float] = {result["case"] : result["median_ms"] for result in report["results"]}
+        overhead: float = medians["file"] - medians["interpreter"]
+        if overhead > args.budget:
+            print(f"Startup regression: 'file' takes {overhead:.1f}ms over a bare interpreter, budget is {args.budget:.1f}ms", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
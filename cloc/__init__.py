@@ -0,0 +1,8 @@
+__all__ = ["FileRecord", "Scanner", "ScanResult"]
+
+def __getattr__(name: str):
+    # Imported on first access, so that running the CLI does not load the scanner API (and everything it imports) up front
+    if name in __all__:
+        from cloc import scanner
+        return getattr(scanner, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
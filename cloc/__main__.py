@@ -4,18 +4,29 @@ from typing import Callable
 from types import MappingProxyType
 from datetime import datetime
 import platform
-from time import time
+from time import time, perf_counter
+import sys
 
-from cloc.utils import findCommentSymbols, getVersion
-from cloc.utils import OUTPUT_MAPPING
+from cloc.utils import getVersion, readRootManifest
+from cloc.utils import OUTPUT_MAPPING, STREAM_OUTPUT_MAPPING, NDJSONStreamWriter, StreamWriter, SQLHistoryStreamWriter, dumpOutputSQLHistory, serialiseJSON
 from cloc.config import DEFAULTS
-from cloc.parsing import parseDirectory, parseDirectoryNoVerbose, parseFile
+from cloc.engine import ENGINES, loadEngine, selectEngine
+from cloc.cache import ResultCache
+from cloc.guard import FileGuard
+from cloc.ignore import IgnoreMatcher
+from cloc.shard import Shard, mergePartials, readPartial, writePartial
+from cloc.stats import ScanStats
+
+# The scanner (and the native library behind it) is imported once arguments are parsed, so that '-v', '-h' and 'merge' never load it.
+# Git and watch mode modules (and subprocess, signal, sqlite3) are imported where they are used, since most runs need neither
 
 parser: argparse.ArgumentParser = argparse.ArgumentParser(description="A simple CLI tool to count lines of code (LOC) of your files")
 
 parser.add_argument("-v", "--version", help="Current version of cloc", action="store_true")
 parser.add_argument("-d", "--dir", nargs=1, help="Specify the directory to scan. Either this or '-f' must be used")
 parser.add_argument("-f", "--file", nargs=1, help="Specify the file to scan. Either this or '-d' must be used")
+parser.add_argument("-b", "--batch", nargs="+", help="[OPTIONAL] Scan several directories in one invocation, sharing workers and the result cache between them, and produce one combined report with per-root totals")
+parser.add_argument("-bm", "--batch-manifest", nargs=1, help="[OPTIONAL] Same as '--batch', reading directories from a file with one path per line. Blank lines and lines starting with '#' are ignored, relative paths are resolved against the manifest's directory")
 parser.add_argument("-mc", "--min-chars", nargs=1, type=int, help="[OPTIONAL] Specify the minimum number of non-whitespace characters a line should have to be considered an LOC", default=DEFAULTS.min_chars)
 parser.add_argument("-ss", "--single-symbol", nargs=1, help="[OPTIONAL] Specify the single-line comment symbol. By default, the comments are identified via file extension itself, Note that if this flag is specified with the directory flag, then all files within that directory are checked against this comment symbol")
 parser.add_argument("-ms", "--multiline-symbol", nargs=1, help="[OPTIONAL] Specify the multi-line comment symbols as a space-separated pair of opening and closing symbols. Behaves similiar to single-line comments")
@@ -25,19 +36,131 @@ parser.add_argument("-xt", "--exclude-type", nargs="+", help="[OPTIONAL] Exclude
 parser.add_argument("-id", "--include-dir", nargs="+", help="[OPTIONAL] Include directories by name")
 parser.add_argument("-if", "--include-file", nargs="+", help="[OPTIONAL] Include files by name")
 parser.add_argument("-it", "--include-type", nargs="+", help="[OPTIONAL] Include files by extension, useful for specificity when working with directories with files for different languages")
+parser.add_argument("-ig", "--ignore", help="[OPTIONAL] Skip files and directories matched by .gitignore and .clocignore files, including those of parent directories up to the enclosing git repository. Ignored directories (and .git) are never entered. Not applied in git mode", action="store_true", default=DEFAULTS.ignore)
+parser.add_argument("-ip", "--ignore-pattern", nargs="+", help="[OPTIONAL] Skip paths matching these gitignore-style patterns, relative to every scanned directory, such as 'build/' or '**/*.min.js'. Implies '--ignore'")
 parser.add_argument("-vb", "--verbose", help="Get LOC and total lines for every file scanned", action="store_true", default=DEFAULTS.verbose)
 parser.add_argument("-o", "--output", nargs=1, help="[OPTIONAL] Specify output file to dump counts into. If not specified, output is dumped to stdout. If output file is in .json, .toml, .yaml, or .db/.sql format, then output is ordered differently.")
 parser.add_argument("-r", "--recurse", help="[OPTIONAL] Recursively scan every sub-directory too", action="store_true", default=DEFAULTS.recurse)
+parser.add_argument("-j", "--jobs", nargs=1, type=int, help="[OPTIONAL] Number of worker threads to scan files of a directory with. Files are scheduled largest first. With '-f', files larger than '--chunk-size' are split into chunks scanned in parallel instead", default=DEFAULTS.jobs)
+parser.add_argument("-cs", "--chunk-size", nargs=1, type=int, help="[OPTIONAL] Maximum size in MB of the chunks a single large file is split into with '-f' and '-j'", default=DEFAULTS.chunk_size)
+parser.add_argument("-pf", "--prefetch", nargs=1, type=int, help="[OPTIONAL] Number of reader threads to read files ahead of the scanner with, so that disk reads overlap with scanning. Useful on cold caches and network filesystems. Cannot be combined with '-j'", default=DEFAULTS.prefetch)
+parser.add_argument("-pq", "--prefetch-depth", nargs=1, type=int, help="[OPTIONAL] Maximum number of files read ahead with '--prefetch'", default=DEFAULTS.prefetch_depth)
+parser.add_argument("-pm", "--prefetch-memory", nargs=1, type=int, help="[OPTIONAL] Maximum memory in MB held by files read ahead with '--prefetch'. Larger files are memory-mapped instead", default=DEFAULTS.prefetch_memory)
+parser.add_argument("-nc", "--no-cache", help="[OPTIONAL] Do not read or update the persistent result cache, forcing every file to be scanned", action="store_true", default=not DEFAULTS.cache)
+parser.add_argument("-ng", "--no-guard", help="[OPTIONAL] Scan binary files, lockfiles, minified bundles and files marked as generated instead of skipping them. Skipped files are counted under 'skipped' in the general data", action="store_true", default=not DEFAULTS.guard)
+parser.add_argument("-mfs", "--max-file-size", nargs=1, type=float, help="[OPTIONAL] Skip files larger than this many MB", default=DEFAULTS.max_file_size)
+parser.add_argument("-mll", "--max-line-length", nargs=1, type=int, help="[OPTIONAL] Skip files with a line longer than this many bytes within their first block, such as minified or embedded data files", default=DEFAULTS.max_line_length)
+parser.add_argument("-gr", "--git-rev", nargs=1, help="[OPTIONAL] Scan the tree of a git revision (commit, branch or tag) straight from the repository given by '-d' (or the current directory), without checking it out")
+parser.add_argument("-gd", "--git-diff", nargs=1, help="[OPTIONAL] Specify a revision range 'A..B' to report the change in counts between two git revisions, scanning only the files that changed")
+parser.add_argument("-s", "--stream", help="[OPTIONAL] Write per-file counts as soon as each file is scanned, with totals written last, instead of holding every result in memory. Writes NDJSON to stdout if no output file is given. Not supported for .json output", action="store_true")
+parser.add_argument("-hi", "--history", help="[OPTIONAL] Append this scan as a new run to a .db/.sql output, instead of replacing the previous contents", action="store_true")
+parser.add_argument("-hd", "--history-deltas", help="[OPTIONAL] Same as '--history', but only store files whose counts changed since the previous run", action="store_true")
+parser.add_argument("-cp", "--cache-path", nargs=1, help="[OPTIONAL] Specify the result cache database. Defaults to pycloc/cache.db under $XDG_CACHE_HOME or ~/.cache")
+parser.add_argument("-w", "--watch", help="[OPTIONAL] Keep running after the scan, rescanning only files that are created, modified or deleted, and emit updated counts after every batch of changes. Uses inotify where available, and polling otherwise", action="store_true")
+parser.add_argument("-wd", "--watch-deltas", help="[OPTIONAL] With '--watch', print only the change in counts of every changed file (and its directory) as NDJSON, followed by the new totals", action="store_true")
+parser.add_argument("-wi", "--watch-interval", nargs=1, type=float, help="[OPTIONAL] Seconds between polls when watching without inotify", default=[1.0])
+parser.add_argument("-wp", "--watch-poll", help="[OPTIONAL] Watch by polling even if inotify is available, such as on network filesystems", action="store_true")
+parser.add_argument("-en", "--engine", nargs=1, choices=ENGINES, help="[OPTIONAL] Engine to scan files with. 'native' uses the compiled scanner (line_parsing.so), 'python' a pure-Python scanner with identical counts that needs no compiler, and 'auto' the native one if it can be loaded, and the Python one otherwise", default=[DEFAULTS.engine])
+parser.add_argument("-sh", "--shard", nargs=1, help="[OPTIONAL] Scan only shard i of N, given as 'i/N'. Files are partitioned by a hash of their path relative to the scanned directory, so N processes sharing a filesystem scan disjoint sets of files. Writes a partial result to the output file (-o), combine partials with 'pycloc merge'")
+parser.add_argument("-st", "--stats", help="[OPTIONAL] Report time spent per phase (walk, cache, open, scan, output), file, byte, line and scan call counts, throughput, the slowest files and the engine used. Printed to stderr unless '--stats-output' is given", action="store_true")
+parser.add_argument("-so", "--stats-output", nargs=1, help="[OPTIONAL] Specify a file to write the '--stats' report into, in any of the output formats. Implies '--stats'")
+parser.add_argument("-sn", "--stats-top", nargs=1, type=int, help="[OPTIONAL] Number of slowest files to report with '--stats'", default=[10])
+
+mergeParser: argparse.ArgumentParser = argparse.ArgumentParser(prog="pycloc merge", description="Combine partial results of a sharded scan (see '--shard') into a single report")
+mergeParser.add_argument("partials", nargs="+", help="Partial result files written by 'pycloc --shard i/N -o ...'")
+mergeParser.add_argument("-o", "--output", nargs=1, help="[OPTIONAL] Specify output file to dump counts into, in any of the output formats. If not specified, output is dumped to stdout")
+
+def dumpStats(stats: ScanStats | None, statsOutput: list[str] | None) -> None:
+    '''Write the report of a scan's stats, if collected, to the given output file or stderr'''
+    if stats is None:
+        return
+    report: dict = stats.report()
+    report["general"]["scanned at"] = datetime.now().strftime("%d/%m/%y, at %H:%M:%S")
+    report["general"]["time"] = report["general"]["wall time"]
+    report["general"]["platform"] = platform.system()
+    report["general"]["engine"] = loadEngine().name
+    if not statsOutput:
+        print(report, file=sys.stderr)
+        return
+    outputFiletype: str = statsOutput[0].split(".")[-1].lower()
+    OUTPUT_MAPPING.get(outputFiletype, OUTPUT_MAPPING[None])(outputMapping=report, fpath=statsOutput[0])
+
+def merge(argv: list[str]) -> None:
+    '''Entry point of `pycloc merge`'''
+    args = mergeParser.parse_args(argv)
+    try:
+        partials: list[dict] = [readPartial(fpath) for fpath in args.partials]
+        outputMapping, missing = mergePartials(partials)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}")
+        exit(500)
+    if missing:
+        print(f"WARNING: Shards {', '.join(map(str, missing))} are missing, counts only cover the shards given")
+
+    generalData: dict = outputMapping["general"] if "general" in outputMapping else outputMapping
+    # Shards run side by side, so the slowest one is the time the whole scan took
+    generalData["time"] = f"{max(partial['partial']['seconds'] for partial in partials):.3f}s"
+    generalData["scanned at"] = datetime.now().strftime("%d/%m/%y, at %H:%M:%S")
+    generalData["platform"] = platform.system()
+    if not args.output:
+        print(outputMapping)
+    else:
+        outputFiletype: str = args.output[0].split(".")[-1].lower()
+        OUTPUT_MAPPING.get(outputFiletype, OUTPUT_MAPPING[None])(outputMapping=outputMapping, fpath=args.output[0])
+    exit(200)
 
 def main() -> None:
+    if sys.argv[1:2] == ["merge"]:
+        merge(sys.argv[2:])
     args = parser.parse_args()
 
     if args.version:
         getVersion()
         exit(200)
 
+    # Symbols are compiled for the engine in use, so it is chosen before anything is scanned
+    selectEngine(args.engine[0])
+    try:
+        loadEngine()
+    except OSError as e:
+        print(f"ERROR: Native scanner could not be loaded ({e}), build line_parsing.so or use '--engine python'")
+        exit(500)
+
+    from cloc.parsing import parseDirectory, parseDirectoryNoVerbose, parseDirectoryParallel, parseDirectoryPipelined, parseFileChunked, parseRoots, resolveSymbols, streamDirectory
+    from cloc.symbols import LanguageSymbols
+
     bIsFile: bool = False
 
+    bHistory: bool = args.history or args.history_deltas
+    if bHistory and not (args.output and args.output[0].split(".")[-1].lower() in ("db", "sql")):
+        print(f"ERROR: History mode requires a .db or .sql output file")
+        exit(500)
+
+    shard: Shard | None = None
+    if args.shard:
+        try:
+            shard = Shard.parse(args.shard[0])
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            exit(500)
+        if not args.output or args.file or args.git_rev or args.git_diff or args.stream or args.watch or bHistory:
+            print(f"ERROR: Sharded scans (-sh) require an output file (-o) for their partial result, and cannot be combined with a file (-f), git mode (-gr, -gd), streaming (-s), watch mode (-w) or history (-hi, -hd)")
+            exit(500)
+
+    stats: ScanStats | None = ScanStats(topN=args.stats_top[0]) if (args.stats or args.stats_output) else None
+
+    maxFileSize: float | None = args.max_file_size if not isinstance(args.max_file_size, list) else args.max_file_size[0]
+    maxLineLength: int | None = args.max_line_length if not isinstance(args.max_line_length, list) else args.max_line_length[0]
+    if (maxFileSize is not None and maxFileSize <= 0) or (maxLineLength is not None and maxLineLength < 1):
+        print(f"ERROR: Maximum file size and line length must be positive")
+        exit(500)
+    guard: FileGuard | None = None
+    if not args.no_guard or maxFileSize is not None or maxLineLength is not None:
+        guard = FileGuard(detectBinary=not args.no_guard,
+                          detectGenerated=not args.no_guard,
+                          maxFileSize=int(maxFileSize * 1024 * 1024) if maxFileSize is not None else None,
+                          maxLineLength=maxLineLength)
+
     if(args.dir and args.file):
         print("ERROR: Both target directory and target file specified. Please specify only one")
         exit(500)
@@ -57,6 +180,11 @@ def main() -> None:
         symbolData["multistart"] = pairing[0].encode()
         symbolData['multiend'] = pairing[1].encode()
 
+    # Compile custom symbols once, they are shared by every file scanned
+    customSymbols: LanguageSymbols | None = None
+    if symbolData:
+        customSymbols = LanguageSymbols(symbolData.get("single"), symbolData.get("multistart"), symbolData.get("multiend"))
+
     # Single file, no need to check and validate other DEFAULTS
     if bIsFile:     
         if not os.path.exists(args.file):
@@ -67,35 +195,42 @@ def main() -> None:
             exit(500)
 
         epoch = time()
-        # Fetch comment symbols if not specified via -cs
-        singleLine, multiLineStart, multiLineEnd = None, None, None
-        if not symbolData:
-            symbolData = findCommentSymbols(args.file.split(".")[-1])
-            if isinstance(symbolData, bytes):
-                # Single line only
-                singleLine: bytes = symbolData
-            elif isinstance(symbolData[1], bytes):
-                # Multiline only
-                multiLineStart: bytes = symbolData[0]
-                multiLineEnd: bytes = symbolData[1]
-            else:
-                # Both single line and multiline
-                singleLine: bytes = symbolData[0]
-                multiLineStart: bytes = symbolData[1][0]
-                multiLineEnd: bytes = symbolData[1][1]
-        else:
-            singleLine = symbolData.get("single")
-            multiLineStart = symbolData.get("multistart")
-            multiLineEnd = symbolData.get("multiend")
+        # Fetch comment symbols if not specified via -ss/-ms
+        symbols: LanguageSymbols | None = resolveSymbols(os.path.basename(args.file), customSymbols)
+        if not symbols:
+            print(f"No comment symbols found for extension .{args.file.rpartition('.')[2]}")
+            exit(500)
 
-        
-        loc, total = parseFile(filepath=args.file, 
-                               singleCommentSymbol=singleLine, 
-                               multiLineStartSymbol=multiLineStart, 
-                               multiLineEndSymbol=multiLineEnd, 
-                               minChars=args.min_chars if isinstance(args.min_chars, int) else args.min_chars[0])
-        outputMapping: MappingProxyType = MappingProxyType({"loc" : loc, "total" : total, "time" : f"{time()-epoch:.3f}s", "scanned at" : datetime.now().strftime("%d/%m/%y, at %H:%M:%S"), "platform" : platform.system()})
-        if not args.output:
+        jobs: int = args.jobs if isinstance(args.jobs, int) else args.jobs[0]
+        chunkSize: int = args.chunk_size if isinstance(args.chunk_size, int) else args.chunk_size[0]
+        if jobs < 1 or chunkSize < 1:
+            print(f"ERROR: Number of jobs and chunk size must be positive integers")
+            exit(500)
+
+        fileEpoch: float = perf_counter()
+        result: tuple[int, int] | None = None
+        reason: str | None = guard.checkFile(os.path.basename(args.file), os.path.getsize(args.file)) if guard else None
+        if reason:
+            guard.record(reason)
+        else:
+            result = parseFileChunked(filepath=args.file,
+                                      symbols=symbols,
+                                      minChars=args.min_chars if isinstance(args.min_chars, int) else args.min_chars[0],
+                                      jobs=jobs,
+                                      chunkSize=chunkSize * 1024 * 1024,
+                                      stats=stats,
+                                      guard=guard)
+        loc, total = result or (0, 0)
+        if stats and result:
+            stats.recordFile(os.path.abspath(args.file), os.path.getsize(args.file), perf_counter() - fileEpoch, loc, total)
+        fileData: dict = {"loc" : loc, "total" : total}
+        if guard:
+            fileData.update(guard.summary())
+        outputMapping: MappingProxyType = MappingProxyType({**fileData, "time" : f"{time()-epoch:.3f}s", "scanned at" : datetime.now().strftime("%d/%m/%y, at %H:%M:%S"), "platform" : platform.system()})
+        outputEpoch: float = perf_counter()
+        if bHistory:
+            dumpOutputSQLHistory(outputMapping=outputMapping, fpath=args.output[0], deltas=args.history_deltas)
+        elif not args.output:
             print(outputMapping)
         else:
             outputFiletype: str = args.output[0].split(".")[-1].lower()
@@ -103,17 +238,51 @@ def main() -> None:
             # Fetch output function based on file extension, default to standard write logic
             outputFunction: Callable = OUTPUT_MAPPING.get(outputFiletype, OUTPUT_MAPPING[None])
             outputFunction(outputMapping=outputMapping, fpath=args.output[0])
+        if stats:
+            stats.addPhase("output", perf_counter() - outputEpoch)
+        dumpStats(stats, args.stats_output)
         exit(200)
 
-    # Directory
-    if not args.dir:
-        print(f"ERROR: File or directory must be specified")
+    # Directory, or git repository
+    bGitMode: bool = bool(args.git_rev or args.git_diff)
+    if args.git_rev and args.git_diff:
+        print(f"ERROR: Only one of git revision (-gr) or git diff (-gd) can be specified")
         exit(500)
 
-    args.dir = args.dir[0]  # Fetch first (and only) entry from list since `nargs` param in parser.add_argument returns the args as a list
-    if not os.path.isdir(args.dir):
-        print(f"ERROR: {args.dir} is not a valid directory")
+    bBatch: bool = bool(args.batch or args.batch_manifest)
+    if bBatch and (args.dir or bGitMode):
+        print(f"ERROR: Batch mode (-b, -bm) cannot be combined with a directory (-d) or git mode (-gr, -gd)")
         exit(500)
+
+    if not (args.dir or bGitMode or bBatch):
+        print(f"ERROR: File or directory must be specified")
+        exit(500)
+
+    roots: list[str] = []
+    if bBatch:
+        try:
+            batchRoots: list[str] = (args.batch or []) + (readRootManifest(args.batch_manifest[0]) if args.batch_manifest else [])
+        except OSError as e:
+            print(f"ERROR: Batch manifest could not be read ({e})")
+            exit(500)
+        for batchRoot in batchRoots:
+            batchRoot = os.path.abspath(batchRoot)
+            if not os.path.isdir(batchRoot):
+                # A single missing checkout should not fail the whole batch
+                print(f"WARNING: {batchRoot} is not a valid directory, skipping it")
+                continue
+            if batchRoot not in roots:
+                roots.append(batchRoot)
+        if not roots:
+            print(f"ERROR: No valid directories to scan in batch")
+            exit(500)
+        args.dir = roots[0]
+    else:
+        args.dir = args.dir[0] if args.dir else os.getcwd()  # Fetch first (and only) entry from list since `nargs` param in parser.add_argument returns the args as a list
+        if not os.path.isdir(args.dir):
+            print(f"ERROR: {args.dir} is not a valid directory")
+            exit(500)
+        roots.append(os.path.abspath(args.dir))
     
     ### Handle file-level filtering logic, if any ###
     bFileFilter: bool = False
@@ -165,34 +334,286 @@ def main() -> None:
         directoryFilter = lambda _ : False if not args.recurse else True          # No directory filters given, accept subdirectories based on recurse flag
 
     root: os.PathLike = os.path.abspath(args.dir)
-    root_data = os.walk(root)
+
+    # Ignore files describe the working tree, a git revision is already limited to tracked files
+    ignore: IgnoreMatcher | None = IgnoreMatcher(args.ignore_pattern or ()) if (args.ignore or args.ignore_pattern) and not bGitMode else None
+
+    jobs: int = args.jobs if isinstance(args.jobs, int) else args.jobs[0]
+    if jobs < 1:
+        print(f"ERROR: Number of jobs must be a positive integer")
+        exit(500)
+
+    readers: int = args.prefetch if isinstance(args.prefetch, int) else args.prefetch[0]
+    prefetchDepth: int = args.prefetch_depth if isinstance(args.prefetch_depth, int) else args.prefetch_depth[0]
+    prefetchMemory: int = (args.prefetch_memory if isinstance(args.prefetch_memory, int) else args.prefetch_memory[0]) * 1024 * 1024
+    if readers < 0 or prefetchDepth < 1 or prefetchMemory < 0:
+        print(f"ERROR: Prefetch readers, depth and memory must be positive integers")
+        exit(500)
+    if readers and jobs > 1:
+        print(f"ERROR: Only one of jobs (-j) or prefetch (-pf) can be specified")
+        exit(500)
+    if readers and bBatch and not args.stream:
+        print(f"ERROR: Prefetch (-pf) in batch mode is only supported for streamed scans (-s)")
+        exit(500)
+
+    cache: ResultCache | None = None
+    if not args.no_cache:
+        import sqlite3
+        try:
+            cache = ResultCache(args.cache_path[0] if args.cache_path else DEFAULTS.cache_path)
+        except (sqlite3.Error, OSError) as e:
+            print(f"WARNING: Result cache unavailable ({e}), scanning without it")
+        else:
+            # Only a full, unfiltered scan can tell that a cached file under root no longer exists
+            if args.recurse and not (bFileFilter or bDirFilter or bGitMode or ignore or shard):
+                for scannedRoot in roots:
+                    cache.addRoot(scannedRoot)
+
+    if args.watch:
+        if bGitMode or args.stream:
+            print(f"ERROR: Watch mode (-w) cannot be combined with git mode (-gr, -gd) or streaming (-s)")
+            exit(500)
+        if args.watch_deltas and args.output:
+            print(f"ERROR: Watch deltas (-wd) are always printed to stdout, and cannot be combined with an output file")
+            exit(500)
+
+        import signal
+        from cloc.watch import WatchState, createWatcher, watchChanges
+        state: WatchState = WatchState(roots=roots,
+                                       customSymbols=customSymbols,
+                                       fileFilterFunction=fileFilter,
+                                       directoryFilterFunction=directoryFilter,
+                                       minChars=args.min_chars if isinstance(args.min_chars, int) else args.min_chars[0],
+                                       recurse=args.recurse,
+                                       guard=guard,
+                                       ignore=ignore)
+        # Watch before the initial scan, so that changes made while scanning are not missed
+        watcher = createWatcher(roots, fileFilter, directoryFilter, args.recurse, args.watch_interval[0], args.watch_poll, ignore)
+        for scannedRoot in roots:
+            state.resyncTree(scannedRoot, cache)
+        if cache:
+            cache.close()
+
+        def emitUpdate(deltas: list[tuple] | None) -> None:
+            generalData: dict = state.generalData()
+            generalData["scanned at"] = datetime.now().strftime("%d/%m/%y, at %H:%M:%S")
+            generalData["platform"] = platform.system()
+            if args.watch_deltas:
+                for directory, filename, l, tl, status in deltas or ():
+                    directoryTotals: dict = state.directoryTotals.get(directory, {"loc" : 0, "total" : 0})
+                    print(serialiseJSON({"directory" : directory, "file" : filename, "loc" : l, "total_lines" : tl, "status" : status,
+                                         "directory_loc" : directoryTotals["loc"], "directory_total" : directoryTotals["total"]}))
+                print(serialiseJSON({"general" : generalData}), flush=True)
+                return
+
+            outputMapping: dict = state.outputMapping(args.verbose)
+            (outputMapping["general"] if args.verbose else outputMapping).update(generalData)
+            if bHistory:
+                dumpOutputSQLHistory(outputMapping=outputMapping, fpath=args.output[0], deltas=args.history_deltas)
+            elif args.output:
+                # Write next to the output and swap it in, so that readers never see a partial file
+                outputFiletype: str = args.output[0].split(".")[-1].lower()
+                temporaryPath: str = os.path.join(os.path.dirname(os.path.abspath(args.output[0])), f".{os.path.basename(args.output[0])}.tmp")
+                if os.path.exists(temporaryPath):
+                    os.remove(temporaryPath)
+                OUTPUT_MAPPING.get(outputFiletype, OUTPUT_MAPPING[None])(outputMapping=outputMapping, fpath=temporaryPath)
+                os.replace(temporaryPath, args.output[0])
+            else:
+                print(outputMapping, flush=True)
+
+        emitUpdate(None)
+        # Stop as cleanly on SIGTERM as on Ctrl+C, for when the watcher runs as a daemon
+        def stopWatching(*_) -> None:
+            raise KeyboardInterrupt
+        signal.signal(signal.SIGTERM, stopWatching)
+        try:
+            for deltas in watchChanges(state, watcher):
+                emitUpdate(deltas)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+        exit(200)
+
+    if args.stream and not bGitMode:
+        outputFiletype: str | None = args.output[0].split(".")[-1].lower() if args.output else None
+        if args.output and outputFiletype == "json":
+            print(f"ERROR: JSON output cannot be streamed, use .ndjson or .jsonl instead")
+            exit(500)
+
+        epoch = time()
+        summary: dict = {"loc" : 0, "total" : 0, "unknown" : 0}
+        rootTotals: dict[str, dict] = {}
+        if bHistory:
+            writer: StreamWriter = SQLHistoryStreamWriter(args.output[0], deltas=args.history_deltas)
+        elif args.output:
+            writer: StreamWriter = STREAM_OUTPUT_MAPPING.get(outputFiletype, STREAM_OUTPUT_MAPPING[None])(args.output[0])
+        else:
+            writer: StreamWriter = NDJSONStreamWriter()
+        with writer:
+            for scannedRoot in roots:
+                rootSummary: dict = {}
+                for record in streamDirectory(root=scannedRoot,
+                                              summary=rootSummary,
+                                              customSymbols=customSymbols,
+                                              fileFilterFunction=fileFilter,
+                                              directoryFilterFunction=directoryFilter,
+                                              minChars=args.min_chars if isinstance(args.min_chars, int) else args.min_chars[0],
+                                              recurse=args.recurse,
+                                              jobs=jobs,
+                                              cache=cache,
+                                              stats=stats,
+                                              readers=readers,
+                                              prefetchDepth=prefetchDepth,
+                                              prefetchMemory=prefetchMemory,
+                                              guard=guard,
+                                              ignore=ignore):
+                    writer.write(*record)
+                rootTotals[scannedRoot] = {key : rootSummary[key] for key in summary}
+                for key in summary:
+                    summary[key] += rootSummary[key]
+
+            if guard:
+                summary.update(guard.summary())
+            if bBatch:
+                summary["roots"] = rootTotals
+            if cache:
+                cache.close()
+            summary["time"] = f"{time()-epoch:.3f}s"
+            summary["scanned at"] = datetime.now().strftime("%d/%m/%y, at %H:%M:%S")
+            summary["platform"] = platform.system()
+            writer.close(summary)
+        dumpStats(stats, args.stats_output)
+        exit(200)
 
     epoch = time()
-    if args.verbose:
-        outputMapping = parseDirectory(dirData=root_data,
-                                       customSymbols=symbolData,
+    if bGitMode:
+        import subprocess
+        from cloc.git_parsing import parseRevision, parseRevisionDiff
+        try:
+            if args.git_rev:
+                outputMapping = parseRevision(repository=root,
+                                              revision=args.git_rev[0],
+                                              customSymbols=customSymbols,
+                                              fileFilterFunction=fileFilter,
+                                              directoryFilterFunction=directoryFilter,
+                                              minChars=args.min_chars if isinstance(args.min_chars, int) else args.min_chars[0],
+                                              recurse=args.recurse,
+                                              verbose=args.verbose,
+                                              cache=cache,
+                                              stats=stats,
+                                              guard=guard)
+            else:
+                revisions: list[str] = args.git_diff[0].split("..")
+                if len(revisions) != 2 or not all(revisions):
+                    print(f"ERROR: Git diff {args.git_diff[0]} must be a revision range, such as 'v1.0..HEAD'")
+                    exit(500)
+                outputMapping = parseRevisionDiff(repository=root,
+                                                  fromRevision=revisions[0],
+                                                  toRevision=revisions[1],
+                                                  customSymbols=customSymbols,
+                                                  fileFilterFunction=fileFilter,
+                                                  directoryFilterFunction=directoryFilter,
+                                                  minChars=args.min_chars if isinstance(args.min_chars, int) else args.min_chars[0],
+                                                  recurse=args.recurse,
+                                                  verbose=args.verbose,
+                                                  cache=cache,
+                                                  stats=stats,
+                                                  guard=guard)
+        except (subprocess.CalledProcessError, ValueError, OSError) as e:
+            # Failed git commands carry git's own message, unreadable objects (ValueError) and a missing git executable (OSError) their own
+            reason: str = e.stderr.decode(errors='replace').strip() if isinstance(e, subprocess.CalledProcessError) and e.stderr else str(e)
+            print(f"ERROR: git failed for {root}: {reason}")
+            exit(500)
+    elif bBatch:
+        outputMapping = parseRoots(roots=roots,
+                                   jobs=jobs,
+                                   customSymbols=customSymbols,
+                                   fileFilterFunction=fileFilter,
+                                   directoryFilterFunction=directoryFilter,
+                                   minChars=args.min_chars if isinstance(args.min_chars, int) else args.min_chars[0],
+                                   recurse=args.recurse,
+                                   verbose=args.verbose,
+                                   cache=cache,
+                                   stats=stats,
+                                   guard=guard,
+                                   ignore=ignore,
+                                   shard=shard)
+    elif jobs > 1:
+        outputMapping = parseDirectoryParallel(root=root,
+                                               jobs=jobs,
+                                               customSymbols=customSymbols,
+                                               fileFilterFunction=fileFilter,
+                                               directoryFilterFunction=directoryFilter,
+                                               minChars=args.min_chars if isinstance(args.min_chars, int) else args.min_chars[0],
+                                               recurse=args.recurse,
+                                               verbose=args.verbose,
+                                               cache=cache,
+                                               stats=stats,
+                                               guard=guard,
+                                               ignore=ignore,
+                                               shard=shard)
+    elif readers:
+        outputMapping = parseDirectoryPipelined(root=root,
+                                                readers=readers,
+                                                customSymbols=customSymbols,
+                                                fileFilterFunction=fileFilter,
+                                                directoryFilterFunction=directoryFilter,
+                                                minChars=args.min_chars if isinstance(args.min_chars, int) else args.min_chars[0],
+                                                recurse=args.recurse,
+                                                verbose=args.verbose,
+                                                cache=cache,
+                                                stats=stats,
+                                                prefetchDepth=prefetchDepth,
+                                                prefetchMemory=prefetchMemory,
+                                                guard=guard,
+                                                ignore=ignore,
+                                                shard=shard)
+    elif args.verbose:
+        outputMapping = parseDirectory(root=root,
+                                       customSymbols=customSymbols,
                                        fileFilterFunction=fileFilter,
                                        directoryFilterFunction=directoryFilter,
                                        minChars=args.min_chars if isinstance(args.min_chars, int) else args.min_chars[0],
-                                       recurse=args.recurse)
-        
-        outputMapping["general"]["time"] = f"{time()-epoch:.3f}s"
-        outputMapping["general"]["scanned at"] = datetime.now().strftime("%d/%m/%y, at %H:%M:%S")
-        outputMapping["general"]["platform"] = platform.system()
+                                       recurse=args.recurse,
+                                       cache=cache,
+                                       stats=stats,
+                                       guard=guard,
+                                       ignore=ignore,
+                                       shard=shard)
     else:
-        outputMapping = parseDirectoryNoVerbose(dirData=root_data,
-                                                customSymbols=symbolData,
+        outputMapping = parseDirectoryNoVerbose(root=root,
+                                                customSymbols=customSymbols,
                                                 fileFilterFunction=fileFilter,
                                                 directoryFilterFunction=directoryFilter,
                                                 minChars=args.min_chars if isinstance(args.min_chars, int) else args.min_chars[0],
-                                                recurse=args.recurse)
-        
-        outputMapping["general"]["time"] = f"{time()-epoch:.3f}s"
-        outputMapping["general"]["scanned at"] = datetime.now().strftime("%d/%m/%y, at %H:%M:%S")
-        outputMapping["general"]["platform"] = platform.system()
+                                                recurse=args.recurse,
+                                                cache=cache,
+                                                stats=stats,
+                                                guard=guard,
+                                                ignore=ignore,
+                                                shard=shard)
+
+    if cache:
+        cache.close()
+
+    if shard:
+        writePartial(outputMapping, args.output[0], shard, roots, time() - epoch)
+        print(f"Shard {shard} of {', '.join(roots)} written to {args.output[0]}")
+        dumpStats(stats, args.stats_output)
+        exit(200)
+
+    # Non-verbose scans return a flat mapping
+    generalData: dict = outputMapping["general"] if "general" in outputMapping else outputMapping
+    generalData["time"] = f"{time()-epoch:.3f}s"
+    generalData["scanned at"] = datetime.now().strftime("%d/%m/%y, at %H:%M:%S")
+    generalData["platform"] = platform.system()
 
     print("=================== SCAN COMPLETE ====================")
-    if args.output:
+    outputEpoch: float = perf_counter()
+    if bHistory:
+        dumpOutputSQLHistory(outputMapping=outputMapping, fpath=args.output[0], deltas=args.history_deltas)
+    elif args.output:
         outputFiletype: str = args.output[0].split(".")[-1].lower()
 
         # Fetch output function based on file extension, default to standard write logic
@@ -200,7 +621,10 @@ def main() -> None:
         outputFunction(outputMapping=outputMapping, fpath=args.output[0])
     else:
         print(outputMapping)
-        exit(200)
+    if stats:
+        stats.addPhase("output", perf_counter() - outputEpoch)
+    dumpStats(stats, args.stats_output)
+    exit(200)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
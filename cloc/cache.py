@@ -0,0 +1,123 @@
+'''Persistent, incremental cache of per-file scan results backed by SQLite'''
+import os
+import threading
+from time import time
+
+from cloc.config import cacheDirectory
+
+def defaultCachePath() -> str:
+    '''Location of the cache database, respecting XDG_CACHE_HOME if set'''
+    return os.path.join(cacheDirectory(), "cache.db")
+
+class ResultCache:
+    '''#### Cache of (loc, total_lines) per file, keyed by path, size, mtime_ns and inode\n
+    Entries are only reused if the comment symbols and minChars used to produce them match the current scan.
+    New results are buffered in memory and written in a single transaction on `close()`, which also evicts stale entries.
+    Lookups are guarded by a lock so that the cache can be shared by the worker threads of a parallel scan.
+
+    Results for git blobs are stored separately, keyed by blob hash, since a blob's contents can never change.
+
+    #### Eviction policy:
+    1) Entries under a scanned root that were not seen during the scan belong to deleted (or now filtered) files, and are removed\n
+    2) Entries that have not been seen for `maxAge` seconds are removed regardless of root\n
+    3) The database is vacuumed once more than a quarter of its pages are free
+    '''
+    __slots__ = ("path", "maxAge", "connection", "lock", "pending", "seen", "pendingBlobs", "seenBlobs", "roots", "epoch")
+
+    def __init__(self, path: os.PathLike | None = None, maxAge: float = 30 * 24 * 60 * 60):
+        self.path: str = os.fspath(path or defaultCachePath())
+        self.maxAge: float = maxAge
+        self.lock: threading.Lock = threading.Lock()
+        self.pending: list[tuple] = []
+        self.seen: list[tuple[float, str]] = []
+        self.pendingBlobs: list[tuple] = []
+        self.seenBlobs: list[tuple[float, str, bytes, int]] = []
+        self.roots: set[str] = set()
+        self.epoch: float = time()
+
+        import sqlite3
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection: sqlite3.Connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL;")
+        self.connection.execute("PRAGMA synchronous = NORMAL;")
+        self.connection.execute('''
+                                CREATE TABLE IF NOT EXISTS file_cache (path TEXT PRIMARY KEY,
+                                size INTEGER NOT NULL,
+                                mtime_ns INTEGER NOT NULL,
+                                inode INTEGER NOT NULL,
+                                symbols BLOB NOT NULL,
+                                min_chars INTEGER NOT NULL,
+                                loc INTEGER NOT NULL,
+                                total_lines INTEGER NOT NULL,
+                                last_seen REAL NOT NULL);
+                                ''')
+        self.connection.execute('''
+                                CREATE TABLE IF NOT EXISTS blob_cache (sha TEXT NOT NULL,
+                                symbols BLOB NOT NULL,
+                                min_chars INTEGER NOT NULL,
+                                loc INTEGER NOT NULL,
+                                total_lines INTEGER NOT NULL,
+                                last_seen REAL NOT NULL,
+                                PRIMARY KEY (sha, symbols, min_chars));
+                                ''')
+        self.connection.commit()
+
+    def addRoot(self, root: os.PathLike) -> None:
+        '''Register a scanned root, entries under it that are not seen during this scan will be evicted on close'''
+        self.roots.add(os.path.abspath(root))
+
+    def lookup(self, filepath: str, stat: os.stat_result, symbolKey: bytes, minChars: int) -> tuple[int, int] | None:
+        '''Fetch cached (loc, total_lines) for a file, or None if the file or scan settings have changed since it was cached'''
+        with self.lock:
+            row: tuple | None = self.connection.execute("SELECT size, mtime_ns, inode, symbols, min_chars, loc, total_lines FROM file_cache WHERE path = ?;",
+                                                        (filepath,)).fetchone()
+        if not row or row[:5] != (stat.st_size, stat.st_mtime_ns, stat.st_ino, symbolKey, minChars):
+            return None
+        self.seen.append((self.epoch, filepath))
+        return row[5], row[6]
+
+    def store(self, filepath: str, stat: os.stat_result, symbolKey: bytes, minChars: int, loc: int, totalLines: int) -> None:
+        '''Buffer a fresh result, to be written on `close()`'''
+        self.pending.append((filepath, stat.st_size, stat.st_mtime_ns, stat.st_ino, symbolKey, minChars, loc, totalLines, self.epoch))
+
+    def lookupBlob(self, sha: str, symbolKey: bytes, minChars: int) -> tuple[int, int] | None:
+        '''Fetch cached (loc, total_lines) for a git blob scanned with the same settings, or None'''
+        with self.lock:
+            row: tuple | None = self.connection.execute("SELECT loc, total_lines FROM blob_cache WHERE sha = ? AND symbols = ? AND min_chars = ?;",
+                                                        (sha, symbolKey, minChars)).fetchone()
+        if not row:
+            return None
+        self.seenBlobs.append((self.epoch, sha, symbolKey, minChars))
+        return row[0], row[1]
+
+    def storeBlob(self, sha: str, symbolKey: bytes, minChars: int, loc: int, totalLines: int) -> None:
+        '''Buffer a fresh git blob result, to be written on `close()`'''
+        self.pendingBlobs.append((sha, symbolKey, minChars, loc, totalLines, self.epoch))
+
+    def close(self) -> None:
+        '''Flush buffered results, evict stale entries and release the database'''
+        try:
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO file_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);", self.pending)
+                self.connection.executemany("UPDATE file_cache SET last_seen = ? WHERE path = ?;", self.seen)
+                self.connection.executemany("INSERT OR REPLACE INTO blob_cache VALUES (?, ?, ?, ?, ?, ?);", self.pendingBlobs)
+                self.connection.executemany("UPDATE blob_cache SET last_seen = ? WHERE sha = ? AND symbols = ? AND min_chars = ?;", self.seenBlobs)
+
+                for root in self.roots:
+                    # Range scan over the primary key instead of LIKE, which would need escaping and cannot use the index
+                    prefix: str = os.path.join(root, "")
+                    self.connection.execute("DELETE FROM file_cache WHERE path >= ? AND path < ? AND last_seen < ?;",
+                                            (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1), self.epoch))
+                self.connection.execute("DELETE FROM file_cache WHERE last_seen < ?;", (self.epoch - self.maxAge,))
+                self.connection.execute("DELETE FROM blob_cache WHERE last_seen < ?;", (self.epoch - self.maxAge,))
+
+            freePages: int = self.connection.execute("PRAGMA freelist_count;").fetchone()[0]
+            totalPages: int = self.connection.execute("PRAGMA page_count;").fetchone()[0]
+            if totalPages and freePages * 4 > totalPages:
+                self.connection.execute("VACUUM;")
+        finally:
+            self.pending.clear()
+            self.seen.clear()
+            self.pendingBlobs.clear()
+            self.seenBlobs.clear()
+            self.connection.close()
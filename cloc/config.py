@@ -1,10 +1,29 @@
 '''Python objects for storing config info'''
 import json
 import os
+from functools import lru_cache
 from types import SimpleNamespace, MappingProxyType
 
-with open(os.path.join(os.path.dirname(__file__), "languages.json"), 'rb') as lang:
-    LANGUAGES: MappingProxyType = MappingProxyType(json.loads(lang.read()))
+LANGUAGES_PATH: str = os.path.join(os.path.dirname(__file__), "languages.json")
 
 with open(os.path.join(os.path.dirname(__file__), "config.json"), "rb") as config:
-    DEFAULTS: SimpleNamespace = SimpleNamespace(**{flag: default for flag, default in json.loads(config.read())['defaults'].items()})
\ No newline at end of file
+    CONFIG: dict = json.loads(config.read())
+    VERSION: str | None = CONFIG.get("version")
+    DEFAULTS: SimpleNamespace = SimpleNamespace(**{flag: default for flag, default in CONFIG['defaults'].items()})
+
+def cacheDirectory() -> str:
+    '''Directory holding pycloc's caches, respecting XDG_CACHE_HOME if set'''
+    cacheHome: str = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cacheHome, "pycloc")
+
+@lru_cache(maxsize=None)
+def loadLanguages() -> MappingProxyType:
+    '''Parse `languages.json`. Scans read the compiled symbol table instead (see `symbols.loadSymbolData`), so this only runs when it has to be rebuilt'''
+    with open(LANGUAGES_PATH, 'rb') as lang:
+        return MappingProxyType(json.loads(lang.read()))
+
+def __getattr__(name: str):
+    # LANGUAGES is parsed on first access rather than at import time
+    if name == "LANGUAGES":
+        return loadLanguages()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
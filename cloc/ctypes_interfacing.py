@@ -1,20 +1,86 @@
 import ctypes
 import os
+from functools import lru_cache
 
-lib = ctypes.CDLL(os.path.join(os.path.dirname(__file__), "line_parsing.so"))
+LIBRARY_PATH: str = os.path.join(os.path.dirname(__file__), "line_parsing.so")
 
-class BatchScanResult(ctypes.Structure):
-    _fields_ = [("commentedBlock", ctypes.c_bool), ("validLines", ctypes.c_int)]
+# Kinds of symbols understood by the native scanner, see line_parsing.c
+TOKEN_LINE_COMMENT: int = 0
+TOKEN_BLOCK_COMMENT: int = 1
+TOKEN_STRING: int = 2
+TOKEN_MULTILINE_STRING: int = 3
+MAX_TOKENS: int = 32
 
-lib.scanBatch.argtypes = [ctypes.POINTER(ctypes.c_char_p),
-                         ctypes.c_int,
-                         ctypes.c_bool,
-                         ctypes.c_int,
-                         ctypes.c_char_p,
-                         ctypes.c_int,
-                         ctypes.c_char_p,
-                         ctypes.c_int,
-                         ctypes.c_char_p,
-                         ctypes.c_int]
+# Scanner state outside of any comment or string. Inside token i (in declaration order) the state is i + 1
+STATE_CODE: int = 0
 
-lib.scanBatch.restype = BatchScanResult
\ No newline at end of file
+class ScanToken(ctypes.Structure):
+    _fields_ = [("open", ctypes.c_char_p),
+                ("openLength", ctypes.c_int),
+                ("close", ctypes.c_char_p),
+                ("closeLength", ctypes.c_int),
+                ("kind", ctypes.c_int),
+                ("raw", ctypes.c_int)]
+
+class BufferScanResult(ctypes.Structure):
+    _fields_ = [("state", ctypes.c_int), ("validLines", ctypes.c_int64), ("totalLines", ctypes.c_int64)]
+
+@lru_cache(maxsize=None)
+def loadLibrary() -> ctypes.CDLL:
+    '''Load the native scanner and declare its signatures. Deferred until the first file is scanned, so that runs which never scan (such as `pycloc -v`) do not pay for it'''
+    lib: ctypes.CDLL = ctypes.CDLL(LIBRARY_PATH)
+    lib.scanTableSize.argtypes = []
+    lib.scanTableSize.restype = ctypes.c_size_t
+
+    # Tables are opaque to Python, callers allocate scanTableSize() bytes and let the native side fill them
+    lib.compileScanTable.argtypes = [ctypes.POINTER(ScanToken),
+                                     ctypes.c_int,
+                                     ctypes.c_void_p]
+
+    lib.compileScanTable.restype = ctypes.c_int
+
+    lib.scanBufferTable.argtypes = [ctypes.c_void_p,
+                                    ctypes.c_size_t,
+                                    ctypes.c_int,
+                                    ctypes.c_int,
+                                    ctypes.c_void_p]
+
+    lib.scanBufferTable.restype = BufferScanResult
+    return lib
+
+class NativeScanTable:
+    '''Compiled table of the native scanner, passed to it by reference. Keeps the token array it points into alive'''
+    __slots__ = ("tokens", "_as_parameter_")
+
+    def __init__(self, tokens: ctypes.Array, table: ctypes.Array):
+        self.tokens: ctypes.Array = tokens
+        self._as_parameter_: ctypes.Array = table
+
+class NativeEngine:
+    '''#### Scan engine backed by the native table-driven scanner (see line_parsing.c)\n
+    Scans release the GIL, so chunks of a large file can be scanned by parallel threads. Raises OSError if the shared library cannot be loaded
+    '''
+    __slots__ = ("lib", "scanBufferTable")
+    name: str = "native"
+    parallel: bool = True
+
+    def __init__(self):
+        self.lib: ctypes.CDLL = loadLibrary()
+        # Bound once, so that scans call straight into the library
+        self.scanBufferTable: ctypes._CFuncPtr = self.lib.scanBufferTable
+
+    def compileTable(self, tokens: tuple[tuple[bytes, bytes | None, int, bool], ...]) -> NativeScanTable | None:
+        '''Compile (open, close, kind, raw) symbols into a table, or return None if they are malformed'''
+        tokenArray: ctypes.Array = (ScanToken * len(tokens))(*(ScanToken(open, len(open), close, len(close) if close else 0, kind, raw) for open, close, kind, raw in tokens))
+        table: ctypes.Array = ctypes.create_string_buffer(self.lib.scanTableSize())
+        if self.lib.compileScanTable(tokenArray, len(tokens), table):
+            return None
+        return NativeScanTable(tokenArray, table)
+
+def __getattr__(name: str):
+    # `lib` and `SCAN_TABLE_SIZE` used to be loaded at import time, importing them by name still works but loads the library right away
+    if name == "lib":
+        return loadLibrary()
+    if name == "SCAN_TABLE_SIZE":
+        return loadLibrary().scanTableSize()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,43 @@
+'''Selection of the engine buffers are scanned with: the native scanner, or its pure-Python counterpart where the shared library is unavailable'''
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from cloc.config import DEFAULTS
+
+ENGINES: tuple[str, ...] = ("auto", "native", "python")
+
+# Engine used by `loadEngine`, see `selectEngine`
+selectedEngine: str = DEFAULTS.engine
+
+if TYPE_CHECKING:   # Either engine is only imported once it is created
+    from cloc.ctypes_interfacing import NativeEngine
+    from cloc.fallback_parsing import PythonEngine
+
+def selectEngine(name: str) -> None:
+    '''#### Choose the engine files are scanned with\n
+    "native" requires the shared library, "python" never loads it, and "auto" prefers the native engine, falling back to the pure-Python one if the library cannot be loaded.
+    Symbols are compiled for the engine in use when they are first needed, so this should be called before any file is scanned
+    '''
+    global selectedEngine
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine {name}, expected one of {', '.join(ENGINES)}")
+    selectedEngine = name
+
+@lru_cache(maxsize=None)
+def createEngine(name: str) -> "NativeEngine | PythonEngine":
+    '''Create an engine by name, raising OSError if "native" is asked for and the shared library cannot be loaded'''
+    if name not in ENGINES:
+        raise ValueError(f"Unknown engine {name}, expected one of {', '.join(ENGINES)}")
+    if name != "python":
+        from cloc.ctypes_interfacing import NativeEngine
+        try:
+            return NativeEngine()
+        except OSError:
+            if name == "native":
+                raise
+    from cloc.fallback_parsing import PythonEngine
+    return PythonEngine()
+
+def loadEngine() -> "NativeEngine | PythonEngine":
+    '''The engine selected with `selectEngine` (or the configured default), created on first use'''
+    return createEngine(selectedEngine)
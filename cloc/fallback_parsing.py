@@ -0,0 +1,223 @@
+'''#### Pure-Python counterpart of the native table-driven scanner (see line_parsing.c), used where the shared library is unavailable\n
+Counts are identical to the native engine's. Instead of stepping through every byte, the scanner jumps between the symbols that can change its state with compiled regular expressions,
+and counts the plain text between them a whole run of lines at a time with bytes methods, so the Python-level work is proportional to the number of symbols rather than to the number of bytes
+'''
+import ctypes
+import re
+from functools import lru_cache
+
+from cloc.ctypes_interfacing import BufferScanResult, STATE_CODE, TOKEN_LINE_COMMENT, TOKEN_BLOCK_COMMENT, TOKEN_STRING, TOKEN_MULTILINE_STRING, MAX_TOKENS
+
+WHITESPACE: bytes = b" \t\r"    # Never counted as valid characters, newlines end lines
+
+@lru_cache(maxsize=None)
+def shortLineRegex(threshold: int) -> re.Pattern:
+    '''Regular expression matching the newline before every complete line with at most `threshold` valid characters. Such lines (mostly blank ones) are rarer than valid lines, so fewer matches are built'''
+    return re.compile(rb"\n(?:[ \t\r]*[^ \t\r\n]){0,%d}[ \t\r]*(?=\n)" % threshold)
+
+def compileAlternatives(alternatives: list[tuple[bytes, bytes]]) -> re.Pattern:
+    '''#### Compile regular expressions into one, each alternative in its own group (so `lastindex` tells which matched), tried in order\n
+    The alternation is guarded by a lookahead on the bytes any alternative can start with, which the regex engine skips ahead to far faster than it tries every alternative at every byte
+
+    #### args:
+    alternatives: (regex, bytes it can start with) pairs
+    '''
+    firstBytes: bytes = b"".join(re.escape(bytes((byte,))) for byte in sorted(set(b"".join(first for _, first in alternatives))))
+    return re.compile(b"(?=[" + firstBytes + b"])(?:" + b"|".join(b"(" + regex + b")" for regex, _ in alternatives) + b")")
+
+def literal(symbol: bytes) -> tuple[bytes, bytes]:
+    return re.escape(symbol), symbol[:1]
+
+class PythonScanTable:
+    '''#### Symbols of a language compiled into the regular expressions the pure-Python scanner jumps between symbols with\n
+    #### args:
+    tokens: (open, close, kind, raw) of every symbol, in declaration order
+    '''
+    __slots__ = ("tokens", "codeRegex", "codeCandidates", "stateRegexes", "prefaceRegexes")
+
+    def __init__(self, tokens: tuple[tuple[bytes, bytes | None, int, bool], ...]):
+        self.tokens: tuple[tuple[bytes, bytes | None, int, bool], ...] = tokens
+
+        # Symbols recognised in code: every opening symbol, and the closing symbol of every block comment (consumed as a stray close).
+        # Alternatives are tried in order, so candidates are ordered as the native table orders them: by first byte, longest first, ties in declaration order
+        candidates: list[tuple[bytes, int, bool]] = []
+        for index, (open, close, kind, _) in enumerate(tokens):
+            candidates.append((open, index, False))
+            if kind == TOKEN_BLOCK_COMMENT:
+                candidates.append((close, index, True))
+        candidates.sort(key=lambda candidate: (candidate[0][0], -len(candidate[0])))
+        self.codeRegex: re.Pattern | None = compileAlternatives([literal(symbol) for symbol, _, _ in candidates]) if candidates else None
+        self.codeCandidates: tuple[tuple[int, bool], ...] = tuple((index, isClose) for _, index, isClose in candidates)
+
+        # Inside a block comment only its end and line comment symbols matter, and only its end once a line comment symbol was seen on the line.
+        # Inside a string its end, newlines and escapes (unless it is raw) matter. Groups: 1 is the closing symbol, 2 a newline (or line comment symbol in a block), 3 an escape
+        lineComments: list[bytes] = [symbol for symbol, index, isClose in candidates if not isClose and tokens[index][2] == TOKEN_LINE_COMMENT]
+        lineCommentGroup: list[tuple[bytes, bytes]] = [(b"|".join(map(re.escape, lineComments)), b"".join(symbol[:1] for symbol in lineComments))] if lineComments else []
+        self.stateRegexes: list[re.Pattern | None] = []
+        self.prefaceRegexes: list[re.Pattern | None] = []
+        for open, close, kind, raw in tokens:
+            if kind == TOKEN_LINE_COMMENT:
+                self.stateRegexes.append(None)
+                self.prefaceRegexes.append(None)
+            elif kind == TOKEN_BLOCK_COMMENT:
+                self.stateRegexes.append(compileAlternatives([literal(close), *lineCommentGroup]))
+                self.prefaceRegexes.append(compileAlternatives([literal(close), literal(b"\n")]))
+            else:
+                self.stateRegexes.append(compileAlternatives([literal(close), literal(b"\n")] + ([] if raw else [(rb"\\[^\n]", b"\\")])))
+                self.prefaceRegexes.append(None)
+
+def validCharacters(text: bytes) -> int:
+    return len(text.translate(None, WHITESPACE))
+
+def scanBytes(data: bytes, state: int, minChars: int, table: PythonScanTable) -> BufferScanResult:
+    '''#### Scan a buffer in a single pass starting in the given state, with the same semantics as the native `scanBufferTable`\n
+    A trailing line without a newline is counted. Whitespace, comments and comment symbols never count as valid characters, string literals (including their delimiters) do
+    '''
+    tokens: tuple[tuple[bytes, bytes | None, int, bool], ...] = table.tokens
+    end: int = len(data)
+    # The native scanner compares against minChars as an unsigned size, where no line reaches a negative threshold
+    threshold: int = minChars if minChars >= 0 else end
+    lineRegex: re.Pattern | None = shortLineRegex(threshold) if threshold < end else None
+
+    # No line starts inside a line comment, such states (and unknown ones) start in code
+    if not STATE_CODE < state <= len(tokens) or tokens[state - 1][2] == TOKEN_LINE_COMMENT:
+        state = STATE_CODE
+    position: int = 0
+    validLines: int = 0
+    totalLines: int = 0
+    validChars: int = 0
+    # A line comment symbol inside a block comment marks the rest of its line as commented, even after the block ends. See line_parsing.c
+    lineCommentPreface: bool = False
+
+    while position < end:
+        if state == STATE_CODE:
+            match: re.Match | None = table.codeRegex.search(data, position) if table.codeRegex else None
+            stop: int = match.start() if match else end
+
+            # Plain text up to the next symbol. Complete lines in it are counted at once, only the partial lines at either end are looked at in Python
+            newline: int = data.find(b"\n", position, stop)
+            if newline == -1:
+                if not lineCommentPreface:
+                    validChars += validCharacters(data[position:stop])
+            else:
+                if not lineCommentPreface:
+                    validChars += validCharacters(data[position:newline])
+                validLines += validChars > threshold
+                totalLines += 1
+                lastNewline: int = data.rfind(b"\n", newline, stop)
+                if lastNewline > newline:
+                    completeLines: int = data.count(b"\n", newline + 1, lastNewline + 1)
+                    totalLines += completeLines
+                    if lineRegex is not None:
+                        validLines += completeLines - len(lineRegex.findall(data, newline, lastNewline + 1))
+                validChars = validCharacters(data[lastNewline + 1:stop])
+                lineCommentPreface = False
+
+            if match is None:
+                break
+            position = match.end()
+            index, isClose = table.codeCandidates[match.lastindex - 1]
+            if isClose:
+                continue    # Stray block comment end, never counted
+            kind: int = tokens[index][2]
+            if kind == TOKEN_LINE_COMMENT:
+                # Rest of the line is a comment, skip straight to its end
+                newline = data.find(b"\n", position)
+                position = newline if newline != -1 else end
+                continue
+            if kind != TOKEN_BLOCK_COMMENT and not lineCommentPreface:
+                validChars += position - match.start()
+            state = index + 1
+            continue
+
+        kind = tokens[state - 1][2]
+        if kind == TOKEN_BLOCK_COMMENT:
+            if lineCommentPreface:
+                # Only the end of the block matters for the rest of the line
+                match = table.prefaceRegexes[state - 1].search(data, position)
+                if match is None:
+                    break
+                position = match.end()
+                if match.lastindex == 1:
+                    state = STATE_CODE
+                else:
+                    validLines += validChars > threshold
+                    totalLines += 1
+                    validChars = 0
+                    lineCommentPreface = False
+                continue
+
+            # Lines entirely inside the block have no valid characters, so they are counted at once
+            match = table.stateRegexes[state - 1].search(data, position)
+            stop = match.start() if match else end
+            newlines: int = data.count(b"\n", position, stop)
+            if newlines:
+                validLines += validChars > threshold
+                totalLines += newlines
+                validChars = 0
+            if match is None:
+                break
+            position = match.end()
+            if match.lastindex == 1:
+                state = STATE_CODE
+            else:
+                lineCommentPreface = True
+            continue
+
+        # String literal, its contents count as code. Backslash escapes the next character, unless the string is raw
+        match = table.stateRegexes[state - 1].search(data, position)
+        stop = match.start() if match else end
+        if not lineCommentPreface:
+            validChars += validCharacters(data[position:stop])
+        if match is None:
+            break
+        position = match.end()
+        if match.lastindex == 1:
+            if not lineCommentPreface:
+                validChars += position - stop
+            state = STATE_CODE
+        elif match.lastindex == 2:
+            validLines += validChars > threshold
+            totalLines += 1
+            validChars = 0
+            lineCommentPreface = False
+            if kind == TOKEN_STRING:
+                state = STATE_CODE
+        elif not lineCommentPreface:
+            validChars += 1     # The backslash, the escaped character is skipped
+
+    if end and data[-1] != 0x0A:
+        validLines += validChars > threshold
+        totalLines += 1
+        if state != STATE_CODE and tokens[state - 1][2] == TOKEN_STRING:
+            state = STATE_CODE
+    return BufferScanResult(state, validLines, totalLines)
+
+class PythonEngine:
+    '''#### Scan engine implemented in Python, with the same interface and counts as `NativeEngine`\n
+    Scans hold the GIL, so large files are not split into chunks scanned by parallel threads
+    '''
+    __slots__ = ()
+    name: str = "python"
+    parallel: bool = False
+
+    def compileTable(self, tokens: tuple[tuple[bytes, bytes | None, int, bool], ...]) -> PythonScanTable | None:
+        '''Compile (open, close, kind, raw) symbols into a table, or return None if they are malformed, as `compileScanTable` does'''
+        if len(tokens) > MAX_TOKENS:
+            return None
+        for open, close, kind, _ in tokens:
+            if kind not in (TOKEN_LINE_COMMENT, TOKEN_BLOCK_COMMENT, TOKEN_STRING, TOKEN_MULTILINE_STRING) or not open or b"\n" in open:
+                return None
+            if kind != TOKEN_LINE_COMMENT and (not close or b"\n" in close):
+                return None
+        return PythonScanTable(tokens)
+
+    def scanBufferTable(self, buffer: bytes | ctypes.Array | int, length: int, state: int, minChars: int, table: PythonScanTable) -> BufferScanResult:
+        '''Scan the first `length` bytes of a buffer (or of the memory at an address, as the native scanner accepts), see `scanBytes`'''
+        if isinstance(buffer, int):
+            data: bytes = ctypes.string_at(buffer, length)
+        elif isinstance(buffer, bytes) and len(buffer) == length:
+            data = buffer
+        else:
+            data = bytes(memoryview(buffer)[:length])
+        return scanBytes(data, state, minChars, table)
@@ -0,0 +1,230 @@
+'''Module to scan git revisions straight from the object database, without checking them out'''
+import os
+import subprocess
+from time import perf_counter
+from typing import Callable
+
+from cloc.cache import ResultCache
+from cloc.guard import FileGuard
+from cloc.parsing import parseBuffer, resolveSymbols
+from cloc.stats import ScanStats
+from cloc.symbols import LanguageSymbols
+
+NULL_SHA: str = "0" * 40
+SKIPPED_MODES: frozenset = frozenset(("120000", "160000"))    # Symlinks and submodules
+
+class BlobReader:
+    '''#### Long-lived `git cat-file --batch` process to read blob contents without spawning a process per blob\n
+    Usable as a context manager, the process is terminated on exit
+    '''
+    __slots__ = ("process",)
+
+    def __init__(self, repository: os.PathLike):
+        self.process: subprocess.Popen = subprocess.Popen(["git", "-C", os.fspath(repository), "cat-file", "--batch"],
+                                                          stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def read(self, sha: str) -> bytes:
+        self.process.stdin.write(f"{sha}\n".encode())
+        self.process.stdin.flush()
+        header: list[bytes] = self.process.stdout.readline().split()
+        if len(header) != 3:
+            raise ValueError(f"Object {sha} could not be read")
+        contents: bytes = self.process.stdout.read(int(header[2]))
+        self.process.stdout.read(1)    # Trailing newline after every object
+        return contents
+
+    def close(self) -> None:
+        self.process.stdin.close()
+        self.process.wait()
+        self.process.stdout.close()
+
+    def __enter__(self) -> "BlobReader":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+def listTree(repository: os.PathLike, revision: str) -> list[tuple[str, str]]:
+    '''List (path, blob hash) pairs for every regular file in the tree of a revision'''
+    output: bytes = subprocess.run(["git", "-C", os.fspath(repository), "ls-tree", "-r", "-z", "--full-tree", revision],
+                                   check=True, capture_output=True).stdout
+    entries: list[tuple[str, str]] = []
+    for record in output.split(b"\0"):
+        if not record:
+            continue
+        metadata, path = record.split(b"\t", 1)
+        mode, objectType, sha = metadata.decode().split()
+        if objectType != "blob" or mode in SKIPPED_MODES:
+            continue
+        entries.append((os.fsdecode(path), sha))
+    return entries
+
+def diffTrees(repository: os.PathLike, fromRevision: str, toRevision: str) -> list[tuple[str, str, str, str]]:
+    '''List (path, status, old blob hash, new blob hash) for every regular file changed between two revisions. Missing sides use the null hash'''
+    output: bytes = subprocess.run(["git", "-C", os.fspath(repository), "diff-tree", "-r", "-z", "--no-renames", fromRevision, toRevision],
+                                   check=True, capture_output=True).stdout
+    records: list[bytes] = output.split(b"\0")
+    changes: list[tuple[str, str, str, str]] = []
+    for metadata, path in zip(records[::2], records[1::2]):
+        oldMode, newMode, oldSha, newSha, status = metadata.decode().lstrip(":").split()
+        if oldMode in SKIPPED_MODES:
+            oldSha = NULL_SHA
+        if newMode in SKIPPED_MODES:
+            newSha = NULL_SHA
+        if oldSha == NULL_SHA and newSha == NULL_SHA:
+            continue
+        changes.append((os.fsdecode(path), status, oldSha, newSha))
+    return changes
+
+def acceptPath(path: str, fileFilterFunction: Callable, directoryFilterFunction: Callable, recurse: bool) -> bool:
+    '''Apply the same file and directory filters as a directory scan to a repository-relative path'''
+    *directories, file = path.split("/")
+    if directories and not recurse:
+        return False
+    return all(directoryFilterFunction(directory) for directory in directories) and fileFilterFunction(file)
+
+def scanBlob(reader: BlobReader, sha: str, path: str, customSymbols: LanguageSymbols | None, minChars: int, blobResults: dict, cache: ResultCache | None = None, stats: ScanStats | None = None, guard: FileGuard | None = None) -> tuple[int, int] | None:
+    '''#### Scan a blob, reusing earlier results for the same blob hash and comment symbols\n
+    blobResults: In-memory mapping of previous results, shared across revisions and paths within a run
+
+    #### returns:
+    integer pair of loc and total lines, or None if the language of the path is unknown or the guard skipped the blob
+    '''
+    name: str = os.path.basename(path)
+    symbols: LanguageSymbols | None = resolveSymbols(name, customSymbols)
+    if not symbols:
+        return None
+    if guard is not None:
+        reason: str | None = guard.checkFile(name, 0)
+        if reason:
+            guard.record(reason)
+            return None
+
+    symbolKey: bytes = symbols.key + guard.key if guard else symbols.key
+    result: tuple[int, int] | None = blobResults.get((sha, symbolKey))
+    if result == ():
+        return None     # Skipped by the guard in an earlier revision or path
+    if result:
+        if stats is not None:
+            stats.recordFile(path, 0, 0.0, *result, cached=True)
+        return result
+    if stats is not None:
+        epoch: float = perf_counter()
+    if cache:
+        result = cache.lookupBlob(sha, symbolKey, minChars)
+        if stats is not None:
+            stats.addPhase("cache", perf_counter() - epoch)
+            if result:
+                stats.recordFile(path, 0, perf_counter() - epoch, *result, cached=True)
+    if not result:
+        if stats is not None:
+            readEpoch: float = perf_counter()
+        contents: bytes = reader.read(sha)
+        if stats is not None:
+            stats.addPhase("open", perf_counter() - readEpoch)
+        reason: str | None = guard.checkFile(name, len(contents)) if guard is not None else None
+        if reason:
+            guard.record(reason)
+        else:
+            result = parseBuffer(contents, symbols, minChars, stats, guard)
+        if not result:
+            blobResults[(sha, symbolKey)] = ()
+            return None
+        if stats is not None:
+            stats.recordFile(path, len(contents), perf_counter() - epoch, *result)
+        if cache:
+            cache.storeBlob(sha, symbolKey, minChars, *result)
+
+    blobResults[(sha, symbolKey)] = result
+    return result
+
+def parseRevision(repository: os.PathLike, revision: str, customSymbols: LanguageSymbols | None = None, fileFilterFunction: Callable = lambda _: True, directoryFilterFunction: Callable = lambda _: False, minChars: int = 0, recurse: bool = False, verbose: bool = True, cache: ResultCache | None = None, blobResults: dict | None = None, stats: ScanStats | None = None, guard: FileGuard | None = None) -> dict:
+    '''#### Scan the tree of a revision by reading blobs straight from the object database\n
+    #### args:
+    repository: Path to a local git repository\n
+    revision: Any revision git understands, such as a commit hash, branch or tag\n
+    blobResults: Optional mapping of previous blob results, pass the same mapping to scan several revisions while scanning every distinct blob once
+
+    #### returns:
+    Mapping in the same shape as `parseDirectory` (or `parseDirectoryNoVerbose` if not verbose), with repository-relative directories as keys
+    '''
+    if blobResults is None:
+        blobResults = {}
+
+    loc: int = 0
+    totalLines: int = 0
+    unknown: int = 0
+    outputMapping: dict = {"general" : {}}
+    if stats is not None:
+        epoch: float = perf_counter()
+    entries: list[tuple[str, str]] = listTree(repository, revision)
+    if stats is not None:
+        stats.addPhase("walk", perf_counter() - epoch)
+    with BlobReader(repository) as reader:
+        for path, sha in entries:
+            if not acceptPath(path, fileFilterFunction, directoryFilterFunction, recurse):
+                continue
+            if not resolveSymbols(os.path.basename(path), customSymbols):
+                unknown += 1
+                continue
+            result: tuple[int, int] | None = scanBlob(reader, sha, path, customSymbols, minChars, blobResults, cache, stats, guard)
+            if not result:
+                continue    # Skipped by the guard, counted there
+            l, tl = result
+            loc += l
+            totalLines += tl
+            if verbose:
+                outputMapping.setdefault(os.path.dirname(path) or ".", {})[os.path.basename(path)] = {"loc" : l, "total_lines" : tl}
+
+    generalData: dict = {"loc" : loc, "total" : totalLines, "unknown" : unknown, "revision" : revision}
+    if guard is not None:
+        generalData.update(guard.summary())
+    if not verbose:
+        return generalData
+
+    outputMapping["general"] = generalData
+    return outputMapping
+
+def parseRevisionDiff(repository: os.PathLike, fromRevision: str, toRevision: str, customSymbols: LanguageSymbols | None = None, fileFilterFunction: Callable = lambda _: True, directoryFilterFunction: Callable = lambda _: False, minChars: int = 0, recurse: bool = False, verbose: bool = True, cache: ResultCache | None = None, blobResults: dict | None = None, stats: ScanStats | None = None, guard: FileGuard | None = None) -> dict:
+    '''#### Compute the change in LOC and total lines between two revisions, scanning only the blobs that differ\n
+    All counts in the returned mapping are deltas (toRevision minus fromRevision), so per-commit trends can be built by chaining diffs
+
+    #### returns:
+    Mapping in the same shape as `parseDirectory` (or `parseDirectoryNoVerbose` if not verbose), with a `status` (A, D, M, T) for every changed file
+    '''
+    if blobResults is None:
+        blobResults = {}
+
+    loc: int = 0
+    totalLines: int = 0
+    unknown: int = 0
+    outputMapping: dict = {"general" : {}}
+    if stats is not None:
+        epoch: float = perf_counter()
+    changes: list[tuple[str, str, str, str]] = diffTrees(repository, fromRevision, toRevision)
+    if stats is not None:
+        stats.addPhase("walk", perf_counter() - epoch)
+    with BlobReader(repository) as reader:
+        for path, status, oldSha, newSha in changes:
+            if not acceptPath(path, fileFilterFunction, directoryFilterFunction, recurse):
+                continue
+            if not resolveSymbols(os.path.basename(path), customSymbols):
+                unknown += 1
+                continue
+            # Blobs skipped by the guard count as empty on their side of the diff
+            oldLOC, oldTotal = (0, 0) if oldSha == NULL_SHA else scanBlob(reader, oldSha, path, customSymbols, minChars, blobResults, cache, stats, guard) or (0, 0)
+            newLOC, newTotal = (0, 0) if newSha == NULL_SHA else scanBlob(reader, newSha, path, customSymbols, minChars, blobResults, cache, stats, guard) or (0, 0)
+            loc += newLOC - oldLOC
+            totalLines += newTotal - oldTotal
+            if verbose:
+                outputMapping.setdefault(os.path.dirname(path) or ".", {})[os.path.basename(path)] = {"loc" : newLOC - oldLOC, "total_lines" : newTotal - oldTotal, "status" : status}
+
+    revisionRange: str = f"{fromRevision}..{toRevision}"
+    generalData: dict = {"loc" : loc, "total" : totalLines, "unknown" : unknown, "revision" : revisionRange}
+    if guard is not None:
+        generalData.update(guard.summary())
+    if not verbose:
+        return generalData
+
+    outputMapping["general"] = generalData
+    return outputMapping
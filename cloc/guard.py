@@ -0,0 +1,91 @@
+'''Cheap pre-scan classification of binary, generated and oversized files, which are skipped instead of scanned'''
+import re
+import threading
+
+# Lockfiles and other generated files that are recognisable by name alone
+GENERATED_NAMES: frozenset[str] = frozenset(("package-lock.json", "npm-shrinkwrap.json", "yarn.lock", "pnpm-lock.yaml", "bun.lockb", "Cargo.lock", "poetry.lock", "Pipfile.lock",
+                                              "composer.lock", "Gemfile.lock", "go.sum", "flake.lock", "packages.lock.json", "Podfile.lock", "mix.lock", "pubspec.lock"))
+GENERATED_SUFFIXES: tuple[str, ...] = (".min.js", ".min.css", ".min.mjs", ".bundle.js", ".pb.go", "_pb2.py", "_pb2_grpc.py", ".pb.h", ".pb.cc", ".g.dart", ".freezed.dart", ".designer.cs", ".generated.cs")
+
+# Established generated-code markers, only looked for in the comment lines a file starts with: Go's convention, the @generated tag, and protoc's header
+GENERATED_MARKERS: tuple[re.Pattern, ...] = (re.compile(rb"^// Code generated .* DO NOT EDIT\.$"), re.compile(rb"@generated\b"), re.compile(rb"Generated by the protocol buffer compiler"))
+COMMENT_PREFIXES: tuple[bytes, ...] = (b"//", b"#", b"/*", b"*", b"--", b";", b"%", b"<!--", b"(*", b"{-")
+MARKER_WINDOW: int = 1024
+
+# Reasons for skipping a file, as reported in general data
+BINARY: str = "binary"
+GENERATED: str = "generated"
+TOO_LARGE: str = "too large"
+LONG_LINES: str = "long lines"
+
+def hasGeneratedMarker(head: bytes) -> bool:
+    '''Whether a generated-code marker appears in the comment lines leading a file. Blank lines are skipped, and the first line of code ends the search'''
+    for line in head.split(b"\n"):
+        line = line.rstrip(b"\r")
+        stripped: bytes = line.strip()
+        if not stripped:
+            continue
+        if not stripped.startswith(COMMENT_PREFIXES):
+            return False
+        if any(marker.search(line) for marker in GENERATED_MARKERS):
+            return True
+    return False
+
+class FileGuard:
+    '''#### Classifier deciding which files are skipped instead of scanned, counting skipped files by reason\n
+    Names and sizes are checked before a file is opened, and contents are checked on the first block of the file only, which is read by the scan anyway.
+    Counters are guarded by a lock so that a guard can be shared by worker threads
+
+    #### args:
+    detectBinary: Skip files with a NUL byte in their first block\n
+    detectGenerated: Skip lockfiles, minified bundles and files carrying a generated-code marker in their leading comments\n
+    maxFileSize: Skip files larger than this many bytes, None for no limit\n
+    maxLineLength: Skip files with a line longer than this many bytes within their first block, None for no limit\n
+    sniffBytes: Size of the first block inspected, extended to fit maxLineLength if needed
+    '''
+    __slots__ = ("detectBinary", "detectGenerated", "maxFileSize", "maxLineLength", "sniffBytes", "key", "skipped", "lock")
+
+    def __init__(self, detectBinary: bool = True, detectGenerated: bool = True, maxFileSize: int | None = None, maxLineLength: int | None = None, sniffBytes: int = 8192):
+        self.detectBinary: bool = detectBinary
+        self.detectGenerated: bool = detectGenerated
+        self.maxFileSize: int | None = maxFileSize
+        self.maxLineLength: int | None = maxLineLength
+        self.sniffBytes: int = max(sniffBytes, (maxLineLength or 0) + 1)
+        # Appended to cache keys, results cached under different guard settings are not reused
+        self.key: bytes = f"\0guard:{int(detectBinary)}{int(detectGenerated)}:{maxFileSize}:{maxLineLength}".encode()
+        self.skipped: dict[str, int] = {BINARY : 0, GENERATED : 0, TOO_LARGE : 0, LONG_LINES : 0}
+        self.lock: threading.Lock = threading.Lock()
+
+    def checkFile(self, name: str, size: int) -> str | None:
+        '''Classify a file by name and size, returning the reason to skip it or None'''
+        if self.maxFileSize is not None and size > self.maxFileSize:
+            return TOO_LARGE
+        if self.detectGenerated and (name in GENERATED_NAMES or name.endswith(GENERATED_SUFFIXES)):
+            return GENERATED
+        return None
+
+    def checkContents(self, head: bytes) -> str | None:
+        '''Classify a file by its first block, returning the reason to skip it or None'''
+        if self.detectBinary and b"\0" in head:
+            return BINARY
+        if self.detectGenerated and hasGeneratedMarker(head[:MARKER_WINDOW]):
+            return GENERATED
+        if self.maxLineLength is not None:
+            lineStart: int = 0
+            while lineStart < len(head):
+                lineEnd: int = head.find(b"\n", lineStart)
+                if lineEnd == -1:
+                    lineEnd = len(head)
+                if lineEnd - lineStart > self.maxLineLength:
+                    return LONG_LINES
+                lineStart = lineEnd + 1
+        return None
+
+    def record(self, reason: str) -> None:
+        with self.lock:
+            self.skipped[reason] += 1
+
+    def summary(self) -> dict[str, int]:
+        '''Skipped file counts, to be merged into the general data of a scan'''
+        with self.lock:
+            return {"skipped" : sum(self.skipped.values()), **{f"skipped {reason}" : count for reason, count in self.skipped.items()}}
@@ -0,0 +1,223 @@
+'''Hierarchical .gitignore/.clocignore support, compiled into one regular expression per ignore file and applied while walking'''
+import os
+import re
+from typing import Iterable
+
+IGNORE_FILE_NAMES: tuple[str, ...] = (".gitignore", ".clocignore")     # Later files of a directory take precedence
+ALWAYS_IGNORED: frozenset[str] = frozenset((".git",))
+
+def translateSegment(segment: str) -> str:
+    '''Translate a single path segment of a gitignore pattern (no slashes) into a regular expression'''
+    regex: list[str] = []
+    index: int = 0
+    while index < len(segment):
+        character: str = segment[index]
+        index += 1
+        if character == "*":
+            regex.append("[^/]*")
+        elif character == "?":
+            regex.append("[^/]")
+        elif character == "\\" and index < len(segment):
+            regex.append(re.escape(segment[index]))
+            index += 1
+        elif character == "[":
+            closing: int = segment.find("]", index + 1 if segment[index:index + 1] in ("!", "^") else index)
+            if closing == -1:
+                regex.append(re.escape(character))
+                continue
+            contents: str = segment[index:closing]
+            index = closing + 1
+            negated: bool = contents[:1] in ("!", "^")
+            if negated:
+                contents = contents[1:]
+            contents = contents.replace("\\", "\\\\").replace("[", "\\[")
+            regex.append(f"[^/{contents}]" if negated else f"[{contents}]")
+        else:
+            regex.append(re.escape(character))
+    return "".join(regex)
+
+def translatePattern(line: str) -> tuple[str, bool, bool] | None:
+    '''#### Translate a line of an ignore file into a regular expression matching paths relative to the ignore file's directory\n
+    #### returns:
+    (regex, negated, directory only), or None for blank lines and comments
+    '''
+    line = line.rstrip("\r\n")
+    stripped: str = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "     # Escaped trailing space
+    line = stripped
+    if not line or line.startswith("#"):
+        return None
+
+    negated: bool = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith(("\\!", "\\#")):
+        line = line[1:]
+
+    directoryOnly: bool = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+
+    # Patterns with a slash anywhere but at the end are relative to the ignore file, others match at any depth
+    anchored: bool = "/" in line
+    segments: list[str] = line.lstrip("/").split("/")
+    regex: list[str] = [] if anchored else ["(?:.*/)?"]
+    for index, segment in enumerate(segments):
+        last: bool = index == len(segments) - 1
+        if segment == "**":
+            regex.append(".+" if last else "(?:.*/)?")
+            continue
+        regex.append(translateSegment(segment))
+        if not last:
+            regex.append("/")
+    return "".join(regex), negated, directoryOnly
+
+class IgnoreRules:
+    '''#### Patterns of a single ignore file, compiled into one regular expression each for files and directories\n
+    Alternatives are ordered from the last pattern to the first, so the first alternative that matches is the last matching pattern, as gitignore precedence requires.
+    Matching a path costs one regex match however many patterns there are
+    '''
+    __slots__ = ("fileRegex", "fileNegations", "directoryRegex", "directoryNegations")
+
+    def __init__(self, lines: Iterable[str]):
+        patterns: list[tuple[str, bool, bool]] = [pattern for pattern in map(translatePattern, lines) if pattern]
+        patterns.reverse()
+        self.fileRegex, self.fileNegations = self.compile([(regex, negated) for regex, negated, directoryOnly in patterns if not directoryOnly])
+        self.directoryRegex, self.directoryNegations = self.compile([(regex, negated) for regex, negated, _ in patterns])
+
+    @staticmethod
+    def compile(patterns: list[tuple[str, bool]]) -> tuple[re.Pattern | None, tuple[bool, ...]]:
+        if not patterns:
+            return None, ()
+        return re.compile("|".join(f"({regex})" for regex, _ in patterns), re.DOTALL), tuple(negated for _, negated in patterns)
+
+    def __bool__(self) -> bool:
+        return self.directoryRegex is not None
+
+    def match(self, relativePath: str, isDirectory: bool) -> bool | None:
+        '''Whether a path relative to the ignore file's directory is ignored (True) or re-included (False), or None if no pattern matches it'''
+        regex: re.Pattern | None = self.directoryRegex if isDirectory else self.fileRegex
+        if regex is None:
+            return None
+        match: re.Match | None = regex.fullmatch(relativePath)
+        if match is None:
+            return None
+        return not (self.directoryNegations if isDirectory else self.fileNegations)[match.lastindex - 1]
+
+# Rules in effect in a directory, from lowest to highest precedence. Each level is (length of the walked path prefix to strip, prefix to prepend, rules),
+# turning a walked path into a path relative to the directory of its ignore file
+IgnoreScope = tuple[tuple[int, str, IgnoreRules], ...]
+
+class IgnoreMatcher:
+    '''#### Hierarchical ignore rules, applied while walking so that ignored subtrees are never entered\n
+    Ignore files are read from every walked directory, and from the directories between the enclosing git repository (if any) and a scanned root.
+    Rules of deeper directories take precedence, and `.git` directories are always pruned. Parsed ignore files are cached by directory
+
+    #### args:
+    patterns: Additional gitignore-style patterns, relative to every scanned root, with the lowest precedence\n
+    fileNames: Names of the ignore files to read
+    '''
+    __slots__ = ("patterns", "fileNames", "loaded")
+
+    def __init__(self, patterns: Iterable[str] = (), fileNames: tuple[str, ...] = IGNORE_FILE_NAMES):
+        self.patterns: IgnoreRules = IgnoreRules(patterns)
+        self.fileNames: tuple[str, ...] = fileNames
+        self.loaded: dict[str, IgnoreRules | None] = {}
+
+    def load(self, directory: str, names: Iterable[str] | None = None) -> IgnoreRules | None:
+        '''Read the ignore files of a directory, or return the cached rules. If the names of its entries are given, ignore files are only opened if present'''
+        if directory in self.loaded:
+            return self.loaded[directory]
+        lines: list[str] = []
+        presentNames: frozenset[str] | None = frozenset(names) if names is not None else None
+        for fileName in self.fileNames:
+            if presentNames is not None and fileName not in presentNames:
+                continue
+            try:
+                with open(os.path.join(directory, fileName), encoding="utf-8", errors="surrogateescape") as ignoreFile:
+                    lines.extend(ignoreFile)
+            except OSError:
+                continue
+        rules: IgnoreRules = IgnoreRules(lines)
+        if not rules:
+            return None
+        self.loaded[directory] = rules     # Only directories with rules are cached, so the cache stays small on large trees
+        return rules
+
+    def invalidate(self, directory: str | None = None) -> None:
+        '''Forget the cached rules of a directory (or of every directory if None), such as after one of its ignore files changed'''
+        if directory is None:
+            self.loaded.clear()
+        else:
+            self.loaded.pop(directory, None)
+
+    def rootScope(self, root: str) -> IgnoreScope:
+        '''Rules in effect in a root before its own ignore files are read: additional patterns, then ignore files from the enclosing repository down to the root's parent'''
+        root = os.fspath(root)
+        stripLength: int = len(os.path.join(root, ""))
+        scope: list[tuple[int, str, IgnoreRules]] = [(stripLength, "", self.patterns)] if self.patterns else []
+
+        absoluteRoot: str = os.path.abspath(root)
+        ancestors: list[str] = []
+        directory: str = absoluteRoot
+        while not os.path.exists(os.path.join(directory, ".git")):
+            parent: str = os.path.dirname(directory)
+            if parent == directory:
+                ancestors = []      # Not inside a repository, only the root's own rules apply
+                break
+            directory = parent
+            ancestors.append(directory)
+
+        for ancestor in reversed(ancestors):
+            rules: IgnoreRules | None = self.load(ancestor)
+            if rules:
+                prefix: str = os.path.relpath(absoluteRoot, ancestor).replace(os.sep, "/") + "/"
+                scope.append((stripLength, prefix, rules))
+        return tuple(scope)
+
+    def enterDirectory(self, scope: IgnoreScope, directory: str, names: Iterable[str] | None = None) -> IgnoreScope:
+        '''Rules in effect in a directory, given the rules of its parent'''
+        rules: IgnoreRules | None = self.load(directory, names)
+        if not rules:
+            return scope
+        return (*scope, (len(os.path.join(directory, "")), "", rules))
+
+    def ignored(self, scope: IgnoreScope, path: str, name: str, isDirectory: bool) -> bool:
+        '''Whether an entry of a walked directory is ignored, given the rules in effect in that directory'''
+        if isDirectory and name in ALWAYS_IGNORED:
+            return True
+        for stripLength, prefix, rules in reversed(scope):
+            relativePath: str = prefix + path[stripLength:]
+            if os.sep != "/":
+                relativePath = relativePath.replace(os.sep, "/")
+            decision: bool | None = rules.match(relativePath, isDirectory)
+            if decision is not None:
+                return decision
+        return False
+
+    def parentScope(self, root: str, directory: str) -> IgnoreScope | None:
+        '''Rules in effect in a directory under root before its own ignore files are read (as `rootScope` is for root), or None if the directory or one of its parents is ignored'''
+        scope: IgnoreScope = self.rootScope(root)
+        relativePath: str = os.path.relpath(directory, root)
+        if relativePath == os.curdir:
+            return scope
+        path: str = root
+        for part in relativePath.split(os.sep):
+            scope = self.enterDirectory(scope, path)
+            path = os.path.join(path, part)
+            if self.ignored(scope, path, part, True):
+                return None
+        return scope
+
+    def isIgnored(self, root: str, path: str, isDirectory: bool) -> bool:
+        '''Whether a path under root is ignored, either itself or through one of its directories. Slower than `ignored`, for paths not reached by walking'''
+        relativePath: str = os.path.relpath(path, root)
+        if relativePath == os.curdir:
+            return False
+        directory, name = os.path.split(os.path.join(root, relativePath))
+        scope: IgnoreScope | None = self.parentScope(root, directory)
+        if scope is None:
+            return True
+        return self.ignored(self.enterDirectory(scope, directory), os.path.join(directory, name), name, isDirectory)
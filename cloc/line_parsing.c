@@ -1,83 +1,305 @@
 #include <stdint.h>
 #include <stdbool.h>
+#include <stddef.h>
 #include <string.h>
 
+#define MAX_TOKENS 32
+#define MAX_CANDIDATES (2 * MAX_TOKENS)
+
+/* Kinds of symbols a language can declare */
+#define TOKEN_LINE_COMMENT 0
+#define TOKEN_BLOCK_COMMENT 1
+#define TOKEN_STRING 2              /* Ends at its closing delimiter or at the end of the line */
+#define TOKEN_MULTILINE_STRING 3    /* Ends at its closing delimiter only */
+
+/* Byte classes of the dispatch table */
+#define CLASS_SPACE 1
+#define CLASS_NEWLINE 2
+#define CLASS_OPEN 4                /* First byte of a symbol recognised in code */
+#define CLASS_LINE_COMMENT 8        /* First byte of a line comment symbol */
+
+/* Scanner state between lines: outside of any token, or inside token (state - 1) */
+#define STATE_CODE 0
+
+/* A symbol of a language, as declared on the Python side. Strings are not copied, the caller keeps them alive as long as the table */
+typedef struct {
+    const char *open;
+    int openLength;
+    const char *close;
+    int closeLength;
+    int kind;
+    int raw;                        /* Strings only: backslash does not escape the next character, as in Go's `...` */
+} ScanToken;
+
+/* Symbols of a language compiled into a first-byte dispatch table. Opaque to the Python side, which only allocates scanTableSize() bytes for it */
+typedef struct {
+    int tokenCount;
+    ScanToken tokens[MAX_TOKENS];
+
+    /* Symbols recognised in code: every opening symbol, and the closing symbol of every block comment (consumed without counting, as a stray close).
+       Candidates are grouped by first byte and ordered longest first, so that '--[[' wins over '--' and '###' over '#' */
+    int candidateCount;
+    const char *candidateSymbol[MAX_CANDIDATES];
+    int candidateLength[MAX_CANDIDATES];
+    int8_t candidateToken[MAX_CANDIDATES];
+    bool candidateClose[MAX_CANDIDATES];
+    uint8_t firstCandidate[256];
+    uint8_t candidateCounts[256];
+    uint8_t byteClass[256];
+} ScanTable;
+
 typedef struct {
-    bool commentedBlock;
-    int validLines;
-} BatchScanResult;
-
-BatchScanResult scanBatch(const char *lines[], int lineCount, bool commentedBlock, int minChars,
-    const char *singleLineSymbol, int singleLineSymbolLength, 
-    const char *multiLineStartSymbol, int multiLineStartSymbolLength, 
-    const char *multiLineEndSymbol, int multiLineEndSymbolLength)
+    int state;
+    int64_t validLines;
+    int64_t totalLines;
+} BufferScanResult;
+
+size_t scanTableSize(void)
+    {
+        return sizeof(ScanTable);
+    }
+
+/* Compile the symbols of a language into a table. Returns 0 on success, or -1 if there are too many symbols or a symbol is malformed */
+int compileScanTable(const ScanToken *tokens, int tokenCount, ScanTable *table)
+    {
+        if (tokenCount < 0 || tokenCount > MAX_TOKENS) {
+            return -1;
+        }
+        memset(table, 0, sizeof(ScanTable));
+        table->tokenCount = tokenCount;
+
+        for (int i = 0; i < tokenCount; i++) {
+            const ScanToken *token = &tokens[i];
+            if (token->kind < TOKEN_LINE_COMMENT || token->kind > TOKEN_MULTILINE_STRING || token->openLength <= 0 ||
+                memchr(token->open, '\n', (size_t)token->openLength)) {
+                return -1;
+            }
+            if (token->kind != TOKEN_LINE_COMMENT &&
+                (token->closeLength <= 0 || memchr(token->close, '\n', (size_t)token->closeLength))) {
+                return -1;
+            }
+            table->tokens[i] = *token;
+
+            int candidate = table->candidateCount++;
+            table->candidateSymbol[candidate] = token->open;
+            table->candidateLength[candidate] = token->openLength;
+            table->candidateToken[candidate] = (int8_t)i;
+            table->candidateClose[candidate] = false;
+            if (token->kind == TOKEN_BLOCK_COMMENT) {
+                candidate = table->candidateCount++;
+                table->candidateSymbol[candidate] = token->close;
+                table->candidateLength[candidate] = token->closeLength;
+                table->candidateToken[candidate] = (int8_t)i;
+                table->candidateClose[candidate] = true;
+            }
+        }
+
+        /* Insertion sort by first byte, then longest first. Ties keep declaration order, with opening symbols before stray closes */
+        for (int i = 1; i < table->candidateCount; i++) {
+            const char *symbol = table->candidateSymbol[i];
+            int length = table->candidateLength[i];
+            int8_t token = table->candidateToken[i];
+            bool isClose = table->candidateClose[i];
+            unsigned char first = (unsigned char)symbol[0];
+
+            int j = i - 1;
+            while (j >= 0) {
+                unsigned char otherFirst = (unsigned char)table->candidateSymbol[j][0];
+                if (otherFirst < first || (otherFirst == first && table->candidateLength[j] >= length)) {
+                    break;
+                }
+                table->candidateSymbol[j + 1] = table->candidateSymbol[j];
+                table->candidateLength[j + 1] = table->candidateLength[j];
+                table->candidateToken[j + 1] = table->candidateToken[j];
+                table->candidateClose[j + 1] = table->candidateClose[j];
+                j--;
+            }
+            table->candidateSymbol[j + 1] = symbol;
+            table->candidateLength[j + 1] = length;
+            table->candidateToken[j + 1] = token;
+            table->candidateClose[j + 1] = isClose;
+        }
+
+        for (int i = table->candidateCount - 1; i >= 0; i--) {
+            unsigned char first = (unsigned char)table->candidateSymbol[i][0];
+            table->firstCandidate[first] = (uint8_t)i;
+            table->candidateCounts[first]++;
+            table->byteClass[first] |= CLASS_OPEN;
+            if (!table->candidateClose[i] && table->tokens[table->candidateToken[i]].kind == TOKEN_LINE_COMMENT) {
+                table->byteClass[first] |= CLASS_LINE_COMMENT;
+            }
+        }
+        table->byteClass[' '] |= CLASS_SPACE;
+        table->byteClass['\t'] |= CLASS_SPACE;
+        table->byteClass['\r'] |= CLASS_SPACE;
+        table->byteClass['\n'] |= CLASS_NEWLINE;
+        return 0;
+    }
+
+/* Find the candidate symbol starting at a position, longest first. Returns its index, or -1 */
+static inline int matchCandidate(const ScanTable *table, const unsigned char *at, size_t remaining)
+    {
+        int first = table->firstCandidate[*at], last = first + table->candidateCounts[*at];
+        for (int i = first; i < last; i++) {
+            size_t length = (size_t)table->candidateLength[i];
+            if (length <= remaining && memcmp(at, table->candidateSymbol[i], length) == 0) {
+                return i;
+            }
+        }
+        return -1;
+    }
+
+/* Length of the line comment symbol starting at a position, or 0 */
+static inline int matchLineComment(const ScanTable *table, const unsigned char *at, size_t remaining)
     {
-        BatchScanResult result;
-        result.commentedBlock = commentedBlock;
+        int first = table->firstCandidate[*at], last = first + table->candidateCounts[*at];
+        for (int i = first; i < last; i++) {
+            size_t length = (size_t)table->candidateLength[i];
+            if (!table->candidateClose[i] && table->tokens[table->candidateToken[i]].kind == TOKEN_LINE_COMMENT &&
+                length <= remaining && memcmp(at, table->candidateSymbol[i], length) == 0) {
+                return (int)length;
+            }
+        }
+        return 0;
+    }
+
+/* Close the current line: count it if it had enough valid characters, and drop strings that cannot span lines */
+static inline void endLine(BufferScanResult *result, const ScanTable *table, size_t *validChars, bool *lineCommentPreface, int minChars)
+    {
+        if (*validChars > (size_t)minChars) {
+            result->validLines++;
+        }
+        result->totalLines++;
+        *validChars = 0;
+        *lineCommentPreface = false;
+        if (result->state != STATE_CODE && table->tokens[result->state - 1].kind == TOKEN_STRING) {
+            result->state = STATE_CODE;
+        }
+    }
+
+/* Scan an entire in-memory buffer (such as a memory-mapped file) in a single pass, starting in the given state.
+   A trailing line without a newline is counted, matching line iteration over a Python file object.
+   Whitespace, comments and comment symbols never count as valid characters, string literals (including their delimiters) do */
+BufferScanResult scanBufferTable(const char *buffer, size_t length, int state, int minChars, const ScanTable *table)
+    {
+        BufferScanResult result;
+        /* Line comments end with their line, so no line starts inside one. Such states (and unknown ones) start in code */
+        bool validState = state == STATE_CODE || (state > STATE_CODE && state <= table->tokenCount && table->tokens[state - 1].kind != TOKEN_LINE_COMMENT);
+        result.state = validState ? state : STATE_CODE;
         result.validLines = 0;
+        result.totalLines = 0;
 
-        uint_fast16_t idx, validChars;
-        size_t len;
-        bool bSingleLineSymbolPreface;
-        for(int i = 0; i < lineCount; i++){
-            const char* line = lines[i];
-            len = strlen(line);
-            idx = 0;
-            validChars = 0;
-
-            // NOTE: In a language with multiline comments (Like C), a line like "// */" would still end a commented block,
-            // even if it is prefixed by a single line comment symbol. However, a line like "// /*" would not begin a commented block.
-            // Therefore, we unfortunately can only skip scanning at a single line comment if we are not currently in a commented block   
-            bSingleLineSymbolPreface = false;
-
-            while(idx < len){
-                /* Single line check */
-                // Check for single-line comment
-                if (singleLineSymbolLength > 0 && 
-                    (idx + singleLineSymbolLength <= len) &&
-                    strncmp(line + idx, singleLineSymbol, singleLineSymbolLength) == 0) {
-                    // Single comment symbol appears, characters that are NOT a multiline comment end symbol will be irrelevent now
-                    idx+=singleLineSymbolLength;
-                    if(!result.commentedBlock){
-                        // Not in a multi line block, skip
-                        break;
+        const unsigned char *cursor = (const unsigned char *)buffer, *end = cursor + length;
+        const uint8_t *byteClass = table->byteClass;
+        size_t validChars = 0;
+
+        // NOTE: In a language with block comments (Like C), a line like "// */" still ends a commented block,
+        // even if it is prefixed by a line comment symbol. However, nothing after the block ends on such a line counts
+        bool lineCommentPreface = false;
+
+        while (cursor < end) {
+            if (result.state == STATE_CODE) {
+                uint8_t class = byteClass[*cursor];
+                if (class & CLASS_OPEN) {
+                    int candidate = matchCandidate(table, cursor, (size_t)(end - cursor));
+                    if (candidate >= 0) {
+                        int token = table->candidateToken[candidate];
+                        int kind = table->tokens[token].kind;
+                        cursor += table->candidateLength[candidate];
+                        if (table->candidateClose[candidate]) {
+                            continue;   // Stray block comment end, never counted
+                        }
+                        if (kind == TOKEN_LINE_COMMENT) {
+                            // Rest of the line is a comment, skip straight to its end
+                            const unsigned char *newline = memchr(cursor, '\n', (size_t)(end - cursor));
+                            cursor = newline ? newline : end;
+                            continue;
+                        }
+                        if (kind != TOKEN_BLOCK_COMMENT && !lineCommentPreface) {
+                            validChars += (size_t)table->candidateLength[candidate];
+                        }
+                        result.state = token + 1;
+                        continue;
                     }
-                    bSingleLineSymbolPreface = true;
+                }
+                if (class & CLASS_NEWLINE) {
+                    endLine(&result, table, &validChars, &lineCommentPreface, minChars);
+                    cursor++;
                     continue;
                 }
+                if (!(class & CLASS_SPACE) && !lineCommentPreface) {
+                    validChars++;
+                }
+                cursor++;
 
-                /* Multi line check */
-                // Check for multiline comment start symbol
-                if (multiLineStartSymbolLength > 0 &&
-                    (idx + multiLineStartSymbolLength <= len) &&
-                    strncmp(line + idx, multiLineStartSymbol, multiLineStartSymbolLength) == 0) {
-                    result.commentedBlock = true;
-                    idx += multiLineStartSymbolLength;
-                    continue;
+                // Once a line counts, ordinary bytes no longer matter, skip ahead to the next symbol or newline
+                if (validChars > (size_t)minChars) {
+                    while (cursor < end && !(byteClass[*cursor] & (CLASS_OPEN | CLASS_NEWLINE))) {
+                        cursor++;
+                    }
                 }
+                continue;
+            }
 
-                // Check for multiline comment end symbol
-                if (multiLineEndSymbolLength > 0 && 
-                    (idx + multiLineEndSymbolLength <= len) &&
-                    strncmp(line + idx, multiLineEndSymbol, multiLineEndSymbolLength) == 0) {
-                    result.commentedBlock = false;
-                    idx += multiLineEndSymbolLength;
-                    continue;
+            const ScanToken *token = &table->tokens[result.state - 1];
+            const unsigned char closeByte = (unsigned char)token->close[0];
+            const size_t closeLength = (size_t)token->closeLength;
+
+            if (token->kind == TOKEN_BLOCK_COMMENT) {
+                // Only the end of the block, line comment symbols and newlines matter inside a block
+                while (cursor < end) {
+                    unsigned char byte = *cursor;
+                    if (byte == closeByte && closeLength <= (size_t)(end - cursor) && memcmp(cursor, token->close, closeLength) == 0) {
+                        cursor += closeLength;
+                        result.state = STATE_CODE;
+                        break;
+                    }
+                    if (byte == '\n') {
+                        endLine(&result, table, &validChars, &lineCommentPreface, minChars);
+                        cursor++;
+                        continue;
+                    }
+                    if ((byteClass[byte] & CLASS_LINE_COMMENT) && !lineCommentPreface) {
+                        int lineCommentLength = matchLineComment(table, cursor, (size_t)(end - cursor));
+                        if (lineCommentLength) {
+                            lineCommentPreface = true;
+                            cursor += lineCommentLength;
+                            continue;
+                        }
+                    }
+                    cursor++;
                 }
+                continue;
+            }
 
-                // Actual valid character, not prefaced by a single line comment symbol, and not inside a commented block
-                if (!result.commentedBlock &&
-                    !bSingleLineSymbolPreface &&
-                    !(line[idx] == ' ' || line[idx] == '\t' || line[idx] == '\n' || line[idx] == '\r')) {
+            // String literal, its contents count as code. Backslash escapes the next character, unless the string is raw
+            while (cursor < end) {
+                unsigned char byte = *cursor;
+                if (byte == closeByte && closeLength <= (size_t)(end - cursor) && memcmp(cursor, token->close, closeLength) == 0) {
+                    if (!lineCommentPreface) {
+                        validChars += closeLength;
+                    }
+                    cursor += closeLength;
+                    result.state = STATE_CODE;
+                    break;
+                }
+                if (byte == '\n') {
+                    endLine(&result, table, &validChars, &lineCommentPreface, minChars);
+                    cursor++;
+                    if (result.state == STATE_CODE) {
+                        break;
+                    }
+                    continue;
+                }
+                if (!(byteClass[byte] & CLASS_SPACE) && !lineCommentPreface) {
                     validChars++;
                 }
-                idx++;
-            }
-            // Finally, compare no. of valid characters with minChars to determine if this line should be counted as valid or no
-            if (validChars > minChars){
-                result.validLines++;
+                cursor += (byte == '\\' && !token->raw && cursor + 1 < end && cursor[1] != '\n') ? 2 : 1;
             }
         }
 
+        if (length && buffer[length - 1] != '\n') {
+            endLine(&result, table, &validChars, &lineCommentPreface, minChars);
+        }
         return result;
-    }
\ No newline at end of file
+    }
@@ -1,148 +1,582 @@
 '''Module to hold all parsing logic, at both file and directory levels'''
 import os
-from typing import Any, Callable, Iterator
-from itertools import islice
+from typing import Callable, Iterator
+from collections import deque
+from time import perf_counter
 import ctypes
+import mmap
 
-from cloc.ctypes_interfacing import lib, BatchScanResult
-from cloc.utils import findCommentSymbols
+from cloc.ctypes_interfacing import BufferScanResult, STATE_CODE
+from cloc.cache import ResultCache
+from cloc.guard import FileGuard
+from cloc.ignore import IgnoreMatcher, IgnoreScope
+from cloc.shard import Shard
+from cloc.stats import ScanStats
+from cloc.symbols import LanguageSymbols, getSymbols
 
-def parseFile(filepath: os.PathLike, singleCommentSymbol: str, multiLineStartSymbol: str | None = None, multiLineEndSymbol: str | None = None, minChars: int = 0) -> tuple[int, int]:
-    loc: int = 0
-    total: int = 0
-    singleCommentSymbolLength: int = 0 if not singleCommentSymbol else len(singleCommentSymbol)
-    multiCommentStartSymbolLength: int = 0 if not multiLineStartSymbol else len(multiLineStartSymbol)
-    multiCommentEndSymbolLength: int = 0 if not multiLineEndSymbol else len(multiLineEndSymbol)
+def parseFile(filepath: os.PathLike, singleCommentSymbol: bytes | None, multiLineStartSymbol: bytes | None = None, multiLineEndSymbol: bytes | None = None, minChars: int = 0) -> tuple[int, int]:
+    '''#### Count LOC and total lines of a file, given its comment symbols\n
+    Prefer `parseFileSymbols` with precompiled symbols when scanning many files
+
+    #### returns:
+    integer pair of loc and total lines
+    '''
+    return parseFileSymbols(filepath, LanguageSymbols(singleCommentSymbol, multiLineStartSymbol, multiLineEndSymbol), minChars)
+
+def parseFileSymbols(filepath: os.PathLike, symbols: LanguageSymbols, minChars: int = 0, stats: ScanStats | None = None, guard: FileGuard | None = None) -> tuple[int, int] | None:
+    '''#### Count LOC and total lines of a file with a single call into the scan engine\n
+    The file is memory-mapped copy-on-write and handed to `scanBufferTable` as-is, so with the native engine line splitting happens natively and no per-line Python objects are created.
+    Files that cannot be mapped (empty files, pipes, special files) are read into memory instead.
+    If a guard is given, the first block of the file is classified before scanning (see `FileGuard`)
+
+    #### returns:
+    integer pair of loc and total lines, or None if the guard skipped the file
+    '''
+    if stats is not None:
+        epoch: float = perf_counter()
     with open(filepath, 'rb') as file:
-        commentedBlock: bool = False            # Multiple multilineStarts will still have the same effect as one, so a single flag is enough
+        try:
+            buffer: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+        except (ValueError, OSError):
+            # Empty or unmappable file, fall back to a plain read
+            contents: bytes = file.read()
+            if stats is not None:
+                stats.addPhase("open", perf_counter() - epoch)
+            return parseBuffer(contents, symbols, minChars, stats, guard)
 
-        while batch := list(islice(file, 100)):
-            batchSize = len(batch)
-            
-            batchScanResult: BatchScanResult = lib.scanBatch((ctypes.c_char_p * batchSize)(*batch), batchSize, commentedBlock, minChars, singleCommentSymbol, singleCommentSymbolLength, multiLineStartSymbol, multiCommentStartSymbolLength, multiLineEndSymbol, multiCommentEndSymbolLength)
+    with buffer:
+        if guard is not None:
+            reason: str | None = guard.checkContents(buffer[:guard.sniffBytes])
+            if reason:
+                guard.record(reason)
+                return None
+        size: int = len(buffer)
+        view: ctypes.Array = (ctypes.c_char * size).from_buffer(buffer)
+        if stats is not None:
+            stats.addPhase("open", perf_counter() - epoch)
+            epoch = perf_counter()
+        try:
+            bufferScanResult: BufferScanResult = symbols.engine.scanBufferTable(view, size, STATE_CODE, minChars, symbols.table)
+        finally:
+            # Release the exported buffer, otherwise the mapping cannot be closed
+            del view
+    if stats is not None:
+        stats.addPhase("scan", perf_counter() - epoch, scanCalls=1)
+    return bufferScanResult.validLines, bufferScanResult.totalLines
 
-            loc += batchScanResult.validLines
-            total += batchSize
+def parseBuffer(buffer: bytes, symbols: LanguageSymbols, minChars: int = 0, stats: ScanStats | None = None, guard: FileGuard | None = None) -> tuple[int, int] | None:
+    '''Count LOC and total lines of contents already in memory, such as git blobs. Returns None if the guard skipped the contents'''
+    if guard is not None:
+        reason: str | None = guard.checkContents(buffer[:guard.sniffBytes])
+        if reason:
+            guard.record(reason)
+            return None
+    if stats is not None:
+        epoch: float = perf_counter()
+    bufferScanResult: BufferScanResult = symbols.engine.scanBufferTable(buffer, len(buffer), STATE_CODE, minChars, symbols.table)
+    if stats is not None:
+        stats.addPhase("scan", perf_counter() - epoch, scanCalls=1)
+    return bufferScanResult.validLines, bufferScanResult.totalLines
 
-            commentedBlock = batchScanResult.commentedBlock
-        return loc, total
-  
+def chunkBoundaries(buffer: mmap.mmap, chunkCount: int) -> list[int]:
+    '''Split a buffer into at most chunkCount chunks of similar size, each ending right after a newline (except the last). Returns the offsets of every chunk start and of the end'''
+    size: int = len(buffer)
+    boundaries: list[int] = [0]
+    for index in range(1, chunkCount):
+        newline: int = buffer.find(b"\n", max(boundaries[-1], size * index // chunkCount))
+        if newline == -1:
+            break
+        if newline + 1 < size:
+            boundaries.append(newline + 1)
+    boundaries.append(size)
+    return boundaries
 
-def parseDirectoryNoVerbose(dirData: Iterator[tuple[Any, list[Any], list[Any]]], customSymbols: dict = None, fileFilterFunction: Callable = lambda outputMapping: True, directoryFilterFunction: Callable = lambda outputMapping : False, minChars:int = 0, recurse:bool = False, level:int = 0, loc: int = 0, totalLines: int = 0, outputMapping: dict = None) -> dict[str, str | int]:
-    materialisedDirData: list[os.PathLike] = next(dirData)
-    rootDirectory: os.PathLike = materialisedDirData[0]
+def parseFileChunked(filepath: os.PathLike, symbols: LanguageSymbols, minChars: int = 0, jobs: int = 4, chunkSize: int = 64 * 1024 * 1024, stats: ScanStats | None = None, guard: FileGuard | None = None) -> tuple[int, int] | None:
+    '''#### Count LOC and total lines of a large file by scanning chunks of it in parallel\n
+    The mapped file is split at line boundaries, and every chunk after the first is scanned speculatively under each state a line can start in (see `LanguageSymbols.entryStates`),
+    since the state it actually starts in is only known once the chunk before it is scanned. Results are then stitched in order by following the actual chain of states,
+    so counts are identical to `parseFileSymbols`. Files no larger than one chunk, and files scanned by an engine holding the GIL, are scanned sequentially
 
-    if not outputMapping:
-        outputMapping = {"loc" : 0, "total" : 0}
+    #### args:
+    jobs: Number of worker threads, the native scanner releases the GIL\n
+    chunkSize: Maximum size of a chunk in bytes. Files are split into at least `jobs` chunks
 
-    for file in materialisedDirData[2]:
-        # File excluded
-        if not fileFilterFunction(file):
-            continue
-        
-        singleLine, multiLineStart, multiLineEnd = None, None, None
-        if not customSymbols:
-            symbolData = findCommentSymbols(file.split(".")[-1])  
-
-            if isinstance(symbolData, bytes):
-                singleLine = symbolData
-            elif isinstance(symbolData[1], bytes):
-                multiLineStart, multiLineEnd = symbolData
-            else:
-                singleLine, (multiLineStart, multiLineEnd) = symbolData
-        else:
-            # Custom symbols given
-            singleLine = customSymbols.get("single")
-            multiLineStart = customSymbols.get("multistart")
-            multiLineEnd = customSymbols.get("multiend")
-
-        l, tl = parseFile(os.path.join(rootDirectory, file), singleLine, multiLineStart, multiLineEnd)
-        totalLines += tl
-        loc += l
+    #### returns:
+    integer pair of loc and total lines, or None if the guard skipped the file
+    '''
+    if jobs < 2 or not symbols.engine.parallel or os.path.getsize(filepath) <= chunkSize:
+        return parseFileSymbols(filepath, symbols, minChars, stats, guard)
+
+    if stats is not None:
+        epoch: float = perf_counter()
+    with open(filepath, 'rb') as file:
+        buffer: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
 
-    outputMapping["loc"] = loc
-    outputMapping["total"] = totalLines
-    
-    if not recurse:
-        return outputMapping
+    with buffer:
+        if guard is not None:
+            reason: str | None = guard.checkContents(buffer[:guard.sniffBytes])
+            if reason:
+                guard.record(reason)
+                return None
+        size: int = len(buffer)
+        boundaries: list[int] = chunkBoundaries(buffer, max(jobs, -(-size // chunkSize)))
+        view: ctypes.Array = (ctypes.c_char * size).from_buffer(buffer)
+        address: int = ctypes.addressof(view)
+        if stats is not None:
+            stats.addPhase("open", perf_counter() - epoch)
+            epoch = perf_counter()
 
-    # All files have been parsed in this directory, recurse
-    for dir in materialisedDirData[1]:
-        if not directoryFilterFunction(dir):
-            continue
-        # Walk over and parse subdirectory
-        subdirectoryData = os.walk(os.path.join(rootDirectory, dir))
-        op = parseDirectory(subdirectoryData, customSymbols ,fileFilterFunction, directoryFilterFunction, True, level+1)
+        from concurrent.futures import Future, ThreadPoolExecutor
+        def scanChunk(index: int, state: int) -> BufferScanResult:
+            return symbols.engine.scanBufferTable(address + boundaries[index], boundaries[index + 1] - boundaries[index], state, minChars, symbols.table)
 
-        localLOC, localTotal = op.pop("general").values()
-        outputMapping["loc"] = outputMapping["loc"] + localLOC
-        outputMapping["total"] = outputMapping["total"] + localTotal
-        outputMapping.update(op)
+        try:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                # The first chunk always starts outside of any token
+                chunkResults: list[dict[int, Future]] = [{state : executor.submit(scanChunk, index, state) for state in (symbols.entryStates if index else (STATE_CODE,))}
+                                                         for index in range(len(boundaries) - 1)]
+                loc: int = 0
+                totalLines: int = 0
+                state: int = STATE_CODE
+                for speculativeResults in chunkResults:
+                    bufferScanResult: BufferScanResult = speculativeResults[state].result()
+                    loc += bufferScanResult.validLines
+                    totalLines += bufferScanResult.totalLines
+                    state = bufferScanResult.state
+        finally:
+            # Release the exported buffer, otherwise the mapping cannot be closed
+            del view
+    if stats is not None:
+        stats.addPhase("scan", perf_counter() - epoch, scanCalls=sum(len(speculativeResults) for speculativeResults in chunkResults))
+    return loc, totalLines
 
-    return outputMapping
+def resolveSymbols(file: str, customSymbols: LanguageSymbols | None = None) -> LanguageSymbols | None:
+    '''Fetch the compiled comment symbols for a file, preferring custom symbols if given. Returns None for unknown languages'''
+    if customSymbols:
+        return customSymbols
+    return getSymbols(file.rpartition(".")[2])
+
+def scanEntry(entry: os.DirEntry, customSymbols: LanguageSymbols | None = None, minChars: int = 0, cache: ResultCache | None = None, stats: ScanStats | None = None, guard: FileGuard | None = None) -> tuple[int, int] | None:
+    '''Scan a single directory entry, going through the result cache first if one is given. Returns None if the file's language is unknown, or if the guard skipped it'''
+    symbols: LanguageSymbols | None = resolveSymbols(entry.name, customSymbols)
+    if not symbols:
+        return None
+    if guard is not None:
+        return scanEntryGuarded(entry, symbols, minChars, cache, stats, guard)
+    if stats is not None:
+        return scanEntryStats(entry, symbols, minChars, cache, stats)
+    if cache is None:
+        return parseFileSymbols(entry.path, symbols, minChars)
+
+    stat: os.stat_result = entry.stat()
+    cachedResult: tuple[int, int] | None = cache.lookup(entry.path, stat, symbols.key, minChars)
+    if cachedResult:
+        return cachedResult
 
-def parseDirectory(dirData: Iterator[tuple[Any, list[Any], list[Any]]], customSymbols: dict = None, fileFilterFunction: Callable = lambda outputMapping: True, directoryFilterFunction: Callable = lambda outputMapping : False, minChars: int = 0, recurse:bool = False, level:int = 0, loc: int = 0, totalLines: int = 0, outputMapping: dict = None) -> tuple[int, int] | None:
+    l, tl = parseFileSymbols(entry.path, symbols, minChars)
+    cache.store(entry.path, stat, symbols.key, minChars, l, tl)
+    return l, tl
+
+def scanEntryStats(entry: os.DirEntry, symbols: LanguageSymbols, minChars: int, cache: ResultCache | None, stats: ScanStats) -> tuple[int, int]:
+    '''Instrumented counterpart of `scanEntry`, kept separate so that uninstrumented scans do not pay for timing'''
+    epoch: float = perf_counter()
+    stat: os.stat_result = entry.stat()
+    if cache is not None:
+        cachedResult: tuple[int, int] | None = cache.lookup(entry.path, stat, symbols.key, minChars)
+        stats.addPhase("cache", perf_counter() - epoch)
+        if cachedResult:
+            stats.recordFile(entry.path, stat.st_size, perf_counter() - epoch, *cachedResult, cached=True)
+            return cachedResult
+
+    l, tl = parseFileSymbols(entry.path, symbols, minChars, stats)
+    if cache is not None:
+        cache.store(entry.path, stat, symbols.key, minChars, l, tl)
+    stats.recordFile(entry.path, stat.st_size, perf_counter() - epoch, l, tl)
+    return l, tl
+
+def scanEntryGuarded(entry: os.DirEntry, symbols: LanguageSymbols, minChars: int, cache: ResultCache | None, stats: ScanStats | None, guard: FileGuard) -> tuple[int, int] | None:
+    '''Counterpart of `scanEntry` that classifies the file first, skipping it before it is opened if its name or size are rejected'''
+    if stats is not None:
+        epoch: float = perf_counter()
+    stat: os.stat_result = entry.stat()
+    reason: str | None = guard.checkFile(entry.name, stat.st_size)
+    if reason:
+        guard.record(reason)
+        return None
+
+    symbolKey: bytes = symbols.key + guard.key
+    if cache is not None:
+        cachedResult: tuple[int, int] | None = cache.lookup(entry.path, stat, symbolKey, minChars)
+        if stats is not None:
+            stats.addPhase("cache", perf_counter() - epoch)
+        if cachedResult:
+            if stats is not None:
+                stats.recordFile(entry.path, stat.st_size, perf_counter() - epoch, *cachedResult, cached=True)
+            return cachedResult
+
+    result: tuple[int, int] | None = parseFileSymbols(entry.path, symbols, minChars, stats, guard)
+    if not result:
+        return None
+    if cache is not None:
+        cache.store(entry.path, stat, symbolKey, minChars, *result)
+    if stats is not None:
+        stats.recordFile(entry.path, stat.st_size, perf_counter() - epoch, *result)
+    return result
+
+def scanPrefetched(entry: os.DirEntry, symbols: LanguageSymbols, stat: os.stat_result, contents: bytes | None, minChars: int, cache: ResultCache | None, stats: ScanStats | None, guard: FileGuard | None = None) -> tuple[int, int] | None:
+    '''Scan a file whose contents were read ahead, or map it if it was too large to be buffered. Returns None if the guard skipped it'''
+    if stats is not None:
+        epoch: float = perf_counter()
+    if contents is None:
+        result: tuple[int, int] | None = parseFileSymbols(entry.path, symbols, minChars, stats, guard)
+    else:
+        result: tuple[int, int] | None = parseBuffer(contents, symbols, minChars, stats, guard)
+    if not result:
+        return None
+    if cache is not None:
+        cache.store(entry.path, stat, symbols.key + guard.key if guard else symbols.key, minChars, *result)
+    if stats is not None:
+        stats.recordFile(entry.path, stat.st_size, perf_counter() - epoch, *result)
+    return result
+
+def walkEntries(root: os.PathLike, fileFilterFunction: Callable, directoryFilterFunction: Callable, recurse: bool, stats: ScanStats | None, ignore: IgnoreMatcher | None = None, shard: Shard | None = None) -> Iterator[tuple[str, os.DirEntry]]:
+    '''`walkDirectory`, with the time spent walking added to the `walk` phase if stats are collected, and only the files of a shard if one is given'''
+    entries: Iterator[tuple[str, os.DirEntry]] = walkDirectory(root, fileFilterFunction, directoryFilterFunction, recurse, ignore)
+    if shard is not None:
+        entries = shard.select(root, entries)
+    return entries if stats is None else stats.timeIterator("walk", entries)
+
+def walkDirectory(root: os.PathLike, fileFilterFunction: Callable = lambda _: True, directoryFilterFunction: Callable = lambda _: False, recurse: bool = False, ignore: IgnoreMatcher | None = None, scope: IgnoreScope | None = None) -> Iterator[tuple[str, os.DirEntry]]:
+    '''#### Iteratively walk root with os.scandir, yielding (directory, entry) pairs for every accepted file\n
+    Type information is taken from the `DirEntry` objects themselves, so no extra stat calls are made while walking.
+    Subdirectories rejected by directoryFilterFunction are pruned before ever being listed. Symlinked directories are not followed, similiar to os.walk()
+    #### args:
+    root: Directory to walk\n
+    fileFilterFunction: Function to handle inclusion/exclusion logic at the file level (file names and file extensions)\n
+    directoryFilterFunction: Function to handle inclusion/exclusion logic at the directory level\n
+    recurse: Whether to descend into subdirectories at all\n
+    ignore: Optional `IgnoreMatcher`, files and subdirectories matched by ignore files are skipped, and ignored subdirectories are never listed\n
+    scope: Rules in effect in root before its own ignore files are read, `IgnoreMatcher.rootScope` by default. Needed when root is a subdirectory of the scanned root
+    '''
+    if scope is None:
+        scope = ignore.rootScope(root) if ignore else ()
+    pendingDirectories: list[tuple[str, IgnoreScope]] = [(os.fspath(root), scope)]
+    while pendingDirectories:
+        directory, scope = pendingDirectories.pop()
+        subdirectories: list[tuple[str, IgnoreScope]] = []
+        try:
+            with os.scandir(directory) as entries:
+                if ignore is not None:
+                    # Ignore files of a directory apply to its own entries, so they have to be read first
+                    entries = list(entries)
+                    scope = ignore.enterDirectory(scope, directory, (entry.name for entry in entries))
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            if recurse and not entry.is_symlink() and directoryFilterFunction(entry.name) and not (ignore and ignore.ignored(scope, entry.path, entry.name, True)):
+                                subdirectories.append((entry.path, scope))
+                            continue
+                        if not entry.is_file():
+                            continue    # Sockets, FIFOs, broken symlinks, etc.
+                    except OSError:
+                        continue
+                    if fileFilterFunction(entry.name) and not (ignore and ignore.ignored(scope, entry.path, entry.name, False)):
+                        yield directory, entry
+        except OSError:
+            continue    # Unreadable directory, skip it like os.walk() does
+
+        # Reversed so that subdirectories are visited depth-first in listing order
+        pendingDirectories.extend(reversed(subdirectories))
+
+def parseDirectoryNoVerbose(root: os.PathLike, customSymbols: LanguageSymbols | None = None, fileFilterFunction: Callable = lambda _: True, directoryFilterFunction: Callable = lambda _: False, minChars: int = 0, recurse: bool = False, cache: ResultCache | None = None, stats: ScanStats | None = None, guard: FileGuard | None = None, ignore: IgnoreMatcher | None = None, shard: Shard | None = None) -> dict[str, int]:
+    '''#### Iterate over every file in given root directory, and optionally its subdirectories, keeping only the totals\n
+    #### returns:
+    Mapping of loc and total lines scanned
+    '''
+    loc: int = 0
+    totalLines: int = 0
+    unknown: int = 0
+    for _, entry in walkEntries(root, fileFilterFunction, directoryFilterFunction, recurse, stats, ignore, shard):
+        if not resolveSymbols(entry.name, customSymbols):
+            unknown += 1
+            continue
+        result: tuple[int, int] | None = scanEntry(entry, customSymbols, minChars, cache, stats, guard)
+        if not result:
+            continue    # Skipped by the guard, counted there
+        loc += result[0]
+        totalLines += result[1]
+
+    generalData: dict = {"loc" : loc, "total" : totalLines, "unknown" : unknown}
+    if guard is not None:
+        generalData.update(guard.summary())
+    return generalData
+
+def parseDirectory(root: os.PathLike, customSymbols: LanguageSymbols | None = None, fileFilterFunction: Callable = lambda _: True, directoryFilterFunction: Callable = lambda _: False, minChars: int = 0, recurse: bool = False, cache: ResultCache | None = None, stats: ScanStats | None = None, guard: FileGuard | None = None, ignore: IgnoreMatcher | None = None, shard: Shard | None = None) -> dict:
     '''#### Iterate over every file in given root directory, and optionally perform the same for every file within its subdirectories\n
     #### args:
-    dirData: Output of os.walk() on root directory\n
-    Function: Function to handle inclusion/exclusion logic at the file level (file names and file extensions)\n
-    directoryFilterFunction: Function to handle inclusion/exclusion logic at the directory level
-    level: Count of how many directories deep the current function is searching, increases per recursion
+    root: Directory to scan\n
+    fileFilterFunction: Function to handle inclusion/exclusion logic at the file level (file names and file extensions)\n
+    directoryFilterFunction: Function to handle inclusion/exclusion logic at the directory level\n
+    recurse: Whether to scan subdirectories as well\n
+    cache: Optional result cache, files whose size, mtime and inode are unchanged since the last scan are not read at all\n
+    stats: Optional `ScanStats` collecting phase timings and counters\n
+    guard: Optional `FileGuard`, binary, generated and oversized files it rejects are skipped and counted under `skipped` instead\n
+    ignore: Optional `IgnoreMatcher`, files and directories matched by .gitignore/.clocignore files are skipped without being listed or counted\n
+    shard: Optional `Shard`, only the files belonging to it are scanned (or counted as unknown), see `writePartial` and `mergePartials`
 
     #### returns:
-    integer pair of loc and total lines scanned if no output path specified, else None
+    Mapping of general totals, and of every scanned directory to the loc and total lines of its files. Files of unknown languages are skipped and only counted
     '''
-    ...
-    # TODO: Remove complete materialisation of dirData
-    materialisedDirData: list = next(dirData)
-    rootDirectory: os.PathLike = materialisedDirData[0]
-
-    if not outputMapping:
-        outputMapping = {"general" : {}}
-    for file in materialisedDirData[2]:
-        # File excluded
-        if not fileFilterFunction(file):
+    loc: int = 0
+    totalLines: int = 0
+    unknown: int = 0
+    outputMapping: dict = {"general" : {}}
+    for directory, entry in walkEntries(root, fileFilterFunction, directoryFilterFunction, recurse, stats, ignore, shard):
+        if not resolveSymbols(entry.name, customSymbols):
+            unknown += 1
             continue
-        singleLine, multiLineStart, multiLineEnd = None, None, None
-        if not customSymbols:
-            symbolData = findCommentSymbols(file.split(".")[-1])  
-            if isinstance(symbolData, bytes):
-                singleLine = symbolData
-            elif isinstance(symbolData[1], bytes):
-                multiLineStart, multiLineEnd = symbolData
-            else:
-                singleLine, (multiLineStart, multiLineEnd) = symbolData
-        else:
-            # Custom symbols given
-            singleLine = customSymbols.get("single")
-            multiLineStart = customSymbols.get("multistart")
-            multiLineEnd = customSymbols.get("multiend")
-
-        l, tl = parseFile(os.path.join(rootDirectory, file), singleLine, multiLineStart, multiLineEnd)
+        result: tuple[int, int] | None = scanEntry(entry, customSymbols, minChars, cache, stats, guard)
+        if not result:
+            continue    # Skipped by the guard, counted there
+        l, tl = result
         totalLines += tl
         loc += l
-        if not outputMapping.get(rootDirectory):
-            outputMapping[rootDirectory] = {}
-        outputMapping[rootDirectory][file] = {"loc" : l, "total_lines" : tl}
+        if not outputMapping.get(directory):
+            outputMapping[directory] = {}
+        outputMapping[directory][entry.name] = {"loc" : l, "total_lines" : tl}
+
     outputMapping["general"]["loc"] = loc
     outputMapping["general"]["total"] = totalLines
-    
-    if not recurse:
-        return outputMapping
-
-    # All files have been parsed in this directory, recurse
-    for dir in materialisedDirData[1]:
-        if not directoryFilterFunction(dir):
-            print("Skipping directory:", dir)
+    outputMapping["general"]["unknown"] = unknown
+    if guard is not None:
+        outputMapping["general"].update(guard.summary())
+    return outputMapping
+
+def scanEntriesParallel(entries: list[os.DirEntry], jobs: int, customSymbols: LanguageSymbols | None = None, minChars: int = 0, cache: ResultCache | None = None, stats: ScanStats | None = None, guard: FileGuard | None = None) -> list[tuple[int, int] | None]:
+    '''#### Scan entries of known languages on a pool of worker threads, largest first\n
+    #### returns:
+    (loc, total lines) of every entry, in the order entries were given. Entries skipped by the guard are None
+    '''
+    results: list[tuple[int, int] | None] = [(0, 0)] * len(entries)
+
+    def scanItem(index: int) -> None:
+        results[index] = scanEntry(entries[index], customSymbols, minChars, cache, stats, guard)
+
+    # Schedule largest files first to avoid a long tail at the end of the scan
+    sizes: list[int] = []
+    for entry in entries:
+        try:
+            sizes.append(entry.stat().st_size)
+        except OSError:
+            sizes.append(0)
+    schedule: list[int] = sorted(range(len(entries)), key=sizes.__getitem__, reverse=True)
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        # Consume the iterator so that worker exceptions are propagated
+        for _ in executor.map(scanItem, schedule):
+            pass
+    return results
+
+def parseDirectoryParallel(root: os.PathLike, jobs: int, customSymbols: LanguageSymbols | None = None, fileFilterFunction: Callable = lambda _: True, directoryFilterFunction: Callable = lambda _: False, minChars: int = 0, recurse: bool = False, verbose: bool = True, cache: ResultCache | None = None, stats: ScanStats | None = None, guard: FileGuard | None = None, ignore: IgnoreMatcher | None = None, shard: Shard | None = None) -> dict:
+    '''#### Scan every file under root using a pool of worker threads\n
+    The native scanner releases the GIL for the duration of each call, so threads are enough to spread work across cores.
+    Files are submitted largest first so that a single huge file does not leave one worker grinding after the rest have finished.
+    #### args:
+    root: Directory to scan\n
+    jobs: Number of worker threads\n
+    verbose: If True, returns the same shape as `parseDirectory`, else the same shape as `parseDirectoryNoVerbose`
+
+    #### returns:
+    Mapping of scan results, identical in shape to the sequential scanners
+    '''
+    workItems: list[tuple[str, os.DirEntry]] = []
+    unknown: int = 0
+    for directory, entry in walkEntries(root, fileFilterFunction, directoryFilterFunction, recurse, stats, ignore, shard):
+        if not resolveSymbols(entry.name, customSymbols):
+            unknown += 1
             continue
-        # Walk over and parse subdirectory
-        subdirectoryData = os.walk(os.path.join(rootDirectory, dir))
-        op = parseDirectory(subdirectoryData, customSymbols, fileFilterFunction, directoryFilterFunction, True, level+1)
+        workItems.append((directory, entry))
+    results: list[tuple[int, int] | None] = scanEntriesParallel([entry for _, entry in workItems], jobs, customSymbols, minChars, cache, stats, guard)
+
+    loc: int = sum(result[0] for result in results if result)
+    totalLines: int = sum(result[1] for result in results if result)
+    generalData: dict = {"loc" : loc, "total" : totalLines, "unknown" : unknown}
+    if guard is not None:
+        generalData.update(guard.summary())
+    if not verbose:
+        return generalData
+
+    outputMapping: dict = {"general" : generalData}
+    for (directory, entry), result in zip(workItems, results):
+        if result:
+            outputMapping.setdefault(directory, {})[entry.name] = {"loc" : result[0], "total_lines" : result[1]}
+    return outputMapping
+
+def streamDirectory(root: os.PathLike, summary: dict, customSymbols: LanguageSymbols | None = None, fileFilterFunction: Callable = lambda _: True, directoryFilterFunction: Callable = lambda _: False, minChars: int = 0, recurse: bool = False, jobs: int = 1, cache: ResultCache | None = None, stats: ScanStats | None = None, readers: int = 0, prefetchDepth: int = 64, prefetchMemory: int = 64 * 1024 * 1024, guard: FileGuard | None = None, ignore: IgnoreMatcher | None = None, shard: Shard | None = None) -> Iterator[tuple[str, str, int, int]]:
+    '''#### Scan every file under root, yielding (directory, filename, loc, total lines) records as soon as each file is scanned\n
+    Nothing is accumulated besides the running totals, so memory stays bounded regardless of the size of the tree.
+    With more than one job, a bounded window of files is scanned ahead by worker threads, and records are still yielded in walk order.
+    With reader threads, files are scanned one at a time but their contents are read ahead (see `prefetchFiles`), so that I/O waits overlap with scanning
+    #### args:
+    summary: Mapping updated in place with running `loc`, `total` and `unknown` counts (and skipped counts if a guard is given), complete once the generator is exhausted\n
+    jobs: Number of worker threads\n
+    readers: Number of reader threads to read files ahead with, 0 to disable read-ahead. Cannot be combined with more than one job\n
+    prefetchDepth: Maximum number of files read ahead\n
+    prefetchMemory: Maximum number of bytes held by files read ahead, larger files are mapped instead
+    '''
+    if readers > 0 and jobs > 1:
+        raise ValueError("Read-ahead scans one file at a time, and cannot be combined with more than one job")
+    summary.update({"loc" : 0, "total" : 0, "unknown" : 0})
+    if guard is not None:
+        summary.update(guard.summary())
+
+    def acceptedEntries() -> Iterator[tuple[str, os.DirEntry]]:
+        for directory, entry in walkEntries(root, fileFilterFunction, directoryFilterFunction, recurse, stats, ignore, shard):
+            if not resolveSymbols(entry.name, customSymbols):
+                summary["unknown"] += 1
+                continue
+            yield directory, entry
 
-        localLOC, localTotal = op.pop("general").values()
-        outputMapping["general"]["loc"] = outputMapping["general"]["loc"] + localLOC
-        outputMapping["general"]["total"] = outputMapping["general"]["total"] + localTotal
-        outputMapping.update(op)
+    def emit(directory: str, entry: os.DirEntry, result: tuple[int, int]) -> tuple[str, str, int, int]:
+        summary["loc"] += result[0]
+        summary["total"] += result[1]
+        return directory, entry.name, result[0], result[1]
 
+    def emitSkipped() -> None:
+        # Skipped files produce no record, only counts
+        if guard is not None:
+            summary.update(guard.summary())
 
-    return outputMapping
\ No newline at end of file
+    if readers > 0:
+        def prefetchItems() -> Iterator[tuple[tuple, str | None, int]]:
+            # Cache lookups happen before reading, so that unchanged files are never read
+            for directory, entry in acceptedEntries():
+                symbols: LanguageSymbols = resolveSymbols(entry.name, customSymbols)
+                try:
+                    stat: os.stat_result = entry.stat()
+                except OSError:
+                    continue    # Removed since it was listed
+                if guard is not None:
+                    # Rejected before being read ahead, so oversized files never take up the window
+                    reason: str | None = guard.checkFile(entry.name, stat.st_size)
+                    if reason:
+                        guard.record(reason)
+                        continue
+                cachedResult: tuple[int, int] | None = None
+                if cache is not None:
+                    if stats is not None:
+                        epoch: float = perf_counter()
+                    cachedResult = cache.lookup(entry.path, stat, symbols.key + guard.key if guard else symbols.key, minChars)
+                    if stats is not None:
+                        stats.addPhase("cache", perf_counter() - epoch)
+                        if cachedResult:
+                            stats.recordFile(entry.path, stat.st_size, perf_counter() - epoch, *cachedResult, cached=True)
+                yield (directory, entry, symbols, stat, cachedResult), None if cachedResult else entry.path, stat.st_size
+
+        from cloc.prefetch import prefetchFiles
+        for (directory, entry, symbols, stat, cachedResult), contents in prefetchFiles(prefetchItems(), readers, prefetchDepth, prefetchMemory, stats):
+            if isinstance(contents, OSError):
+                continue    # Could not be read ahead, skipped like an unreadable directory
+            try:
+                result: tuple[int, int] | None = cachedResult or scanPrefetched(entry, symbols, stat, contents, minChars, cache, stats, guard)
+            except OSError:
+                continue    # Too large to be read ahead, and removed before it could be mapped
+            if result:
+                yield emit(directory, entry, result)
+        emitSkipped()
+        return
+
+    if jobs <= 1:
+        for directory, entry in acceptedEntries():
+            result: tuple[int, int] | None = scanEntry(entry, customSymbols, minChars, cache, stats, guard)
+            if result:
+                yield emit(directory, entry, result)
+        emitSkipped()
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+    window: deque = deque()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for directory, entry in acceptedEntries():
+            window.append((directory, entry, executor.submit(scanEntry, entry, customSymbols, minChars, cache, stats, guard)))
+            if len(window) >= jobs * 4:
+                directory, entry, future = window.popleft()
+                result: tuple[int, int] | None = future.result()
+                if result:
+                    yield emit(directory, entry, result)
+        while window:
+            directory, entry, future = window.popleft()
+            result: tuple[int, int] | None = future.result()
+            if result:
+                yield emit(directory, entry, result)
+    emitSkipped()
+
+
+def parseDirectoryPipelined(root: os.PathLike, readers: int, customSymbols: LanguageSymbols | None = None, fileFilterFunction: Callable = lambda _: True, directoryFilterFunction: Callable = lambda _: False, minChars: int = 0, recurse: bool = False, verbose: bool = True, cache: ResultCache | None = None, stats: ScanStats | None = None, prefetchDepth: int = 64, prefetchMemory: int = 64 * 1024 * 1024, guard: FileGuard | None = None, ignore: IgnoreMatcher | None = None, shard: Shard | None = None) -> dict:
+    '''#### Scan every file under root on a single scanning thread, while a pool of reader threads reads upcoming files ahead of it\n
+    Useful on cold page caches and network filesystems, where a sequential scan leaves the CPU idle during every read
+    #### args:
+    readers: Number of reader threads\n
+    verbose: If True, returns the same shape as `parseDirectory`, else the same shape as `parseDirectoryNoVerbose`\n
+    prefetchDepth, prefetchMemory: Bounds of the read-ahead window, see `streamDirectory`
+
+    #### returns:
+    Mapping of scan results, identical in shape to the sequential scanners
+    '''
+    summary: dict = {}
+    outputMapping: dict = {"general" : summary}
+    for directory, filename, l, tl in streamDirectory(root, summary, customSymbols, fileFilterFunction, directoryFilterFunction, minChars, recurse,
+                                                      cache=cache, stats=stats, readers=max(1, readers), prefetchDepth=prefetchDepth, prefetchMemory=prefetchMemory, guard=guard, ignore=ignore, shard=shard):
+        if verbose:
+            outputMapping.setdefault(directory, {})[filename] = {"loc" : l, "total_lines" : tl}
+    return outputMapping if verbose else summary
+
+def parseRoots(roots: list[os.PathLike], jobs: int = 1, customSymbols: LanguageSymbols | None = None, fileFilterFunction: Callable = lambda _: True, directoryFilterFunction: Callable = lambda _: False, minChars: int = 0, recurse: bool = False, verbose: bool = True, cache: ResultCache | None = None, stats: ScanStats | None = None, guard: FileGuard | None = None, ignore: IgnoreMatcher | None = None, shard: Shard | None = None) -> dict:
+    '''#### Scan several root directories in one pass, sharing the symbol table, result cache and worker pool between them\n
+    Files of every root are pooled before scanning, so with more than one job they are scheduled largest first across all roots, and one large root does not leave the other workers idle.
+    Roots are expected to be disjoint, nested roots are scanned (and counted) once per root
+    #### args:
+    roots: Directories to scan\n
+    jobs: Number of worker threads, 1 scans sequentially\n
+    verbose: If True, returns the same shape as `parseDirectory`, else the same shape as `parseDirectoryNoVerbose`
+
+    #### returns:
+    Mapping of combined scan results, with per-root `loc`, `total` and `unknown` counts under `roots` in the general data
+    '''
+    rootTotals: dict[str, dict[str, int]] = {}
+    workItems: list[tuple[str, str, os.DirEntry]] = []
+    for root in roots:
+        root = os.fspath(root)
+        rootTotals[root] = {"loc" : 0, "total" : 0, "unknown" : 0}
+        for directory, entry in walkEntries(root, fileFilterFunction, directoryFilterFunction, recurse, stats, ignore, shard):
+            if not resolveSymbols(entry.name, customSymbols):
+                rootTotals[root]["unknown"] += 1
+                continue
+            workItems.append((root, directory, entry))
+
+    if jobs > 1:
+        results: list[tuple[int, int] | None] = scanEntriesParallel([entry for _, _, entry in workItems], jobs, customSymbols, minChars, cache, stats, guard)
+    else:
+        results: list[tuple[int, int] | None] = [scanEntry(entry, customSymbols, minChars, cache, stats, guard) for _, _, entry in workItems]
+
+    outputMapping: dict = {"general" : {}}
+    for (root, directory, entry), result in zip(workItems, results):
+        if not result:
+            continue
+        l, tl = result
+        rootTotals[root]["loc"] += l
+        rootTotals[root]["total"] += tl
+        if verbose:
+            outputMapping.setdefault(directory, {})[entry.name] = {"loc" : l, "total_lines" : tl}
+
+    generalData: dict = {"loc" : sum(totals["loc"] for totals in rootTotals.values()),
+                         "total" : sum(totals["total"] for totals in rootTotals.values()),
+                         "unknown" : sum(totals["unknown"] for totals in rootTotals.values()),
+                         "roots" : rootTotals}
+    if guard is not None:
+        generalData.update(guard.summary())
+    if not verbose:
+        return generalData
+    outputMapping["general"] = generalData
+    return outputMapping
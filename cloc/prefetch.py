@@ -0,0 +1,76 @@
+'''Read-ahead of file contents on a bounded pool of reader threads, so that disk reads overlap with scanning'''
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Iterable, Iterator
+
+from cloc.stats import ScanStats
+
+def adviseSequential(fd: int, length: int = 0, willNeed: bool = False) -> None:
+    '''Hint the kernel to read ahead aggressively, if the platform supports posix_fadvise'''
+    if not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        os.posix_fadvise(fd, 0, length, os.POSIX_FADV_SEQUENTIAL)
+        if willNeed:
+            os.posix_fadvise(fd, 0, length, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass    # Advisory only, some filesystems reject it
+
+def readFile(path: str, stats: ScanStats | None = None) -> bytes:
+    '''Read a whole file, hinting sequential access first. The GIL is released during the read itself'''
+    if stats is not None:
+        epoch: float = perf_counter()
+    with open(path, "rb", buffering=0) as file:
+        adviseSequential(file.fileno())
+        contents: bytes = file.read()
+    if stats is not None:
+        stats.addPhase("read", perf_counter() - epoch)
+    return contents
+
+def adviseFile(path: str) -> None:
+    '''Ask the kernel to start reading a file asynchronously, for files too large to be buffered'''
+    with open(path, "rb", buffering=0) as file:
+        adviseSequential(file.fileno(), willNeed=True)
+
+def readAhead(path: str, size: int, memoryLimit: int, stats: ScanStats | None) -> bytes | OSError | None:
+    '''Work done by a reader thread: read a file, or only advise it if it is larger than `memoryLimit`. Errors are returned rather than raised, so that they stay local to their file'''
+    try:
+        if size > memoryLimit:
+            adviseFile(path)
+            return None
+        return readFile(path, stats)
+    except OSError as e:
+        return e    # Removed or made unreadable since it was listed
+
+def prefetchFiles(items: Iterable[tuple[Any, str | None, int]], readers: int = 4, depth: int = 64, memoryLimit: int = 64 * 1024 * 1024, stats: ScanStats | None = None) -> Iterator[tuple[Any, bytes | OSError | None]]:
+    '''#### Read files ahead of their consumer, yielding (item, contents) in the order items were given\n
+    At most `depth` files are in flight (queued, being read or read but not yet consumed), holding at most `memoryLimit` bytes, although a single file is always let through.
+    Files larger than `memoryLimit` are not read, only advised to the kernel, and are yielded with None contents so that the consumer can map them instead.
+    Files that cannot be opened or read are yielded with the OSError in place of their contents, so that the consumer can skip them without ending the iteration
+    #### args:
+    items: (item, path, size) triples. Items with a None path are passed through in order without reading anything\n
+    readers: Number of reader threads\n
+    depth: Maximum number of files in flight\n
+    memoryLimit: Maximum number of bytes held by files in flight
+    '''
+    window: deque[tuple[Any, Future | None, int]] = deque()
+    bufferedBytes: int = 0
+    with ThreadPoolExecutor(max_workers=max(1, readers)) as executor:
+        for item, path, size in items:
+            if path is None:
+                window.append((item, None, 0))
+            else:
+                buffered: int = size if size <= memoryLimit else 0
+                window.append((item, executor.submit(readAhead, path, size, memoryLimit, stats), buffered))
+                bufferedBytes += buffered
+
+            while window and (len(window) > depth or bufferedBytes > memoryLimit):
+                item, future, size = window.popleft()
+                bufferedBytes -= size
+                yield item, future.result() if future else None
+
+        while window:
+            item, future, _ = window.popleft()
+            yield item, future.result() if future else None
@@ -0,0 +1,230 @@
+'''Importable scanning API with compact, column-oriented results'''
+import os
+import sys
+from array import array
+from typing import Callable, Iterator
+
+from cloc.cache import ResultCache
+from cloc.engine import loadEngine
+from cloc.guard import FileGuard
+from cloc.ignore import IgnoreMatcher
+from cloc.shard import Shard
+from cloc.parsing import parseFileChunked, resolveSymbols, scanEntriesParallel, scanEntry, walkEntries
+from cloc.stats import ScanStats
+from cloc.symbols import LanguageSymbols
+
+# Names are packed the same way os.fsencode() encodes them, so undecodable names round-trip
+FS_ENCODING: str = sys.getfilesystemencoding()
+FS_ERRORS: str = sys.getfilesystemencodeerrors()
+
+class FileRecord:
+    '''Counts of a single file of a `ScanResult`'''
+    __slots__ = ("directory", "name", "loc", "totalLines")
+
+    def __init__(self, directory: str, name: str, loc: int, totalLines: int):
+        self.directory: str = directory
+        self.name: str = name
+        self.loc: int = loc
+        self.totalLines: int = totalLines
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, self.name)
+
+    def __repr__(self) -> str:
+        return f"FileRecord({self.path!r}, loc={self.loc}, totalLines={self.totalLines})"
+
+class ScanResult:
+    '''#### Per-file counts of a scan, stored as parallel columns\n
+    Directories are interned once and referenced by index, file names are packed into a single buffer, and counts are kept in `array('I')` columns,
+    so a file costs the bytes of its name plus two dozen bytes instead of several Python objects. `FileRecord` objects are only created while iterating
+    '''
+    __slots__ = ("roots", "directories", "directoryIndices", "nameData", "nameOffsets", "loc", "totalLines", "unknown", "skipped", "directoryLookup")
+
+    def __init__(self, roots: list[str] | None = None):
+        self.roots: list[str] = roots or []
+        self.directories: list[str] = []
+        self.directoryIndices: array = array("I")
+        self.nameData: bytearray = bytearray()
+        self.nameOffsets: array = array("Q", (0,))        # Name i spans nameData[nameOffsets[i]:nameOffsets[i+1]]
+        self.loc: array = array("I")
+        self.totalLines: array = array("I")
+        self.unknown: int = 0
+        self.skipped: dict[str, int] = {}       # Skipped file counts of the scanner's guard, if it has one
+        self.directoryLookup: dict[str, int] = {}
+
+    def append(self, directory: str, name: str, loc: int, totalLines: int) -> None:
+        directoryIndex: int | None = self.directoryLookup.get(directory)
+        if directoryIndex is None:
+            directoryIndex = self.directoryLookup[directory] = len(self.directories)
+            self.directories.append(directory)
+        self.directoryIndices.append(directoryIndex)
+        self.nameData += os.fsencode(name)
+        self.nameOffsets.append(len(self.nameData))
+        self.loc.append(loc)
+        self.totalLines.append(totalLines)
+
+    def __len__(self) -> int:
+        return len(self.loc)
+
+    def __getitem__(self, index: int) -> FileRecord:
+        if index < 0:
+            index += len(self)
+        return FileRecord(self.directories[self.directoryIndices[index]], self.name(index), self.loc[index], self.totalLines[index])
+
+    def name(self, index: int) -> str:
+        return self.nameData[self.nameOffsets[index]:self.nameOffsets[index + 1]].decode(FS_ENCODING, FS_ERRORS)
+
+    def names(self) -> Iterator[str]:
+        nameData: bytearray = self.nameData
+        offsets: array = self.nameOffsets
+        for start, end in zip(offsets, offsets[1:]):
+            yield nameData[start:end].decode(FS_ENCODING, FS_ERRORS)
+
+    def __iter__(self) -> Iterator[FileRecord]:
+        directories: list[str] = self.directories
+        for directoryIndex, name, loc, totalLines in zip(self.directoryIndices, self.names(), self.loc, self.totalLines):
+            yield FileRecord(directories[directoryIndex], name, loc, totalLines)
+
+    @property
+    def totalLOC(self) -> int:
+        return sum(self.loc)
+
+    @property
+    def totalLineCount(self) -> int:
+        return sum(self.totalLines)
+
+    def byExtension(self) -> dict[str, dict[str, int]]:
+        '''Aggregate counts by file extension (lowercased, without the dot). Files without an extension are grouped under an empty string'''
+        aggregates: dict[str, dict[str, int]] = {}
+        for name, loc, totalLines in zip(self.names(), self.loc, self.totalLines):
+            _, dot, extension = name.rpartition(".")
+            aggregate: dict[str, int] = aggregates.setdefault(extension.lower() if dot else "", {"files" : 0, "loc" : 0, "total" : 0})
+            aggregate["files"] += 1
+            aggregate["loc"] += loc
+            aggregate["total"] += totalLines
+        return aggregates
+
+    def byDirectory(self, cumulative: bool = False) -> dict[str, dict[str, int]]:
+        '''#### Aggregate counts by directory\n
+        cumulative: If True, the counts of every directory include those of its subdirectories (within the scanned tree)
+        '''
+        totals: list[list[int]] = [[0, 0, 0] for _ in self.directories]
+        for directoryIndex, loc, totalLines in zip(self.directoryIndices, self.loc, self.totalLines):
+            total: list[int] = totals[directoryIndex]
+            total[0] += 1
+            total[1] += loc
+            total[2] += totalLines
+
+        aggregates: dict[str, dict[str, int]] = {directory : {"files" : files, "loc" : loc, "total" : totalLines}
+                                                 for directory, (files, loc, totalLines) in zip(self.directories, totals)}
+        if not cumulative:
+            return aggregates
+
+        # Propagate every directory's own counts to each of its ancestors up to its scanned root, including intermediate directories without files of their own
+        roots: frozenset[str] = frozenset(self.roots)
+        cumulativeAggregates: dict[str, dict[str, int]] = {}
+        for directory, (files, loc, totalLines) in zip(self.directories, totals):
+            ancestor: str = directory
+            while True:
+                aggregate: dict[str, int] = cumulativeAggregates.setdefault(ancestor, {"files" : 0, "loc" : 0, "total" : 0})
+                aggregate["files"] += files
+                aggregate["loc"] += loc
+                aggregate["total"] += totalLines
+                parent: str = os.path.dirname(ancestor)
+                if ancestor in roots or parent == ancestor:
+                    break
+                ancestor = parent
+        return cumulativeAggregates
+
+    def toOutputMapping(self, verbose: bool = True) -> dict:
+        '''Convert to the mapping returned by `parseDirectory` (or `parseDirectoryNoVerbose`), for use with the `OUTPUT_MAPPING` writers'''
+        generalData: dict = {"loc" : self.totalLOC, "total" : self.totalLineCount, "unknown" : self.unknown, **self.skipped}
+        if not verbose:
+            return generalData
+        outputMapping: dict = {"general" : generalData}
+        for record in self:
+            outputMapping.setdefault(record.directory, {})[record.name] = {"loc" : record.loc, "total_lines" : record.totalLines}
+        return outputMapping
+
+class Scanner:
+    '''#### Reusable scanner holding settings and compiled comment symbols, loading the scan engine when it is built (see `engine.selectEngine`)\n
+    Building a scanner is the only setup cost, so repeated in-process scans only pay for walking and scanning.
+
+    >>> scanner = Scanner(recurse=True, jobs=4)
+    >>> result = scanner.scan("src")
+    >>> result.totalLOC, result.byExtension()["py"]
+    '''
+    __slots__ = ("customSymbols", "fileFilterFunction", "directoryFilterFunction", "minChars", "recurse", "jobs", "cache", "stats", "guard", "ignore", "shard")
+
+    def __init__(self, singleLineSymbol: str | None = None, multiLineSymbols: tuple[str, str] | None = None, fileFilterFunction: Callable = lambda _: True, directoryFilterFunction: Callable = lambda _: True, minChars: int = 0, recurse: bool = True, jobs: int = 1, cache: ResultCache | None = None, stats: ScanStats | None = None, guard: FileGuard | None = None, ignore: IgnoreMatcher | None = None, shard: Shard | None = None):
+        '''#### args:
+        singleLineSymbol, multiLineSymbols: Optional comment symbols used for every file, instead of symbols by file extension\n
+        fileFilterFunction: Function to handle inclusion/exclusion logic at the file level (file names and file extensions)\n
+        directoryFilterFunction: Function to handle inclusion/exclusion logic at the directory level\n
+        jobs: Number of worker threads, files of a directory are scanned in parallel and large single files are scanned in parallel chunks\n
+        cache: Optional result cache, see `ResultCache`. The caller remains responsible for closing it\n
+        guard: Optional `FileGuard` deciding which files are skipped, its counters accumulate across scans\n
+        ignore: Optional `IgnoreMatcher`, paths matched by .gitignore/.clocignore files are neither walked nor counted\n
+        shard: Optional `Shard`, only files of the roots belonging to it are scanned
+        '''
+        self.customSymbols: LanguageSymbols | None = None
+        if singleLineSymbol or multiLineSymbols:
+            multiLineStart, multiLineEnd = multiLineSymbols or (None, None)
+            self.customSymbols = LanguageSymbols(singleLineSymbol.encode() if singleLineSymbol else None,
+                                                 multiLineStart.encode() if multiLineStart else None,
+                                                 multiLineEnd.encode() if multiLineEnd else None)
+        self.fileFilterFunction: Callable = fileFilterFunction
+        self.directoryFilterFunction: Callable = directoryFilterFunction
+        self.minChars: int = minChars
+        self.recurse: bool = recurse
+        self.jobs: int = max(1, jobs)
+        self.cache: ResultCache | None = cache
+        self.stats: ScanStats | None = stats
+        self.guard: FileGuard | None = guard
+        self.ignore: IgnoreMatcher | None = ignore
+        self.shard: Shard | None = shard
+        # Only loaded for its side effect: the engine is created once per process, and symbols compiled for it scan with it from then on.
+        # Loading it here fails early if the native engine was selected but the library is missing, and keeps the load out of the first scan
+        loadEngine()
+
+    def scanFile(self, filepath: os.PathLike) -> tuple[int, int] | None:
+        '''Count LOC and total lines of a single file, or return None if its language is unknown or the guard skipped it'''
+        name: str = os.path.basename(filepath)
+        symbols: LanguageSymbols | None = resolveSymbols(name, self.customSymbols)
+        if not symbols:
+            return None
+        if self.guard is not None:
+            reason: str | None = self.guard.checkFile(name, os.path.getsize(filepath))
+            if reason:
+                self.guard.record(reason)
+                return None
+        return parseFileChunked(filepath, symbols, self.minChars, self.jobs, stats=self.stats, guard=self.guard)
+
+    def scan(self, *roots: os.PathLike) -> ScanResult:
+        '''Scan one or more directories into a single `ScanResult`'''
+        result: ScanResult = ScanResult([os.path.abspath(root) for root in roots])
+        for root in result.roots:
+            if self.jobs == 1:
+                for directory, entry in walkEntries(root, self.fileFilterFunction, self.directoryFilterFunction, self.recurse, self.stats, self.ignore, self.shard):
+                    if not resolveSymbols(entry.name, self.customSymbols):
+                        result.unknown += 1
+                        continue
+                    counts: tuple[int, int] | None = scanEntry(entry, self.customSymbols, self.minChars, self.cache, self.stats, self.guard)
+                    if counts:
+                        result.append(directory, entry.name, *counts)
+                continue
+
+            workItems: list[tuple[str, os.DirEntry]] = []
+            for directory, entry in walkEntries(root, self.fileFilterFunction, self.directoryFilterFunction, self.recurse, self.stats, self.ignore, self.shard):
+                if not resolveSymbols(entry.name, self.customSymbols):
+                    result.unknown += 1
+                    continue
+                workItems.append((directory, entry))
+            counts: list[tuple[int, int] | None] = scanEntriesParallel([entry for _, entry in workItems], self.jobs, self.customSymbols, self.minChars, self.cache, self.stats, self.guard)
+            for (directory, entry), fileCounts in zip(workItems, counts):
+                if fileCounts:
+                    result.append(directory, entry.name, *fileCounts)
+        if self.guard is not None:
+            result.skipped = self.guard.summary()
+        return result
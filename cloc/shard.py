@@ -0,0 +1,116 @@
+'''Deterministic partitioning of a scan across processes, and merging of their partial results'''
+import os
+import zlib
+from typing import Iterator
+
+from cloc.utils import parseJSON, serialiseJSON
+
+PARTIAL_VERSION: int = 1
+
+class Shard:
+    '''#### One of N disjoint slices of the files under a set of roots\n
+    A file belongs to shard `crc32(path relative to its root) % count + 1`. Paths are hashed with forward slashes, so every process (and machine) sharing the roots agrees on the partition,
+    and files are spread evenly regardless of how they are laid out in directories
+
+    #### args:
+    index: 1-based index of this shard\n
+    count: Total number of shards
+    '''
+    __slots__ = ("index", "count")
+
+    def __init__(self, index: int, count: int):
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"Shard {index}/{count} must satisfy 1 <= i <= N")
+        self.index: int = index
+        self.count: int = count
+
+    @classmethod
+    def parse(cls, spec: str) -> "Shard":
+        '''Parse a shard given as "i/N"'''
+        index, separator, count = spec.partition("/")
+        if not separator or not index.strip().isdigit() or not count.strip().isdigit():
+            raise ValueError(f"Shard {spec} must be given as i/N, such as 1/4")
+        return cls(int(index), int(count))
+
+    def accepts(self, relativePath: str) -> bool:
+        '''Whether a path, relative to its scanned root, belongs to this shard'''
+        if os.sep != "/":
+            relativePath = relativePath.replace(os.sep, "/")
+        return zlib.crc32(os.fsencode(relativePath)) % self.count == self.index - 1
+
+    def select(self, root: os.PathLike, entries: Iterator[tuple[str, os.DirEntry]]) -> Iterator[tuple[str, os.DirEntry]]:
+        '''Filter (directory, entry) pairs walked from root down to those of this shard'''
+        stripLength: int = len(os.path.join(os.fspath(root), ""))
+        for directory, entry in entries:
+            if self.accepts(entry.path[stripLength:]):
+                yield directory, entry
+
+    def __repr__(self) -> str:
+        return f"{self.index}/{self.count}"
+
+def writePartial(outputMapping: dict, fpath: os.PathLike, shard: Shard, roots: list[str], seconds: float) -> None:
+    '''#### Write the result of a sharded scan as a partial result file, a single line of JSON\n
+    #### args:
+    outputMapping: Scan result, in the shape returned by `parseDirectory`, `parseDirectoryNoVerbose` or `parseRoots`\n
+    shard: Shard that was scanned\n
+    roots: Scanned roots, all partials of a scan must have the same ones\n
+    seconds: Time the shard took to scan
+    '''
+    partial: dict = {"partial" : {"version" : PARTIAL_VERSION, "shard" : [shard.index, shard.count], "roots" : roots, "verbose" : "general" in outputMapping, "seconds" : seconds},
+                     "result" : outputMapping}
+    with open(fpath, "w") as partialFile:
+        partialFile.write(serialiseJSON(partial))
+
+def readPartial(fpath: os.PathLike) -> dict:
+    '''Read a partial result file, raising ValueError if it is not one'''
+    with open(fpath, "rb") as partialFile:
+        try:
+            partial: dict = parseJSON(partialFile.read())
+        except ValueError as e:
+            raise ValueError(f"{fpath} is not a partial result file ({e})") from e
+    if not isinstance(partial, dict) or not isinstance(partial.get("partial"), dict) or not isinstance(partial.get("result"), dict):
+        raise ValueError(f"{fpath} is not a partial result file")
+    if partial["partial"].get("version") != PARTIAL_VERSION:
+        raise ValueError(f"{fpath} has partial result version {partial['partial'].get('version')}, expected {PARTIAL_VERSION}")
+    return partial
+
+def mergeCounts(into: dict, counts: dict) -> None:
+    '''Add numeric counts (and nested mappings of them, such as per-root totals) into a mapping'''
+    for key, value in counts.items():
+        if isinstance(value, dict):
+            mergeCounts(into.setdefault(key, {}), value)
+        elif isinstance(value, int) and not isinstance(value, bool):
+            into[key] = into.get(key, 0) + value
+
+def mergePartials(partials: list[dict]) -> tuple[dict, list[int]]:
+    '''#### Combine partial results of the same sharded scan\n
+    Shards are disjoint, so counts are summed and per-file entries are combined as is. Raises ValueError if the partials do not belong to the same scan, or a shard is given twice
+
+    #### returns:
+    Combined mapping in the shape of the original scan (without time and platform data), and the indices of the shards missing from it
+    '''
+    if not partials:
+        raise ValueError("No partial results to merge")
+    first: dict = partials[0]["partial"]
+    seen: set[int] = set()
+    for partial in partials:
+        header: dict = partial["partial"]
+        if header["shard"][1] != first["shard"][1] or header["roots"] != first["roots"] or header["verbose"] != first["verbose"]:
+            raise ValueError(f"Shard {header['shard'][0]}/{header['shard'][1]} of {header['roots']} does not belong to the same scan as shard {first['shard'][0]}/{first['shard'][1]} of {first['roots']}")
+        if header["shard"][0] in seen:
+            raise ValueError(f"Shard {header['shard'][0]}/{header['shard'][1]} was given more than once")
+        seen.add(header["shard"][0])
+
+    generalData: dict = {}
+    outputMapping: dict = {"general" : generalData} if first["verbose"] else generalData
+    for partial in partials:
+        result: dict = partial["result"]
+        if not first["verbose"]:
+            mergeCounts(generalData, result)
+            continue
+        mergeCounts(generalData, result["general"])
+        for directory, files in result.items():
+            if directory != "general":
+                outputMapping.setdefault(directory, {}).update(files)
+    missing: list[int] = [index for index in range(1, first["shard"][1] + 1) if index not in seen]
+    return outputMapping, missing
@@ -0,0 +1,91 @@
+'''Opt-in instrumentation of scans: per-phase timings, counters and the slowest files'''
+import heapq
+import os
+import threading
+from time import perf_counter
+from typing import Iterator
+
+class ScanStats:
+    '''#### Collector of phase timings and counters for a scan\n
+    Pass an instance as `stats` to any of the parsing functions. Scanners only check `stats is not None` once per file when it is absent, so a disabled collector costs nothing.
+    Timings are cumulative across worker threads, so with more than one job the phase totals can exceed the wall-clock time of the scan.
+
+    #### Phases:
+    walk: Listing directories and filtering entries\n
+    cache: Result cache lookups\n
+    open: Opening and memory-mapping files (or reading git blobs)\n
+    read: Reading files ahead of the scanner, on reader threads of a pipelined scan\n
+    scan: Scan engine calls, including page faults of the mapping, so cold reads land here\n
+    output: Serialising results, recorded by the caller
+    '''
+    __slots__ = ("topN", "phases", "files", "bytes", "lines", "loc", "scanCalls", "cacheHits", "slowest", "lock", "epoch")
+
+    def __init__(self, topN: int = 10):
+        self.topN: int = topN
+        self.phases: dict[str, float] = {"walk" : 0.0, "cache" : 0.0, "open" : 0.0, "read" : 0.0, "scan" : 0.0, "output" : 0.0}
+        self.files: int = 0
+        self.bytes: int = 0
+        self.lines: int = 0
+        self.loc: int = 0
+        self.scanCalls: int = 0
+        self.cacheHits: int = 0
+        self.slowest: list[tuple[float, str, int, int, int]] = []     # Min-heap of (seconds, path, size, loc, total lines), bounded to topN
+        self.lock: threading.Lock = threading.Lock()
+        self.epoch: float = perf_counter()
+
+    def addPhase(self, phase: str, seconds: float, scanCalls: int = 0) -> None:
+        with self.lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+            self.scanCalls += scanCalls
+
+    def recordFile(self, path: str, size: int, seconds: float, loc: int, totalLines: int, cached: bool = False) -> None:
+        '''Record a scanned file. Bytes only count files that were actually read, not cache hits'''
+        with self.lock:
+            self.files += 1
+            self.loc += loc
+            self.lines += totalLines
+            if cached:
+                self.cacheHits += 1
+                return
+            self.bytes += size
+            if len(self.slowest) < self.topN:
+                heapq.heappush(self.slowest, (seconds, path, size, loc, totalLines))
+            elif self.slowest and seconds > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (seconds, path, size, loc, totalLines))
+
+    def timeIterator(self, phase: str, iterator: Iterator) -> Iterator:
+        '''Wrap an iterator, adding the time spent producing each item to a phase'''
+        iterator = iter(iterator)
+        while True:
+            epoch: float = perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.addPhase(phase, perf_counter() - epoch)
+                return
+            self.addPhase(phase, perf_counter() - epoch)
+            yield item
+
+    def report(self) -> dict:
+        '''#### Summarise the collected statistics\n
+        #### returns:
+        Mapping in the same shape as a verbose scan, so it can be written by any of the `OUTPUT_MAPPING` writers.
+        General data holds the counters, phase times and throughput, and the slowest files are listed under their directories along with the time spent on each
+        '''
+        with self.lock:
+            wallTime: float = perf_counter() - self.epoch
+            generalData: dict = {"loc" : self.loc,
+                                 "total" : self.lines,
+                                 "files" : self.files,
+                                 "bytes" : self.bytes,
+                                 "scan calls" : self.scanCalls,
+                                 "cache hits" : self.cacheHits}
+            generalData.update({f"{phase} time" : f"{seconds:.3f}s" for phase, seconds in self.phases.items()})
+            generalData["wall time"] = f"{wallTime:.3f}s"
+            generalData["files/s"] = round(self.files / wallTime, 1) if wallTime else None
+            generalData["MB/s"] = round(self.bytes / (1024 * 1024) / wallTime, 2) if wallTime else None
+
+            outputMapping: dict = {"general" : generalData}
+            for seconds, path, size, loc, totalLines in sorted(self.slowest, reverse=True):
+                outputMapping.setdefault(os.path.dirname(path) or ".", {})[os.path.basename(path)] = {"loc" : loc, "total_lines" : totalLines, "seconds" : round(seconds, 6), "bytes" : size}
+            return outputMapping
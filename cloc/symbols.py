@@ -0,0 +1,172 @@
+'''Precompiled, immutable table of comment symbols per file extension'''
+import marshal
+import os
+from functools import lru_cache
+from types import MappingProxyType
+from typing import TYPE_CHECKING
+
+from cloc import config
+from cloc.ctypes_interfacing import MAX_TOKENS, STATE_CODE, TOKEN_LINE_COMMENT, TOKEN_BLOCK_COMMENT, TOKEN_STRING, TOKEN_MULTILINE_STRING
+from cloc.engine import loadEngine
+
+if TYPE_CHECKING:
+    from cloc.ctypes_interfacing import NativeEngine, NativeScanTable
+    from cloc.fallback_parsing import PythonEngine, PythonScanTable
+
+# Symbols of every extension as plain tuples of bytes, the form cached on disk
+SymbolData = tuple[tuple[bytes, ...], tuple[tuple[bytes, bytes], ...], tuple[bytes, ...], tuple[bytes, ...], tuple[bytes, ...]]
+# Version of the SymbolData layout, part of the key of the marshalled copy
+SYMBOL_DATA_VERSION: int = 2
+
+class LanguageSymbols:
+    '''#### Ready-to-scan comment and string symbols of a language\n
+    Holds the encoded symbols, a key identifying them (used by the result cache), and the scan engine in use with a table compiled for it from them (see `engine.loadEngine`).
+    Instances are built once per extension and shared, so they must not be mutated.
+
+    #### args:
+    singleLine, multiLineStart, multiLineEnd: A line comment symbol and a block comment pair, for languages with one of each\n
+    lineComments: Any further line comment symbols\n
+    blockComments: Any further (start, end) block comment pairs\n
+    strings: Delimiters of string literals that end with the line, comment symbols inside them are ignored\n
+    multiLineStrings: Delimiters of string literals that may span lines, such as JavaScript template literals\n
+    rawStrings: Delimiters of string literals that may span lines and have no escape sequences, such as Go's raw strings
+    '''
+    __slots__ = ("lineComments", "blockComments", "strings", "multiLineStrings", "rawStrings", "key", "tokens", "engine", "table", "entryStates")
+
+    def __init__(self, singleLine: bytes | None = None, multiLineStart: bytes | None = None, multiLineEnd: bytes | None = None,
+                 lineComments: tuple[bytes, ...] = (), blockComments: tuple[tuple[bytes, bytes], ...] = (), strings: tuple[bytes, ...] = (), multiLineStrings: tuple[bytes, ...] = (), rawStrings: tuple[bytes, ...] = ()):
+        self.lineComments: tuple[bytes, ...] = ((singleLine,) if singleLine else ()) + tuple(symbol for symbol in lineComments if symbol)
+        self.blockComments: tuple[tuple[bytes, bytes], ...] = (((multiLineStart, multiLineEnd),) if multiLineStart and multiLineEnd else ()) + tuple(pair for pair in blockComments if all(pair))
+        self.strings: tuple[bytes, ...] = tuple(delimiter for delimiter in strings if delimiter)
+        self.multiLineStrings: tuple[bytes, ...] = tuple(delimiter for delimiter in multiLineStrings if delimiter)
+        self.rawStrings: tuple[bytes, ...] = tuple(delimiter for delimiter in rawStrings if delimiter)
+        self.key: bytes = b"\1".join((b"\0".join(self.lineComments),
+                                      b"\0".join(start + b"\0" + end for start, end in self.blockComments),
+                                      b"\0".join(self.strings),
+                                      b"\0".join(self.multiLineStrings)))
+        if self.rawStrings:
+            self.key += b"\1" + b"\0".join(self.rawStrings)     # Only appended when present, so keys of other languages are unchanged
+
+        tokens: list[tuple[bytes, bytes | None, int, bool]] = [(symbol, None, TOKEN_LINE_COMMENT, False) for symbol in self.lineComments]
+        tokens.extend((start, end, TOKEN_BLOCK_COMMENT, False) for start, end in self.blockComments)
+        tokens.extend((delimiter, delimiter, TOKEN_STRING, False) for delimiter in self.strings)
+        tokens.extend((delimiter, delimiter, TOKEN_MULTILINE_STRING, False) for delimiter in self.multiLineStrings)
+        tokens.extend((delimiter, delimiter, TOKEN_MULTILINE_STRING, True) for delimiter in self.rawStrings)
+        if len(tokens) > MAX_TOKENS:
+            raise ValueError(f"At most {MAX_TOKENS} comment and string symbols can be given, got {len(tokens)}")
+
+        # The table is compiled for the engine in use, which scans with it from then on
+        self.tokens: tuple[tuple[bytes, bytes | None, int, bool], ...] = tuple(tokens)
+        self.engine: NativeEngine | PythonEngine = loadEngine()
+        self.table: NativeScanTable | PythonScanTable | None = self.engine.compileTable(self.tokens)
+        if self.table is None:
+            raise ValueError(f"Malformed comment or string symbols: {self!r}")
+
+        # States a line can start in: outside of any token, or inside a token that spans lines
+        self.entryStates: tuple[int, ...] = (STATE_CODE, *(index + 1 for index, (_, _, kind, _) in enumerate(tokens) if kind in (TOKEN_BLOCK_COMMENT, TOKEN_MULTILINE_STRING)))
+
+    @property
+    def singleLine(self) -> bytes | None:
+        return self.lineComments[0] if self.lineComments else None
+
+    @property
+    def multiLineStart(self) -> bytes | None:
+        return self.blockComments[0][0] if self.blockComments else None
+
+    @property
+    def multiLineEnd(self) -> bytes | None:
+        return self.blockComments[0][1] if self.blockComments else None
+
+    def __repr__(self) -> str:
+        return f"LanguageSymbols(lineComments={self.lineComments!r}, blockComments={self.blockComments!r}, strings={self.strings!r}, multiLineStrings={self.multiLineStrings!r}, rawStrings={self.rawStrings!r})"
+
+def symbolList(value: str | list[str] | None) -> list[str]:
+    '''Symbols of a `languages.json` entry, which is either a single string or a list of them'''
+    if not value:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+def languageSymbolData(languages: MappingProxyType | dict) -> dict[str, SymbolData]:
+    '''#### Encode a language mapping (see `languages.json`) into the symbols of every extension\n
+    Every section maps an extension to a symbol or a list of symbols:
+    `symbols` holds line comments, `multilined` space-separated block comment pairs, `strings`, `multiline_strings` and `raw_strings` (multi-line, without escapes) string delimiters.
+    Malformed block comment pairs are ignored, and extensions without any comment symbols are left out
+    '''
+    sections: tuple[str, ...] = ("symbols", "multilined", "strings", "multiline_strings", "raw_strings")
+    symbolData: dict[str, SymbolData] = {}
+    for extension in languages["symbols"].keys() | languages["multilined"].keys():
+        lineComments, blockComments, strings, multiLineStrings, rawStrings = (symbolList(languages.get(section, {}).get(extension)) for section in sections)
+        blockPairs: list[list[str]] = [pair for pair in (blockComment.split() for blockComment in blockComments) if len(pair) == 2]
+
+        data: SymbolData = (tuple(symbol.encode() for symbol in lineComments),
+                            tuple((start.encode(), end.encode()) for start, end in blockPairs),
+                            tuple(delimiter.encode() for delimiter in strings),
+                            tuple(delimiter.encode() for delimiter in multiLineStrings),
+                            tuple(delimiter.encode() for delimiter in rawStrings))
+        if data[0] or data[1]:
+            symbolData[extension.lower()] = data
+    return symbolData
+
+@lru_cache(maxsize=None)
+def compileSymbols(data: SymbolData) -> LanguageSymbols:
+    '''Compile the symbols of a language, extensions sharing the same symbols share the same `LanguageSymbols` instance'''
+    return LanguageSymbols(lineComments=data[0], blockComments=data[1], strings=data[2], multiLineStrings=data[3], rawStrings=data[4])
+
+def compileLanguages(languages: MappingProxyType | dict) -> MappingProxyType:
+    '''Compile a language mapping (see `languages.json`) into an immutable mapping of extension to `LanguageSymbols`'''
+    return MappingProxyType({extension : compileSymbols(data) for extension, data in languageSymbolData(languages).items()})
+
+def symbolDataCachePath() -> str:
+    '''Location of the marshalled symbol table'''
+    return os.path.join(config.cacheDirectory(), "languages.marshal")
+
+@lru_cache(maxsize=None)
+def loadSymbolData() -> dict[str, SymbolData]:
+    '''#### Symbols of every extension, read from a marshalled copy in the cache directory\n
+    Unmarshalling plain tuples is much cheaper than parsing `languages.json` and encoding every entry, which dominates the startup of small runs.
+    The copy is keyed by the size and mtime of `languages.json` (and the marshal and `SymbolData` formats), and rebuilt whenever it is stale or unreadable
+    '''
+    try:
+        languagesStat: os.stat_result = os.stat(config.LANGUAGES_PATH)
+        key: tuple[int, int, int, int] = (marshal.version, SYMBOL_DATA_VERSION, languagesStat.st_size, languagesStat.st_mtime_ns)
+    except OSError:
+        key = None
+    cachePath: str = symbolDataCachePath()
+    if key is not None:
+        try:
+            with open(cachePath, "rb") as cacheFile:
+                cachedKey, symbolData = marshal.loads(cacheFile.read())
+            if cachedKey == key:
+                return symbolData
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+    symbolData: dict[str, SymbolData] = languageSymbolData(config.LANGUAGES)
+    if key is not None:
+        # Written to a temporary file first, so that concurrent runs never read a partial copy
+        temporaryPath: str = f"{cachePath}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+            with open(temporaryPath, "wb") as cacheFile:
+                cacheFile.write(marshal.dumps((key, symbolData)))
+            os.replace(temporaryPath, cachePath)
+        except OSError:
+            pass    # Read-only or missing cache directory, the table is rebuilt every run instead
+    return symbolData
+
+@lru_cache(maxsize=None)
+def getSymbols(extension: str) -> LanguageSymbols | None:
+    '''Fetch the compiled symbols for a file extension (without the leading dot), or None if the language is unknown. Symbols are compiled the first time their language is seen'''
+    data: SymbolData | None = loadSymbolData().get(extension.lower())
+    return compileSymbols(data) if data else None
+
+@lru_cache(maxsize=None)
+def symbolTable() -> MappingProxyType:
+    '''Compiled symbols of every known extension'''
+    return MappingProxyType({extension : compileSymbols(data) for extension, data in loadSymbolData().items()})
+
+def __getattr__(name: str):
+    # SYMBOL_TABLE compiles every language, so it is only built if asked for
+    if name == "SYMBOL_TABLE":
+        return symbolTable()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,28 +1,34 @@
 '''Helper functions'''
-from types import MappingProxyType
-import csv
+from functools import lru_cache
+from types import MappingProxyType, ModuleType
+from typing import TextIO
 import os
+import sys
 
-from cloc.config import LANGUAGES
+from cloc import config
 
-# Dynamic import in case orjson is found in the Python environment (vroom vroom)
-bOrjson: bool = True
-try:
-    import orjson
-except ImportError:
-    bOrjson = False
-    import json
+# Output backends (csv, sqlite3, orjson or json) are imported by the writers that use them, on first use
+
+@lru_cache(maxsize=None)
+def loadOrjson() -> ModuleType | None:
+    '''Dynamic import in case orjson is found in the Python environment (vroom vroom), None otherwise'''
+    try:
+        import orjson
+    except ImportError:
+        return None
+    return orjson
 
 def getVersion():
-    with open(os.path.join(os.path.dirname(__file__), "config.json")) as config:
-        if bOrjson:
-            version: str = orjson.loads(config.read()).get("version")
-        else:
-            version: str = json.loads(config.read()).get("version")
-        if not version:
-            print("py-cloc: version not found!")
-        else:
-            print(f"py-cloc {version}")
+    if not config.VERSION:
+        print("py-cloc: version not found!")
+    else:
+        print(f"py-cloc {config.VERSION}")
+
+def readRootManifest(fpath: os.PathLike) -> list[str]:
+    '''Read directories to scan from a batch manifest, one per line. Blank lines and lines starting with '#' are ignored, and relative paths are resolved against the manifest's directory'''
+    manifestDirectory: str = os.path.dirname(os.path.abspath(fpath))
+    with open(fpath) as manifest:
+        return [os.path.join(manifestDirectory, line) for line in (line.strip() for line in manifest) if line and not line.startswith("#")]
 
 def findCommentSymbols(extension: str, symbolMapping: dict[str, dict[str, str]] | None = None) -> bytes | tuple[bytes, bytes] | tuple[bytes, tuple[bytes, bytes]]:
         '''### Find symbols that denote a comment for a specific language
@@ -33,10 +39,15 @@ def findCommentSymbols(extension: str, symbolMapping: dict[str, dict[str, str]]
 
         extension = extension.lower()
         if not symbolMapping:
-            symbolMapping = LANGUAGES
+            symbolMapping = config.LANGUAGES
 
-        singleLineCommentSymbol: str = symbolMapping["symbols"].get(extension)
-        multiLineCommentSymbolPair: str = symbolMapping["multilined"].get(extension)
+        # Entries may list several symbols, only the first of each kind is returned
+        singleLineCommentSymbol: str | list[str] = symbolMapping["symbols"].get(extension)
+        if isinstance(singleLineCommentSymbol, list):
+            singleLineCommentSymbol = singleLineCommentSymbol[0]
+        multiLineCommentSymbolPair: str | list[str] = symbolMapping["multilined"].get(extension)
+        if isinstance(multiLineCommentSymbolPair, list):
+            multiLineCommentSymbolPair = multiLineCommentSymbolPair[0]
         if multiLineCommentSymbolPair:
             multiLineCommentSymbolPair = multiLineCommentSymbolPair.split(" ")
 
@@ -68,11 +79,13 @@ def dumpOutputSTD(outputMapping: dict, fpath: os.PathLike) -> None:
 
 def dumpOutputJSON(outputMapping: dict, fpath: os.PathLike) -> None:
     '''Dump output to JSON file, with proper formatting'''
-    if bOrjson:
+    orjson: ModuleType | None = loadOrjson()
+    if orjson:
         with open(os.path.join(os.getcwd(), fpath), "wb+") as dumpFile:
             dumpFile.write(orjson.dumps(outputMapping, option=orjson.OPT_INDENT_2, default=dict))
         return
 
+    import json
     with open(os.path.join(os.getcwd(), fpath), "w+") as dumpFile:
         dumpFile.write(json.dumps(outputMapping, skipkeys=True,
                                 ensure_ascii=True,
@@ -135,6 +148,7 @@ def dumpOutputSQL(outputMapping: dict, fpath: os.PathLike) -> None:
         dbConnection = None
 
 def dumpOutputCSV(outputMapping: dict, fpath: os.PathLike) -> None:
+    import csv
     with open(fpath, newline='', mode="w+") as csvFile:
         writer = csv.writer(csvFile)
         generalData: dict = outputMapping.get("general")
@@ -143,7 +157,7 @@ def dumpOutputCSV(outputMapping: dict, fpath: os.PathLike) -> None:
             writer.writerow(outputMapping.keys())
             writer.writerow(outputMapping.values())
         else:
-            generalData.pop("general")
+            outputMapping.pop("general")
             writer.writerow(generalData.keys())
             writer.writerow(generalData.values())
             writer.writerow(())
@@ -153,12 +167,331 @@ def dumpOutputCSV(outputMapping: dict, fpath: os.PathLike) -> None:
             writer.writerow(())
             writer.writerows((dir, filename, fileData["loc"], fileData["total_lines"]) for dir, file in outputMapping.items() for filename, fileData in file.items())
 
+def dumpOutputNDJSON(outputMapping: dict, fpath: os.PathLike) -> None:
+    '''Dump output as newline-delimited JSON, one record per file followed by a final record of general data'''
+    with NDJSONStreamWriter(fpath) as writer:
+        generalData: dict | None = outputMapping.get("general")
+        if not generalData:
+            writer.close(outputMapping)
+            return
+        for directory, fileMapping in outputMapping.items():
+            if directory == "general":
+                continue
+            for filename, fileData in fileMapping.items():
+                writer.write(directory, filename, fileData["loc"], fileData["total_lines"])
+        writer.close(generalData)
+
+class StreamWriter:
+    '''#### Base class for output writers that consume per-file records as they are produced\n
+    Records are written immediately, and general data (totals, time, platform) is written last on `close()`, so memory use does not grow with the number of files.
+    Usable as a context manager, in which case `close()` is only responsible for releasing the file if it was not called explicitly
+    '''
+    def __init__(self, fpath: os.PathLike | None = None):
+        self.fpath: os.PathLike | None = fpath
+        self.closed: bool = False
+
+    def write(self, directory: str, filename: str, loc: int, totalLines: int) -> None:
+        raise NotImplementedError
+
+    def close(self, generalData: dict | None = None) -> None:
+        self.closed = True
+
+    def __enter__(self) -> "StreamWriter":
+        return self
+
+    def __exit__(self, *_) -> None:
+        if not self.closed:
+            self.close()
+
+class TextStreamWriter(StreamWriter):
+    '''Base class for stream writers backed by a text file, or stdout if no path is given'''
+    def __init__(self, fpath: os.PathLike | None = None, newline: str | None = None):
+        super().__init__(fpath)
+        self.file: TextIO = open(fpath, "w+", newline=newline) if fpath else sys.stdout
+
+    def close(self, generalData: dict | None = None) -> None:
+        super().close(generalData)
+        if self.file is not sys.stdout:
+            self.file.close()
+        else:
+            self.file.flush()
+
+class NDJSONStreamWriter(TextStreamWriter):
+    '''Write one JSON object per file, followed by a final {"general" : ...} object'''
+    def write(self, directory: str, filename: str, loc: int, totalLines: int) -> None:
+        self.file.write(serialiseJSON({"directory" : directory, "file" : filename, "loc" : loc, "total_lines" : totalLines}))
+        self.file.write("\n")
+
+    def close(self, generalData: dict | None = None) -> None:
+        if generalData is not None:
+            self.file.write(serialiseJSON({"general" : generalData}))
+            self.file.write("\n")
+        super().close(generalData)
+
+class CSVStreamWriter(TextStreamWriter):
+    '''Write per-file rows as they arrive, followed by general data. Note that general data comes last, unlike `dumpOutputCSV`'''
+    def __init__(self, fpath: os.PathLike | None = None):
+        import csv
+        super().__init__(fpath, newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(("DIRECTORY", "FILE", "LOC", "TOTAL"))
+        self.writer.writerow(())
+
+    def write(self, directory: str, filename: str, loc: int, totalLines: int) -> None:
+        self.writer.writerow((directory, filename, loc, totalLines))
+
+    def close(self, generalData: dict | None = None) -> None:
+        if generalData is not None:
+            self.writer.writerow(())
+            self.writer.writerow(generalData.keys())
+            self.writer.writerow(generalData.values())
+        super().close(generalData)
+
+class STDStreamWriter(TextStreamWriter):
+    '''Write per-file lines grouped under their directory, followed by general data'''
+    def __init__(self, fpath: os.PathLike | None = None):
+        super().__init__(fpath)
+        self.currentDirectory: str | None = None
+
+    def write(self, directory: str, filename: str, loc: int, totalLines: int) -> None:
+        # Records arrive in walk order, so files of a directory are contiguous
+        if directory != self.currentDirectory:
+            self.currentDirectory = directory
+            self.file.write(f"{directory}\n")
+        self.file.write(f"\t{filename}:LOC: {loc} Total: {totalLines}\n")
+
+    def close(self, generalData: dict | None = None) -> None:
+        if generalData is not None:
+            self.file.write("="*15+"\n")
+            self.file.write("\n".join(f"{k} : {v}" for k,v in generalData.items()))
+            self.file.write("\n")
+        super().close(generalData)
+
+class SQLStreamWriter(StreamWriter):
+    '''Insert per-file rows into a SQLite database in batches, within a single transaction. Uses the same schema as `dumpOutputSQL`'''
+    BATCH_SIZE: int = 10_000
+
+    def __init__(self, fpath: os.PathLike):
+        import sqlite3
+        super().__init__(fpath)
+        self.dbConnection: sqlite3.Connection = sqlite3.connect(fpath, isolation_level="IMMEDIATE")
+        self.batch: list[tuple[str, str, int, int]] = []
+
+        self.dbConnection.execute("PRAGMA foreign_keys = ON;")
+        self.dbConnection.execute('''
+                                  CREATE TABLE IF NOT EXISTS general (LOC INTEGER DEFAULT 0,
+                                  total_lines INTEGER DEFAULT 0,
+                                  time DATETIME,
+                                  platform VARCHAR(32));
+                                  ''')
+        self.dbConnection.execute('''
+                                  CREATE TABLE IF NOT EXISTS file_data (ID INTEGER PRIMARY KEY AUTOINCREMENT,
+                                  directory VARCHAR(1024) NOT NULL,
+                                  _name VARCHAR(1024) NOT NULL,
+                                  LOC INTEGER DEFAULT 0,
+                                  total_lines INTEGER DEFAULT 0);
+                                  ''')
+        self.dbConnection.commit()
+        # Clear out all previous data, the deletion is only committed along with the new rows
+        for table in ("general", "file_data"):
+            self.dbConnection.execute(f"DELETE FROM {table}")
+
+    def write(self, directory: str, filename: str, loc: int, totalLines: int) -> None:
+        self.batch.append((directory, filename, loc, totalLines))
+        if len(self.batch) >= self.BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        self.dbConnection.executemany("INSERT INTO file_data (directory, _name, LOC, total_lines) VALUES (?, ?, ?, ?);", self.batch)
+        self.batch.clear()
+
+    def close(self, generalData: dict | None = None) -> None:
+        try:
+            if generalData is not None:
+                self.flush()
+                self.dbConnection.execute("INSERT INTO general VALUES (?, ?, ?, ?)", (generalData["loc"], generalData["total"], generalData.get("time"), generalData.get("platform")))
+                self.dbConnection.commit()
+            else:
+                # Incomplete scan, keep previous data intact
+                self.dbConnection.rollback()
+        finally:
+            self.dbConnection.close()
+            super().close(generalData)
+
+class SQLHistoryStreamWriter(StreamWriter):
+    '''#### Append a scan as a new run to a SQLite history database, leaving previous runs intact\n
+    Files are interned once in `files` (unique on directory and name), and every run records its per-file counts in `run_files`.
+    Files that disappeared since the previous run get a tombstone row with NULL counts.
+    If `deltas` is True, files whose counts did not change since the previous run are not stored again, so the database grows with churn rather than with tree size.
+    The state of any run can be rebuilt with `loadHistorySnapshot()` regardless of how it was stored.
+
+    The whole run is loaded in a single transaction under WAL, in batches of `executemany`
+    '''
+    BATCH_SIZE: int = 10_000
+
+    def __init__(self, fpath: os.PathLike, deltas: bool = False):
+        import sqlite3
+        super().__init__(fpath)
+        self.deltas: bool = deltas
+        self.batch: list[tuple] = []
+        self.recordedFiles: bool = False
+
+        self.dbConnection: sqlite3.Connection = sqlite3.connect(fpath, isolation_level=None)
+        self.dbConnection.execute("PRAGMA journal_mode = WAL;")
+        self.dbConnection.execute("PRAGMA synchronous = NORMAL;")
+        self.dbConnection.executescript(HISTORY_SCHEMA)
+
+        self.dbConnection.execute("BEGIN IMMEDIATE;")
+        latestRun: int = self.dbConnection.execute("SELECT COALESCE(MAX(run_id), 0) FROM run_files;").fetchone()[0]
+        self.previousState: dict[tuple[str, str], tuple[int, int]] = {(directory, name) : (loc, totalLines) for directory, name, loc, totalLines in
+                                                                      self.dbConnection.execute(HISTORY_SNAPSHOT_QUERY, (latestRun,))}
+        self.runID: int = self.dbConnection.execute("INSERT INTO runs (deltas) VALUES (?);", (int(deltas),)).lastrowid
+
+    def write(self, directory: str, filename: str, loc: int, totalLines: int) -> None:
+        self.recordedFiles = True
+        previousCounts: tuple[int, int] | None = self.previousState.pop((directory, filename), None)
+        if self.deltas and previousCounts == (loc, totalLines):
+            return
+        self.batch.append((directory, filename, loc, totalLines))
+        if len(self.batch) >= self.BATCH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        self.dbConnection.executemany("INSERT OR IGNORE INTO files (directory, name) VALUES (?, ?);", ((row[0], row[1]) for row in self.batch))
+        self.dbConnection.executemany("INSERT INTO run_files (run_id, file_id, loc, total_lines) VALUES (?, (SELECT id FROM files WHERE directory = ? AND name = ?), ?, ?);",
+                                      ((self.runID, *row) for row in self.batch))
+        self.batch.clear()
+
+    def close(self, generalData: dict | None = None) -> None:
+        try:
+            if generalData is None:
+                # Incomplete scan, discard the run
+                self.dbConnection.execute("ROLLBACK;")
+                return
+
+            # Tombstones for files that no longer exist, only meaningful if this run recorded files at all
+            if self.recordedFiles:
+                self.batch.extend((directory, name, None, None) for directory, name in self.previousState)
+            self.flush()
+            self.dbConnection.execute("UPDATE runs SET scanned_at = ?, loc = ?, total_lines = ?, unknown = ?, time = ?, platform = ?, revision = ?, recorded_files = ? WHERE id = ?;",
+                                      (generalData.get("scanned at"), generalData["loc"], generalData["total"], generalData.get("unknown"),
+                                       generalData.get("time"), generalData.get("platform"), generalData.get("revision"), int(self.recordedFiles), self.runID))
+            self.dbConnection.execute("COMMIT;")
+        finally:
+            self.dbConnection.close()
+            super().close(generalData)
+
+HISTORY_SCHEMA: str = '''
+CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY AUTOINCREMENT,
+scanned_at VARCHAR(32),
+loc INTEGER DEFAULT 0,
+total_lines INTEGER DEFAULT 0,
+unknown INTEGER DEFAULT 0,
+time VARCHAR(32),
+platform VARCHAR(32),
+revision VARCHAR(256),
+deltas BOOLEAN DEFAULT 0,
+recorded_files BOOLEAN DEFAULT 0);
+
+CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY AUTOINCREMENT,
+directory VARCHAR(1024) NOT NULL,
+name VARCHAR(1024) NOT NULL,
+UNIQUE (directory, name));
+
+CREATE TABLE IF NOT EXISTS run_files (run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+file_id INTEGER NOT NULL REFERENCES files(id),
+loc INTEGER,
+total_lines INTEGER,
+PRIMARY KEY (run_id, file_id)) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_run_files_file ON run_files (file_id, run_id);
+'''
+
+# Latest row of every file at or before a run, dropping tombstones
+HISTORY_SNAPSHOT_QUERY: str = '''
+SELECT files.directory, files.name, run_files.loc, run_files.total_lines
+FROM run_files JOIN files ON files.id = run_files.file_id
+WHERE run_files.run_id = (SELECT MAX(latest.run_id) FROM run_files AS latest WHERE latest.file_id = run_files.file_id AND latest.run_id <= ?)
+AND run_files.loc IS NOT NULL;
+'''
+
+def dumpOutputSQLHistory(outputMapping: dict, fpath: os.PathLike, deltas: bool = False) -> None:
+    '''Append output as a new run to a SQLite history database (.db, .sql), see `SQLHistoryStreamWriter`'''
+    with SQLHistoryStreamWriter(fpath, deltas) as writer:
+        generalData: dict | None = outputMapping.get("general")
+        if not generalData:
+            writer.close(outputMapping)
+            return
+        for directory, fileMapping in outputMapping.items():
+            if directory == "general":
+                continue
+            for filename, fileData in fileMapping.items():
+                writer.write(directory, filename, fileData["loc"], fileData["total_lines"])
+        writer.close(generalData)
+
+def loadHistorySnapshot(fpath: os.PathLike, runID: int | None = None) -> dict:
+    '''#### Rebuild the output mapping of a run stored in a SQLite history database\n
+    #### args:
+    runID: Run to rebuild, defaults to the latest run
+
+    #### returns:
+    Mapping in the same shape as a verbose directory scan, with only general data for runs that did not record files
+    '''
+    import sqlite3
+    dbConnection: sqlite3.Connection = sqlite3.connect(fpath)
+    try:
+        if runID is None:
+            runID = dbConnection.execute("SELECT MAX(id) FROM runs;").fetchone()[0]
+        run: tuple | None = dbConnection.execute("SELECT loc, total_lines, unknown, time, scanned_at, platform, recorded_files FROM runs WHERE id = ?;", (runID,)).fetchone()
+        if not run:
+            raise ValueError(f"Run {runID} not found in {fpath}")
+
+        outputMapping: dict = {"general" : dict(zip(("loc", "total", "unknown", "time", "scanned at", "platform"), run))}
+        if not run[6]:
+            # Non-verbose run, only totals were recorded
+            return outputMapping
+        for directory, name, loc, totalLines in dbConnection.execute(HISTORY_SNAPSHOT_QUERY, (runID,)):
+            outputMapping.setdefault(directory, {})[name] = {"loc" : loc, "total_lines" : totalLines}
+        return outputMapping
+    finally:
+        dbConnection.close()
+
+def serialiseJSON(data: dict) -> str:
+    '''Serialise a mapping into a single line of JSON'''
+    orjson: ModuleType | None = loadOrjson()
+    if orjson:
+        return orjson.dumps(data, default=dict).decode()
+    import json
+    return json.dumps(data, default=dict)
+
+def parseJSON(data: bytes | str) -> dict:
+    '''Parse a JSON document, with orjson if available'''
+    orjson: ModuleType | None = loadOrjson()
+    if orjson:
+        return orjson.loads(data)
+    import json
+    return json.loads(data)
+
 OUTPUT_MAPPING: MappingProxyType = MappingProxyType({
     "json" : dumpOutputJSON,
+    "ndjson" : dumpOutputNDJSON,
+    "jsonl" : dumpOutputNDJSON,
     "db" : dumpOutputSQL,
     "sql" : dumpOutputSQL,
     "csv" : dumpOutputCSV,
     "txt" : dumpOutputSTD,
     "log" : dumpOutputSTD,
     None : dumpOutputSTD
-})
\ No newline at end of file
+})
+
+# Writers for streamed scans, JSON is absent since a single JSON document cannot be written incrementally with its general data first
+STREAM_OUTPUT_MAPPING: MappingProxyType = MappingProxyType({
+    "ndjson" : NDJSONStreamWriter,
+    "jsonl" : NDJSONStreamWriter,
+    "db" : SQLStreamWriter,
+    "sql" : SQLStreamWriter,
+    "csv" : CSVStreamWriter,
+    "txt" : STDStreamWriter,
+    "log" : STDStreamWriter,
+    None : STDStreamWriter
+})
@@ -0,0 +1,421 @@
+'''Watch mode: keep counts of a tree up to date in memory, rescanning only the files that change'''
+import ctypes
+import ctypes.util
+import os
+import select
+import stat as statModule
+import struct
+from time import monotonic, sleep
+from typing import Callable, Iterator
+
+from cloc.cache import ResultCache
+from cloc.guard import FileGuard
+from cloc.ignore import IgnoreMatcher, IgnoreScope
+from cloc.parsing import parseFileSymbols, resolveSymbols, scanEntry, walkDirectory
+from cloc.symbols import LanguageSymbols
+
+# inotify(7) constants
+IN_MODIFY: int = 0x00000002
+IN_ATTRIB: int = 0x00000004
+IN_CLOSE_WRITE: int = 0x00000008
+IN_MOVED_FROM: int = 0x00000040
+IN_MOVED_TO: int = 0x00000080
+IN_CREATE: int = 0x00000100
+IN_DELETE: int = 0x00000200
+IN_DELETE_SELF: int = 0x00000400
+IN_MOVE_SELF: int = 0x00000800
+IN_Q_OVERFLOW: int = 0x00004000
+IN_IGNORED: int = 0x00008000
+IN_ONLYDIR: int = 0x01000000
+IN_ISDIR: int = 0x40000000
+IN_NONBLOCK: int = 0o4000
+IN_CLOEXEC: int = 0o2000000
+
+WATCH_MASK: int = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+EVENT_HEADER: struct.Struct = struct.Struct("iIII")
+
+class Changes:
+    '''Paths to re-check after a burst of filesystem events. Trees are resynchronised entirely, files are re-checked one by one'''
+    __slots__ = ("files", "trees")
+
+    def __init__(self):
+        self.files: set[str] = set()
+        self.trees: set[str] = set()
+
+    def merge(self, other: "Changes") -> None:
+        self.files |= other.files
+        self.trees |= other.trees
+
+    def __bool__(self) -> bool:
+        return bool(self.files or self.trees)
+
+def ownerRoot(roots: list[str], path: str) -> str | None:
+    '''The root a path is (or is under), or None'''
+    for root in roots:
+        if path == root or path.startswith(os.path.join(root, "")):
+            return root
+    return None
+
+def acceptedDirectories(root: str, directoryFilterFunction: Callable, recurse: bool, ignore: IgnoreMatcher | None = None, scope: IgnoreScope = ()) -> Iterator[str]:
+    '''Yield root and every subdirectory a scan would descend into. With ignore, scope holds the rules in effect in root before its own ignore files are read'''
+    yield root
+    if not recurse:
+        return
+    scopes: dict[str, IgnoreScope] = {root : scope}
+    for directory, subdirectories, fileNames in os.walk(root):
+        if ignore is not None:
+            scope = ignore.enterDirectory(scopes.pop(directory), directory, subdirectories + fileNames)
+        subdirectories[:] = [subdirectory for subdirectory in subdirectories
+                             if directoryFilterFunction(subdirectory) and not os.path.islink(os.path.join(directory, subdirectory))
+                             and not (ignore and ignore.ignored(scope, os.path.join(directory, subdirectory), subdirectory, True))]
+        for subdirectory in subdirectories:
+            path: str = os.path.join(directory, subdirectory)
+            if ignore is not None:
+                scopes[path] = scope
+            yield path
+
+class InotifyWatcher:
+    '''#### Watch directories with inotify through libc, Linux only\n
+    Raises OSError if inotify is unavailable or the watch limit is reached, in which case `PollingWatcher` should be used instead
+    '''
+    def __init__(self, roots: list[str], directoryFilterFunction: Callable, recurse: bool, ignore: IgnoreMatcher | None = None):
+        self.roots: list[str] = roots
+        self.directoryFilterFunction: Callable = directoryFilterFunction
+        self.recurse: bool = recurse
+        self.ignore: IgnoreMatcher | None = ignore
+        self.directories: dict[int, str] = {}
+
+        self.libc: ctypes.CDLL = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        self.libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd: int = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno: int = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        try:
+            for root in roots:
+                self.watchTree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def watchTree(self, root: str) -> None:
+        scope: IgnoreScope | None = ()
+        if self.ignore is not None:
+            scope = self.ignore.parentScope(ownerRoot(self.roots, root) or root, root)
+            if scope is None:
+                return      # Ignored directories are not watched at all
+        for directory in acceptedDirectories(root, self.directoryFilterFunction, self.recurse, self.ignore, scope):
+            wd: int = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                errno: int = ctypes.get_errno()
+                if errno in (2, 20):    # ENOENT, ENOTDIR: removed while being watched, the next event resyncs it
+                    continue
+                raise OSError(errno, f"inotify_add_watch failed for {directory}: {os.strerror(errno)}")
+            self.directories[wd] = directory
+
+    def read(self, timeout: float | None) -> Changes:
+        '''Wait up to timeout seconds (forever if None) for events, returning the changes they describe'''
+        changes: Changes = Changes()
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return changes
+        try:
+            data: bytes = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return changes
+
+        offset: int = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            name: str = os.fsdecode(data[offset + EVENT_HEADER.size : offset + EVENT_HEADER.size + length].rstrip(b"\0"))
+            offset += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were dropped, only a full resync is safe
+                changes.trees.update(self.roots)
+                continue
+            directory: str | None = self.directories.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                del self.directories[wd]
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                changes.trees.add(directory)
+                continue
+
+            path: str = os.path.join(directory, name)
+            if not mask & IN_ISDIR:
+                changes.files.add(path)
+                if self.ignore is not None and name in self.ignore.fileNames:
+                    # Changed ignore rules can include or exclude anything below, resync the directory and watch what it now includes
+                    self.ignore.invalidate(directory)
+                    changes.trees.add(directory)
+                    self.watchTree(directory)
+                continue
+            if not (self.recurse and self.directoryFilterFunction(name)):
+                continue
+            changes.trees.add(path)
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self.watchTree(path)
+        return changes
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+class PollingWatcher:
+    '''#### Portable fallback that re-walks the roots every `interval` seconds and diffs file metadata\n
+    Every poll costs a stat per file, so prefer `InotifyWatcher` where available
+    '''
+    def __init__(self, roots: list[str], fileFilterFunction: Callable, directoryFilterFunction: Callable, recurse: bool, interval: float = 1.0, ignore: IgnoreMatcher | None = None):
+        self.roots: list[str] = roots
+        self.fileFilterFunction: Callable = fileFilterFunction
+        self.directoryFilterFunction: Callable = directoryFilterFunction
+        self.recurse: bool = recurse
+        self.interval: float = interval
+        self.ignore: IgnoreMatcher | None = ignore
+        self.snapshot: dict[str, tuple[int, int, int]] = self.takeSnapshot()
+
+    def takeSnapshot(self) -> dict[str, tuple[int, int, int]]:
+        snapshot: dict[str, tuple[int, int, int]] = {}
+        if self.ignore is not None:
+            self.ignore.invalidate()    # Ignore files may have changed since the last poll
+        for root in self.roots:
+            for _, entry in walkDirectory(root, self.fileFilterFunction, self.directoryFilterFunction, self.recurse, self.ignore):
+                try:
+                    stat: os.stat_result = entry.stat()
+                except OSError:
+                    continue
+                snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        return snapshot
+
+    def read(self, timeout: float | None) -> Changes:
+        '''Poll until something changes. A poll already batches every change of its interval, so any timeout returns no further changes'''
+        changes: Changes = Changes()
+        while timeout is None:
+            sleep(self.interval)
+            snapshot: dict[str, tuple[int, int, int]] = self.takeSnapshot()
+            changes.files.update(path for path in snapshot.keys() | self.snapshot.keys() if snapshot.get(path) != self.snapshot.get(path))
+            self.snapshot = snapshot
+            if changes:
+                break
+        return changes
+
+    def close(self) -> None:
+        self.snapshot.clear()
+
+def createWatcher(roots: list[str], fileFilterFunction: Callable, directoryFilterFunction: Callable, recurse: bool, interval: float = 1.0, poll: bool = False, ignore: IgnoreMatcher | None = None) -> InotifyWatcher | PollingWatcher:
+    '''Watch roots with inotify, falling back to polling if it is unavailable or poll is True. Directories excluded by ignore files are not watched'''
+    if not poll:
+        try:
+            return InotifyWatcher(roots, directoryFilterFunction, recurse, ignore)
+        except OSError as e:
+            print(f"WARNING: inotify unavailable ({e}), polling every {interval}s instead")
+    return PollingWatcher(roots, fileFilterFunction, directoryFilterFunction, recurse, interval, ignore)
+
+class WatchState:
+    '''#### In-memory counts of every file under a set of roots, kept up to date incrementally\n
+    Files are only rescanned if their size, mtime or inode changed. Per-file counts are kept in the same shape as a verbose directory scan, along with per-directory totals.
+    Files rejected by the guard, if one is given, are tracked like scanned files but hold no counts
+    '''
+    def __init__(self, roots: list[str], customSymbols: LanguageSymbols | None = None, fileFilterFunction: Callable = lambda _: True, directoryFilterFunction: Callable = lambda _: False, minChars: int = 0, recurse: bool = False, guard: FileGuard | None = None, ignore: IgnoreMatcher | None = None):
+        self.roots: list[str] = roots
+        self.customSymbols: LanguageSymbols | None = customSymbols
+        self.fileFilterFunction: Callable = fileFilterFunction
+        self.directoryFilterFunction: Callable = directoryFilterFunction
+        self.minChars: int = minChars
+        self.recurse: bool = recurse
+        self.guard: FileGuard | None = guard
+        self.ignore: IgnoreMatcher | None = ignore
+
+        self.summary: dict[str, int] = {"loc" : 0, "total" : 0, "unknown" : 0}
+        self.files: dict[str, dict[str, dict[str, int]]] = {}           # Directory -> file -> {"loc", "total_lines"}
+        self.directoryTotals: dict[str, dict[str, int]] = {}           # Directory -> {"loc", "total"}
+        self.metadata: dict[str, tuple[int, int, int]] = {}             # Path -> (size, mtime_ns, inode) of scanned files
+        self.unknown: set[str] = set()
+        self.skipped: dict[str, str] = {}                               # Path -> reason of files skipped by the guard
+
+    def acceptsDirectory(self, path: str) -> bool:
+        '''Whether a scan of the roots would descend into this directory, applying the same filters as `walkDirectory`'''
+        for root in self.roots:
+            relativePath: str = os.path.relpath(path, root)
+            if relativePath == os.curdir:
+                return True
+            if relativePath.startswith(os.pardir):
+                continue
+            return (self.recurse and all(self.directoryFilterFunction(directory) for directory in relativePath.split(os.sep))
+                    and not (self.ignore and self.ignore.isIgnored(root, path, True)))
+        return False
+
+    def accepts(self, path: str) -> bool:
+        '''Whether a scan of the roots would include this file'''
+        directory, name = os.path.split(path)
+        if not (self.fileFilterFunction(name) and self.acceptsDirectory(directory)):
+            return False
+        return not (self.ignore and self.ignore.isIgnored(ownerRoot(self.roots, path), path, False))
+
+    def record(self, directory: str, name: str, counts: tuple[int, int] | None) -> tuple[int, int]:
+        '''Set (or with None, remove) the counts of a file, returning the change in (loc, total lines)'''
+        previous: dict[str, int] | None = self.files.get(directory, {}).get(name)
+        oldLOC, oldTotal = (previous["loc"], previous["total_lines"]) if previous else (0, 0)
+        newLOC, newTotal = counts or (0, 0)
+        if counts:
+            self.files.setdefault(directory, {})[name] = {"loc" : newLOC, "total_lines" : newTotal}
+        elif previous:
+            del self.files[directory][name]
+            if not self.files[directory]:
+                del self.files[directory]
+
+        if counts or previous:
+            directoryTotal: dict[str, int] = self.directoryTotals.setdefault(directory, {"loc" : 0, "total" : 0})
+            directoryTotal["loc"] += newLOC - oldLOC
+            directoryTotal["total"] += newTotal - oldTotal
+            if directory not in self.files:
+                del self.directoryTotals[directory]
+        self.summary["loc"] += newLOC - oldLOC
+        self.summary["total"] += newTotal - oldTotal
+        return newLOC - oldLOC, newTotal - oldTotal
+
+    def forgetSkipped(self, path: str) -> None:
+        '''Take a file skipped by the guard out of its counts, so that they only cover files currently skipped'''
+        reason: str | None = self.skipped.pop(path, None)
+        if reason is not None:
+            with self.guard.lock:
+                self.guard.skipped[reason] -= 1
+
+    def scanGuarded(self, path: str, name: str, stat: os.stat_result, entry: os.DirEntry | None, cache: ResultCache | None) -> tuple[int, int] | None:
+        '''Scan a file through the guard, remembering why it was skipped if it was. The state is only updated from one thread, so that is the reason whose count went up'''
+        before: dict[str, int] = dict(self.guard.skipped)
+        if entry is not None:
+            counts: tuple[int, int] | None = scanEntry(entry, self.customSymbols, self.minChars, cache, guard=self.guard)
+        else:
+            reason: str | None = self.guard.checkFile(name, stat.st_size)
+            if reason:
+                self.guard.record(reason)
+                counts = None
+            else:
+                counts = parseFileSymbols(path, resolveSymbols(name, self.customSymbols), self.minChars, guard=self.guard)
+        for reason, count in self.guard.skipped.items():
+            if count != before[reason]:
+                self.skipped[path] = reason
+        return counts
+
+    def update(self, path: str, stat: os.stat_result | None = None, entry: os.DirEntry | None = None, cache: ResultCache | None = None) -> tuple | None:
+        '''#### Re-check a single path, rescanning it only if its metadata changed\n
+        #### returns:
+        (directory, file, loc delta, total lines delta, status) with status A, M or D, or None if nothing changed
+        '''
+        directory, name = os.path.split(path)
+        if stat is None:
+            try:
+                stat = os.stat(path) if self.accepts(path) else None
+            except OSError:
+                stat = None
+            if stat is not None and not statModule.S_ISREG(stat.st_mode):
+                stat = None
+
+        if stat is None or not resolveSymbols(name, self.customSymbols):
+            if path in self.unknown:
+                if stat is None:
+                    self.unknown.discard(path)
+                    self.summary["unknown"] -= 1
+                return None
+            if stat is not None:
+                self.unknown.add(path)
+                self.summary["unknown"] += 1
+            if path not in self.metadata:
+                return None
+            del self.metadata[path]
+            if self.guard is not None:
+                self.forgetSkipped(path)
+            return directory, name, *self.record(directory, name, None), "D"
+
+        metadata: tuple[int, int, int] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        previous: tuple[int, int, int] | None = self.metadata.get(path)
+        if previous == metadata:
+            return None
+        try:
+            if self.guard is not None:
+                self.forgetSkipped(path)
+                counts: tuple[int, int] | None = self.scanGuarded(path, name, stat, entry, cache)
+            elif entry is not None:
+                counts: tuple[int, int] | None = scanEntry(entry, self.customSymbols, self.minChars, cache)
+            else:
+                counts: tuple[int, int] | None = parseFileSymbols(path, resolveSymbols(name, self.customSymbols), self.minChars)
+        except OSError:
+            # Removed between the event and the scan, the removal event will follow
+            return None
+        self.metadata[path] = metadata
+        counted: bool = name in self.files.get(directory, {})
+        if not counts:
+            # Skipped by the guard, only a change if the file was counted before
+            if not counted:
+                return None
+            return directory, name, *self.record(directory, name, None), "D"
+        return directory, name, *self.record(directory, name, counts), "M" if counted else "A"
+
+    def resyncTree(self, root: str, cache: ResultCache | None = None) -> list[tuple]:
+        '''Bring every file under a directory up to date, including files removed along with their directories'''
+        prefix: str = os.path.join(root, "")
+        stale: set[str] = {path for path in self.metadata.keys() | self.unknown if path == root or path.startswith(prefix)}
+        deltas: list[tuple] = []
+        if os.path.isdir(root) and self.acceptsDirectory(root):
+            scope: IgnoreScope | None = self.ignore.parentScope(ownerRoot(self.roots, root), root) if self.ignore else None
+            for _, entry in walkDirectory(root, self.fileFilterFunction, self.directoryFilterFunction, self.recurse, self.ignore, scope):
+                stale.discard(entry.path)
+                try:
+                    delta: tuple | None = self.update(entry.path, entry.stat(), entry, cache)
+                except OSError:
+                    continue
+                if delta:
+                    deltas.append(delta)
+        for path in stale:
+            delta: tuple | None = self.update(path)
+            if delta:
+                deltas.append(delta)
+        return deltas
+
+    def apply(self, changes: Changes) -> list[tuple]:
+        '''Apply a batch of changes, returning the deltas of every file whose counts changed'''
+        deltas: list[tuple] = []
+        trees: list[str] = sorted(changes.trees)
+        for tree in trees:
+            deltas.extend(self.resyncTree(tree))
+        treePrefixes: tuple[str, ...] = tuple(os.path.join(tree, "") for tree in trees)
+        for path in changes.files:
+            if treePrefixes and path.startswith(treePrefixes):
+                continue
+            delta: tuple | None = self.update(path)
+            if delta:
+                deltas.append(delta)
+        return deltas
+
+    def generalData(self) -> dict[str, int]:
+        '''Current totals, along with the counts of files skipped by the guard if there is one'''
+        return {**self.summary, **self.guard.summary()} if self.guard is not None else dict(self.summary)
+
+    def outputMapping(self, verbose: bool = True) -> dict:
+        '''Current state, in the same shape as a verbose (or non-verbose) directory scan'''
+        if not verbose:
+            return self.generalData()
+        return {"general" : self.generalData(), **self.files}
+
+def watchChanges(state: WatchState, watcher: InotifyWatcher | PollingWatcher, debounce: float = 0.25, maxLatency: float = 5.0) -> Iterator[list[tuple]]:
+    '''#### Apply filesystem changes to the state as they happen, yielding the deltas of every batch\n
+    Events are coalesced until none arrive for `debounce` seconds (or for at most `maxLatency` seconds), so that bursts such as a branch switch are applied as one batch.
+    A batch that changes no counts but changes the general data, such as a file newly skipped by the guard, is yielded with no deltas
+    '''
+    while True:
+        changes: Changes = watcher.read(None)
+        deadline: float = monotonic() + maxLatency
+        while monotonic() < deadline:
+            burst: Changes = watcher.read(debounce)
+            if not burst:
+                break
+            changes.merge(burst)
+        generalData: dict[str, int] = state.generalData()
+        deltas: list[tuple] = state.apply(changes)
+        if deltas or state.generalData() != generalData:
+            yield deltas
@@ -0,0 +1,104 @@
+'''Parity of the pure-Python scan engine with the native one, and the counts both give on hand-written cases'''
+import random
+
+import pytest
+
+from cloc.ctypes_interfacing import STATE_CODE, NativeEngine, loadLibrary
+from cloc.fallback_parsing import PythonEngine
+from cloc.symbols import SYMBOL_TABLE, LanguageSymbols
+
+try:
+    loadLibrary()
+    NATIVE_AVAILABLE: bool = True
+except OSError:
+    NATIVE_AVAILABLE = False
+requiresNative = pytest.mark.skipif(not NATIVE_AVAILABLE, reason="line_parsing.so is not built")
+
+MIN_CHARS: tuple[int, ...] = (0, 1, 3, -1)
+
+# C-like symbols with every token kind: line comment (state 1), block comment (state 2), strings (states 3, 4), a multi-line string (state 5) and a raw string (state 6)
+SYMBOLS: LanguageSymbols = LanguageSymbols(lineComments=(b"//",), blockComments=((b"/*", b"*/"),), strings=(b'"', b"'"), multiLineStrings=(b"`",), rawStrings=(b"~",))
+BLOCK_STATE: int = 2
+MULTILINE_STRING_STATE: int = 5
+RAW_STRING_STATE: int = 6
+
+# name: (buffer, (valid lines, total lines, final state))
+FIXED_CASES: dict[str, tuple[bytes, tuple[int, int, int]]] = {
+    "empty" : (b"", (0, 0, STATE_CODE)),
+    "blank lines" : (b"\n \t\r\n\n", (0, 3, STATE_CODE)),
+    "line comment" : (b"x // y\n// z\n", (1, 2, STATE_CODE)),
+    "stray block close" : (b"*/\nx */ y\n", (1, 2, STATE_CODE)),
+    "block comment" : (b"a /* b\nc\nd */\n", (1, 3, STATE_CODE)),
+    "unterminated block" : (b"/* a\nb\n", (0, 2, BLOCK_STATE)),
+    "line comment inside block" : (b"/* a\n// b */ c\nd\n", (1, 3, STATE_CODE)),
+    "comment symbols inside string" : (b'"// /*"\n', (1, 1, STATE_CODE)),
+    "escaped delimiter" : (b"`a\\` // x\n/* not a comment` y\n", (2, 2, STATE_CODE)),
+    "raw string ignores escapes" : (b"~a\\~ // x\n/* a comment~ y\n", (1, 2, BLOCK_STATE)),
+    "unterminated multi-line string" : (b"`a\n\nb", (2, 3, MULTILINE_STRING_STATE)),
+    "unterminated raw string" : (b"~a\\\n", (1, 1, RAW_STRING_STATE)),
+    "single-line string ends with its line" : (b'"abc\n/* c */\n', (1, 2, STATE_CODE)),
+    "unterminated string at end of file" : (b'x = "abc', (1, 1, STATE_CODE)),
+    "no trailing newline" : (b"a\nb", (2, 2, STATE_CODE)),
+}
+
+ENGINES: list = [pytest.param("native", marks=requiresNative), "python"]
+
+def createEngine(name: str) -> NativeEngine | PythonEngine:
+    return NativeEngine() if name == "native" else PythonEngine()
+
+def scan(engine: NativeEngine | PythonEngine, symbols: LanguageSymbols, buffer: bytes, state: int = STATE_CODE, minChars: int = 0) -> tuple[int, int, int]:
+    result = engine.scanBufferTable(buffer, len(buffer), state, minChars, engine.compileTable(symbols.tokens))
+    return result.validLines, result.totalLines, result.state
+
+def randomBuffer(rng: random.Random, symbols: LanguageSymbols, pieces: int = 40) -> bytes:
+    '''Random bytes made of the symbols of a language (whole and cut short), whitespace, escapes and line endings'''
+    parts: list[bytes] = [symbol for open, close, _, _ in symbols.tokens for symbol in (open, close) if symbol]
+    parts.extend([part[:-1] for part in parts if len(part) > 1])
+    parts.extend((b" ", b"\t", b"\r", b"\n", b"\n", b"\\", b"x", b"yz", b"\r\n"))
+    return b"".join(rng.choice(parts) for _ in range(rng.randrange(pieces)))
+
+@pytest.mark.parametrize("engineName", ENGINES)
+@pytest.mark.parametrize("name", FIXED_CASES)
+def test_fixed_cases(engineName: str, name: str):
+    buffer, expected = FIXED_CASES[name]
+    assert scan(createEngine(engineName), SYMBOLS, buffer) == expected
+
+@pytest.mark.parametrize("engineName", ENGINES)
+def test_min_chars(engineName: str):
+    engine: NativeEngine | PythonEngine = createEngine(engineName)
+    buffer: bytes = b"ab\n a b c\n\"\"\n/* x */ d\n"
+    assert scan(engine, SYMBOLS, buffer, minChars=0) == (4, 4, STATE_CODE)
+    assert scan(engine, SYMBOLS, buffer, minChars=1) == (3, 4, STATE_CODE)
+    assert scan(engine, SYMBOLS, buffer, minChars=2) == (1, 4, STATE_CODE)
+    assert scan(engine, SYMBOLS, buffer, minChars=-1) == (0, 4, STATE_CODE)
+
+@pytest.mark.parametrize("engineName", ENGINES)
+def test_entry_states(engineName: str):
+    engine: NativeEngine | PythonEngine = createEngine(engineName)
+    buffer: bytes = b"a */ b\nc\n"
+    assert scan(engine, SYMBOLS, buffer, state=BLOCK_STATE) == (2, 2, STATE_CODE)
+    assert scan(engine, SYMBOLS, buffer, state=MULTILINE_STRING_STATE) == (2, 2, MULTILINE_STRING_STATE)
+    # No line starts inside a line comment, such states start in code like unknown ones
+    assert scan(engine, SYMBOLS, buffer, state=1) == scan(engine, SYMBOLS, buffer)
+    assert scan(engine, SYMBOLS, buffer, state=len(SYMBOLS.tokens) + 1) == scan(engine, SYMBOLS, buffer)
+
+@requiresNative
+@pytest.mark.parametrize("name", FIXED_CASES)
+def test_fixed_cases_every_state_and_min_chars_match_native(name: str):
+    native, python = NativeEngine(), PythonEngine()
+    buffer: bytes = FIXED_CASES[name][0]
+    for state in range(len(SYMBOLS.tokens) + 2):
+        for minChars in MIN_CHARS:
+            assert scan(python, SYMBOLS, buffer, state, minChars) == scan(native, SYMBOLS, buffer, state, minChars), (state, minChars)
+
+@requiresNative
+def test_random_buffers_match_native():
+    native, python = NativeEngine(), PythonEngine()
+    rng: random.Random = random.Random(1234)
+    languages: list[LanguageSymbols] = [SYMBOLS, *{symbols.key : symbols for symbols in SYMBOL_TABLE.values()}.values()]
+    for symbols in languages:
+        for _ in range(25):
+            buffer: bytes = randomBuffer(rng, symbols)
+            state: int = rng.randrange(len(symbols.tokens) + 1)
+            minChars: int = rng.choice(MIN_CHARS)
+            assert scan(python, symbols, buffer, state, minChars) == scan(native, symbols, buffer, state, minChars), (symbols, buffer, state, minChars)